@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark for end-to-end deadlines on the analysis page's model requests
+
+Runs run_analysis_requests (summary, structure analysis and a chat answer)
+against two unhealthy stand-in APIs: one that answers slowly and one whose
+model stays "loading" (503 with estimated_time), which the retry policy
+keeps waiting on. Each is timed without a deadline and under each
+--deadlines budget, with hedging off so the deadline alone bounds the run,
+and the per-stage report shows how each stage ended.
+
+Usage: python benchmark_analysis_deadline.py [--deadlines 5 20] [--delay 12] [--loading-estimate 6]
+"""
+
+import sys
+import os
+import io
+import json
+import time
+import argparse
+import contextlib
+
+# Add the current directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_model_client import StandInInferenceHandler, stand_in_api
+from benchmark_concurrent_analysis import DOCUMENT, QUESTION
+
+class LoadingInferenceHandler(StandInInferenceHandler):
+    """Answers every request 503 "model loading" with an estimated_time"""
+
+    estimated_time = 6.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        type(self).request_count += 1
+        body = json.dumps({"error": "Model is currently loading", "estimated_time": self.estimated_time}).encode()
+        self.send_response(503)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def run_analysis(handler, deadline):
+    """Return (wall seconds, model requests sent, {stage: mode}) for one analysis run"""
+    with stand_in_api(handler) as utils:
+        utils.RESPONSE_CACHE_ENABLED = False
+        utils.HEDGE_DEADLINE_SECONDS = 0
+        start = time.perf_counter()
+        results = utils.run_analysis_requests(DOCUMENT, summary_length=200, include_analysis=True,
+                                              question=QUESTION, deadline=deadline)
+        wall = time.perf_counter() - start
+    report = results.get("deadline_report")
+    modes = {stage["stage"]: stage["mode"] for stage in report["stages"]} if report else {}
+    return wall, handler.request_count, modes
+
+def main():
+    """Run the benchmark and print a results table"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--deadlines", type=float, nargs="+", default=[5, 20])
+    parser.add_argument("--delay", type=float, default=12, help="Seconds the slow stand-in takes per request")
+    parser.add_argument("--loading-estimate", type=float, default=6,
+                        help="estimated_time the loading stand-in reports (s)")
+    args = parser.parse_args()
+
+    StandInInferenceHandler.response_delay = args.delay
+    LoadingInferenceHandler.response_delay = 0.0
+    LoadingInferenceHandler.estimated_time = args.loading_estimate
+    scenarios = (
+        (f"slow ({args.delay:g}s)", StandInInferenceHandler),
+        (f"loading ({args.loading_estimate:g}s)", LoadingInferenceHandler),
+    )
+
+    print("📊 Analysis run under a deadline (summary + structure + chat answer, hedging off)")
+    print("=" * 100)
+    print(f"{'API':<14} | {'Deadline':>8} | {'Wall (s)':>8} | {'Requests':>8} | {'Summary':<26} | {'Chat answer':<26}")
+    print("-" * 100)
+    for label, handler in scenarios:
+        for deadline in [0] + args.deadlines:
+            with contextlib.redirect_stdout(io.StringIO()):  # Mock Streamlit status messages
+                wall, requests_sent, modes = run_analysis(handler, deadline)
+            print(f"{label:<14} | {(f'{deadline:g}s' if deadline else 'none'):>8} | {wall:>8.1f} | {requests_sent:>8} | "
+                  f"{modes.get('summary', '-'):<26} | {modes.get('chat_answer', '-'):<26}")
+
+if __name__ == "__main__":
+    main()
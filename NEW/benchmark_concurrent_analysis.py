@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark for sequential vs concurrent analysis-page model requests
+
+Points utils at the local stand-in inference server from
+test_model_client.py with a simulated model latency, then times the
+summary and a chatbot answer issued one after another versus gathered
+through run_analysis_requests.
+
+Usage: python benchmark_concurrent_analysis.py [--delay 1.0] [--rounds 3]
+"""
+
+import sys
+import os
+import io
+import time
+import argparse
+import contextlib
+
+# Add the current directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_model_client import StandInInferenceHandler, start_server
+import utils
+
+DOCUMENT = "This Service Agreement is made between Acme Corp and Beta LLC. The Supplier shall deliver the services. " * 30
+QUESTION = "What are the payment obligations?"
+
+def run_sequential():
+    utils.generate_summary(DOCUMENT, max_length=200)
+    utils.analyze_document_structure(DOCUMENT)
+    utils.chatbot_response(QUESTION, DOCUMENT)
+
+def run_concurrent():
+    utils.run_analysis_requests(DOCUMENT, summary_length=200, include_analysis=True, question=QUESTION)
+
+def main():
+    """Run the benchmark and print wall time for both modes"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--delay", type=float, default=1.0, help="Simulated model latency per request (s)")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    StandInInferenceHandler.response_delay = args.delay
+    server, base_url = start_server(None)
+    utils.HF_INFERENCE_URL = base_url
+    utils.RESPONSE_CACHE_ENABLED = False  # Every round should reach the server
+    print(f"🖥️ Stand-in inference server at {base_url}, {args.delay:.2f}s per request")
+
+    print("\n📊 Summary + analysis + chat answer")
+    print("=" * 44)
+    print(f"{'Mode':<12} | {'Mean wall time (s)':>18}")
+    print("-" * 44)
+    for label, run in (("sequential", run_sequential), ("concurrent", run_concurrent)):
+        timings = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):  # Mock Streamlit status messages
+                run()
+            timings.append(time.perf_counter() - start)
+        print(f"{label:<12} | {sum(timings) / len(timings):>18.2f}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
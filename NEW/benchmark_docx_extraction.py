@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark for streaming DOCX extraction vs the python-docx object model
+
+Builds exhibits with many paragraphs and a large table, then compares
+time, peak memory and characters extracted for both paths. Each extractor
+runs in a fresh subprocess and peak memory is the resident set size growth
+sampled during extraction (Linux /proc), since python-docx keeps its lxml
+tree in C memory that tracemalloc cannot see.
+
+Usage: python benchmark_docx_extraction.py [--paragraphs 5000] [--rows 1000]
+"""
+
+import sys
+import os
+import io
+import time
+import argparse
+import subprocess
+import tempfile
+import threading
+
+# Add the current directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import test_document_extraction  # noqa: F401 - installs the Streamlit mock before utils is imported
+from utils import extract_text_from_docx
+
+def extract_with_python_docx(uploaded_file):
+    """The previous extraction path: body paragraphs only, via python-docx"""
+    from docx import Document
+
+    doc = Document(uploaded_file)
+    text = ""
+    for paragraph in doc.paragraphs:
+        text += paragraph.text + "\n"
+    return text
+
+def build_exhibit_docx(paragraph_count, table_rows):
+    """Build a DOCX exhibit with body paragraphs and a five-column fee table"""
+    from docx import Document
+
+    document = Document()
+    document.sections[0].header.paragraphs[0].text = "EXHIBIT B - Pricing Schedule"
+    for number in range(paragraph_count):
+        document.add_paragraph(
+            f"{number}. The Supplier shall provide the deliverables listed below and the "
+            f"Customer shall pay each invoice within thirty days of receipt."
+        )
+    table = document.add_table(rows=0, cols=5)
+    for row_number in range(table_rows):
+        cells = table.add_row().cells
+        for column, value in enumerate(("SKU-%05d" % row_number, "Licence", "12 months", "$1,200", "Net 30")):
+            cells[column].text = value
+
+    output = io.BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+EXTRACTORS = {
+    "python-docx": extract_with_python_docx,
+    "streaming": extract_text_from_docx,
+}
+
+def current_rss_bytes():
+    """Resident set size of this process, read from /proc/self/statm"""
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def measure_in_child(label, docx_path):
+    """Child process entry point: run one extractor and print its measurements"""
+    with open(docx_path, "rb") as docx_file:
+        docx_bytes = docx_file.read()
+
+    baseline = current_rss_bytes()
+    peak = [baseline]
+    finished = threading.Event()
+
+    def sample_rss():
+        while not finished.is_set():
+            peak[0] = max(peak[0], current_rss_bytes())
+            finished.wait(0.002)
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    text = EXTRACTORS[label](io.BytesIO(docx_bytes))
+    elapsed = time.perf_counter() - start
+    finished.set()
+    sampler.join()
+    peak[0] = max(peak[0], current_rss_bytes())
+    print(f"{elapsed} {peak[0] - baseline} {len(text)}")
+
+def measure(label, docx_path):
+    """Return (seconds, extra_peak_bytes, characters) for one extraction run in a fresh process"""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", label, docx_path],
+        capture_output=True, text=True, check=True
+    ).stdout.split()
+    return float(output[-3]), int(output[-2]), int(output[-1])
+
+def main():
+    """Run the benchmark and print a side-by-side table"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--paragraphs", type=int, default=5000)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--child", nargs=2, metavar=("EXTRACTOR", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure_in_child(*args.child)
+        return
+
+    print(f"🛠️ Building exhibit: {args.paragraphs} paragraphs, {args.rows}x5 table...")
+    docx_bytes = build_exhibit_docx(args.paragraphs, args.rows)
+    print(f"   DOCX size: {len(docx_bytes) / 1024:.0f} KB")
+
+    with tempfile.NamedTemporaryFile(suffix=".docx", delete=False) as docx_file:
+        docx_file.write(docx_bytes)
+        docx_path = docx_file.name
+
+    try:
+        print("\n📊 DOCX extraction benchmark")
+        print("=" * 62)
+        print(f"{'Extractor':<16} | {'Time (s)':>8} | {'Peak +MB':>8} | {'Characters':>10}")
+        print("-" * 62)
+        for label in EXTRACTORS:
+            elapsed, peak, characters = measure(label, docx_path)
+            print(f"{label:<16} | {elapsed:>8.2f} | {peak / (1024 * 1024):>8.1f} | {characters:>10,}")
+        print("\nNote: python-docx skips table cells, headers and footers, so it extracts fewer characters.")
+    finally:
+        os.unlink(docx_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark for per-call latency with and without the pooled HTTP session
+
+Starts a local stand-in for the Hugging Face Inference API (HTTPS with a
+throwaway self-signed certificate when openssl is available, plain HTTP
+otherwise) and times the same summarization request made with a fresh
+requests.post per call versus the shared keep-alive session from utils.
+
+Usage: python benchmark_http_session.py [--calls 200] [--no-tls]
+"""
+
+import sys
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+# Add the current directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_model_client import start_server
+import requests
+import urllib3
+import utils
+
+def make_certificate(directory):
+    """Create a self-signed certificate for localhost, or return None without openssl"""
+    if shutil.which("openssl") is None:
+        return None
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-keyout", key_path, "-out", cert_path],
+        check=True, capture_output=True
+    )
+    return cert_path, key_path
+
+def time_calls(post, url, calls):
+    """Return per-call latencies in milliseconds"""
+    payload = {"inputs": "This Agreement is made between Acme Corp and Beta LLC. " * 20,
+               "parameters": {"max_length": 200, "min_length": 30, "do_sample": False}}
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        response = post(url, headers=utils.HF_HEADERS, json=payload, timeout=45, verify=False)
+        response.json()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def main():
+    """Run the benchmark and print latency percentiles for both clients"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--no-tls", action="store_true", help="Serve plain HTTP even if openssl is available")
+    args = parser.parse_args()
+
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    with tempfile.TemporaryDirectory() as cert_dir:
+        certificate = None if args.no_tls else make_certificate(cert_dir)
+        server, base_url = start_server(certificate)
+        url = f"{base_url}/facebook/bart-large-cnn"
+        print(f"🖥️ Stand-in inference server at {base_url} ({'TLS' if certificate else 'plain HTTP'})")
+
+        print(f"\n📊 Per-call latency over {args.calls} calls")
+        print("=" * 62)
+        print(f"{'Client':<22} | {'p50 (ms)':>8} | {'p95 (ms)':>8} | {'Mean (ms)':>9}")
+        print("-" * 62)
+        for label, post in (("requests.post", requests.post), ("pooled session", utils.get_http_session().post)):
+            time_calls(post, url, 5)  # Warm up imports and, for the session, the pool
+            latencies = sorted(time_calls(post, url, args.calls))
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            print(f"{label:<22} | {statistics.median(latencies):>8.2f} | {p95:>8.2f} | {statistics.mean(latencies):>9.2f}")
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
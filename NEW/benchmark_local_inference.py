@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the local CPU inference backend vs the remote Inference API path
+
+Sends the same summarization requests through query_granite_model with
+CLAUSEWISE_MODEL_BACKEND=remote (against a local stand-in server that
+simulates the hosted model's latency) and =local (the mapped model running
+in-process on CPU), and reports latency percentiles and throughput.
+The local backend needs transformers, torch and the model weights in the
+local Hugging Face cache.
+
+Usage: python benchmark_local_inference.py [--requests 12] [--sessions 1 4] [--threads N] [--remote-delay 1.5]
+"""
+
+import sys
+import os
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the current directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_model_client import StandInInferenceHandler, stand_in_api
+from benchmark_pdf_extraction import CLAUSE_TEMPLATE
+
+MODEL = "ibm-granite/granite-3.0-8b-instruct"
+
+def build_documents(count):
+    """Distinct documents, so neither coalescing nor caching hides model time"""
+    return [
+        "".join(CLAUSE_TEMPLATE.format(number=number * 10 + clause, fee=1000 * (clause + 1)) for clause in range(6))
+        for number in range(count)
+    ]
+
+def run_requests(utils, documents, sessions):
+    """Return (latencies, wall seconds) for documents sent from `sessions` concurrent sessions"""
+    def timed(document):
+        start = time.perf_counter()
+        utils.query_granite_model(MODEL, document=document, local_fallback=False)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        latencies = list(pool.map(timed, documents))
+    return latencies, time.perf_counter() - start
+
+def main():
+    """Run the benchmark and print a results table"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=12)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--remote-delay", type=float, default=1.5,
+                        help="Seconds of simulated hosted-model time per remote request")
+    args = parser.parse_args()
+
+    StandInInferenceHandler.response_delay = args.remote_delay
+    with stand_in_api() as utils:
+        utils.RESPONSE_CACHE_ENABLED = False
+        utils.LOCAL_INFERENCE_THREADS = args.threads
+        rows = []
+        load_error = None
+        try:
+            load_start = time.perf_counter()
+            utils.get_local_pipeline(MODEL)
+            load_seconds = time.perf_counter() - load_start
+        except Exception as e:
+            load_error = e
+        else:
+            for backend in ("remote", "local"):
+                utils.MODEL_BACKEND = backend
+                for sessions in args.sessions:
+                    latencies, wall = run_requests(utils, build_documents(args.requests), sessions)
+                    rows.append((backend, sessions, latencies, wall))
+
+    if load_error:
+        print(f"❌ Local backend unavailable: {load_error}")
+        sys.exit(1)
+
+    print(f"📊 Inference backend benchmark ({args.requests} requests, {args.threads} CPU threads, "
+          f"remote stand-in delay {args.remote_delay:g}s)")
+    print(f"   Local model load: {load_seconds:.1f}s (once per process)")
+    print("=" * 66)
+    print(f"{'Backend':<8} | {'Sessions':>8} | {'p50 (s)':>8} | {'p95 (s)':>8} | {'Req/s':>7}")
+    print("-" * 66)
+    for backend, sessions, latencies, wall in rows:
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+        print(f"{backend:<8} | {sessions:>8} | {statistics.median(latencies):>8.2f} | {p95:>8.2f} | "
+              f"{len(latencies) / wall:>7.2f}")
+
+if __name__ == "__main__":
+    main()
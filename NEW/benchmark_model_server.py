@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Load test for the shared model server with dynamic batching
+
+Starts model_server in-process and sends summarization requests through
+query_granite_model (CLAUSEWISE_MODEL_BACKEND=server) from 1, 8 and 32
+concurrent users, with batching on and off (max batch size 1). By default
+the model is a stand-in whose cost per batch is a fixed forward-pass
+overhead plus a small per-item cost, which is how batched CPU inference
+behaves; --real loads the mapped model instead (needs transformers, torch
+and the weights in the local Hugging Face cache).
+
+Usage: python benchmark_model_server.py [--users 1 8 32] [--requests-per-user 8] [--max-batch-size 8] [--real]
+"""
+
+import sys
+import os
+import io
+import time
+import argparse
+import statistics
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the current directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Let every user hold a pooled connection (read when utils is imported)
+os.environ.setdefault("CLAUSEWISE_HTTP_POOL_SIZE", "32")
+
+import test_document_extraction  # noqa: F401 - installs the Streamlit mock before utils is imported
+from benchmark_local_inference import MODEL, build_documents
+from model_server import start_model_server, pipeline_batch_runner
+import utils
+
+def stand_in_batch_runner(overhead_ms, per_item_ms):
+    """Return a run_batch function that costs overhead_ms + per_item_ms per input"""
+    def run_batch(model_name, parameters, inputs):
+        time.sleep((overhead_ms + per_item_ms * len(inputs)) / 1000)
+        return [[{"summary_text": "The Service Provider delivers the services and the Client pays."}] for _ in inputs]
+    return run_batch
+
+def run_load(run_batch, users, requests_per_user, max_batch_size, max_wait_ms):
+    """Return (requests/s, p50 s, p95 s, server metrics) for one load level"""
+    server, base_url = start_model_server(run_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    utils.MODEL_SERVER_URL = base_url
+    documents = build_documents(users * requests_per_user)
+
+    def user(number):
+        latencies = []
+        for document in documents[number::users]:
+            start = time.perf_counter()
+            utils.query_granite_model(MODEL, document=document, local_fallback=False)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=users) as pool:
+            latencies = [latency for per_user in pool.map(user, range(users)) for latency in per_user]
+        wall = time.perf_counter() - start
+        metrics = utils.get_model_server_metrics()
+    finally:
+        server.shutdown()
+    p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+    return len(latencies) / wall, statistics.median(latencies), p95, metrics
+
+def main():
+    """Run the load test and print a results table"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests-per-user", type=int, default=8)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--overhead-ms", type=float, default=80, help="Stand-in cost of one forward pass")
+    parser.add_argument("--per-item-ms", type=float, default=10, help="Stand-in cost per batched input")
+    parser.add_argument("--real", action="store_true", help="Serve the mapped model instead of the stand-in")
+    args = parser.parse_args()
+
+    if args.real:
+        run_batch = pipeline_batch_runner()
+        model_label = "mapped model on CPU"
+    else:
+        run_batch = stand_in_batch_runner(args.overhead_ms, args.per_item_ms)
+        model_label = f"stand-in, {args.overhead_ms:g} ms + {args.per_item_ms:g} ms/item"
+
+    utils.MODEL_BACKEND = "server"
+    utils.RESPONSE_CACHE_ENABLED = False
+
+    print(f"📊 Model server load test ({model_label}, {args.requests_per_user} requests per user)")
+    print("=" * 84)
+    print(f"{'Users':>5} | {'Batching':<12} | {'Req/s':>7} | {'p50 (s)':>7} | {'p95 (s)':>7} | "
+          f"{'Mean batch':>10} | {'Peak queue':>10}")
+    print("-" * 84)
+    for users in args.users:
+        for label, max_batch_size in (("off", 1), (f"up to {args.max_batch_size}", args.max_batch_size)):
+            with contextlib.redirect_stdout(io.StringIO()):  # Mock Streamlit status messages
+                throughput, p50, p95, metrics = run_load(
+                    run_batch, users, args.requests_per_user, max_batch_size, args.max_wait_ms
+                )
+            print(f"{users:>5} | {label:<12} | {throughput:>7.1f} | {p50:>7.2f} | {p95:>7.2f} | "
+                  f"{metrics['mean_batch_size']:>10.1f} | {metrics['max_queue_depth']:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark for serial vs process-pool PDF extraction
+
+Builds synthetic contracts of 50, 200 and 1000 pages, every
+--two-column-every'th page laid out in two columns so it needs pdfplumber's
+layout analysis, and times extract_text_from_pdf in serial and parallel
+mode. The shared process pool is started before timing, as it is once per
+server process in the app.
+
+Usage: python benchmark_pdf_extraction.py [--sizes 50 200 1000] [--workers N] [--two-column-every 2]
+"""
+
+import sys
+import os
+import io
+import time
+import argparse
+import textwrap
+
+# Add the current directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_document_extraction import build_sample_pdf
+
+CLAUSE_TEMPLATE = (
+    "{number}. The Service Provider shall deliver the services described in Schedule {number}\n"
+    "in accordance with the service levels, and the Client shall pay the fees of ${fee:,}\n"
+    "within thirty (30) days of receipt of a valid invoice. Either party may terminate\n"
+    "this clause upon ninety (90) days written notice to the other party.\n"
+)
+
+def build_contract_pdf(page_count, two_column_every=0):
+    """Build a PDF with several dense clauses per page, every two_column_every'th page in two columns"""
+    pages = []
+    for page_number in range(page_count):
+        clauses = [
+            CLAUSE_TEMPLATE.format(number=page_number * 10 + clause, fee=1000 * (clause + 1))
+            for clause in range(10)
+        ]
+        if two_column_every and page_number % two_column_every == two_column_every - 1:
+            half = len(clauses) // 2
+            columns = [textwrap.fill(" ".join(column).replace("\n", " "), 45) for column in (clauses[:half], clauses[half:])]
+            pages.append([(40, 760, columns[0]), (320, 760, columns[1])])
+        else:
+            pages.append("".join(clauses))
+    return build_sample_pdf(pages)
+
+def time_extraction(pdf_bytes, parallel, workers):
+    """Return (seconds, characters) for one extraction run"""
+    import utils
+
+    utils.PDF_EXTRACTION_WORKERS = workers
+    start = time.perf_counter()
+    text = utils.extract_text_from_pdf(io.BytesIO(pdf_bytes), parallel=parallel)
+    return time.perf_counter() - start, len(text)
+
+def main():
+    """Run the benchmark and print a results table"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--two-column-every", type=int, default=2, help="0 for single-column pages only")
+    args = parser.parse_args()
+
+    import utils
+    utils.PDF_EXTRACTION_WORKERS = args.workers
+    utils._extraction_process_pool().submit(abs, 0).result()
+
+    print(f"📊 PDF extraction benchmark ({args.workers} workers)")
+    print("=" * 62)
+    print(f"{'Pages':>6} | {'Serial (s)':>10} | {'Parallel (s)':>12} | {'Speedup':>7} | {'Match':>5}")
+    print("-" * 62)
+
+    for page_count in args.sizes:
+        pdf_bytes = build_contract_pdf(page_count, args.two_column_every)
+        serial_seconds, serial_chars = time_extraction(pdf_bytes, False, args.workers)
+        parallel_seconds, parallel_chars = time_extraction(pdf_bytes, True, args.workers)
+        speedup = serial_seconds / parallel_seconds if parallel_seconds else 0.0
+        match = "yes" if serial_chars == parallel_chars else "NO"
+        print(f"{page_count:>6} | {serial_seconds:>10.2f} | {parallel_seconds:>12.2f} | {speedup:>6.1f}x | {match:>5}")
+
+if __name__ == "__main__":
+    main()
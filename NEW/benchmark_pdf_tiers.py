@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark for tiered PDF extraction on a mixed corpus
+
+Builds a corpus where most pages are clean single-column text and the rest
+are two-column layouts, then compares throughput of pdfplumber-only
+extraction against the tiered text-layer path.
+
+Usage: python benchmark_pdf_tiers.py [--documents 10] [--pages 40] [--two-column-share 0.2]
+"""
+
+import sys
+import os
+import io
+import time
+import argparse
+from collections import Counter
+
+# Add the current directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_document_extraction import build_sample_pdf
+import utils
+
+def build_mixed_corpus(documents, pages, two_column_share):
+    """Return a list of PDF byte strings mixing single- and two-column pages"""
+    two_column_every = max(1, round(1 / two_column_share)) if two_column_share > 0 else 0
+    corpus = []
+    for document_number in range(documents):
+        document_pages = []
+        for page_number in range(pages):
+            if two_column_every and page_number % two_column_every == two_column_every - 1:
+                left = "\n".join(f"{document_number}.{page_number}.{line} Licensee shall" for line in range(40))
+                right = "\n".join(f"{document_number}.{page_number}.{line} Licensor shall" for line in range(40))
+                document_pages.append([(40, 750, left), (320, 750, right)])
+            else:
+                document_pages.append("\n".join(
+                    f"{document_number}.{page_number}.{line} The Supplier shall deliver the services on time."
+                    for line in range(45)
+                ))
+        corpus.append(build_sample_pdf(document_pages))
+    return corpus
+
+def run_corpus(corpus, tiered):
+    """Return (seconds, pages, path counts) for extracting every document serially"""
+    original_loader = utils._load_pdfium
+    if not tiered:
+        utils._load_pdfium = lambda: None
+    try:
+        metrics = []
+        start = time.perf_counter()
+        for pdf_bytes in corpus:
+            utils.extract_text_from_pdf(io.BytesIO(pdf_bytes), parallel=False, metrics=metrics)
+        elapsed = time.perf_counter() - start
+    finally:
+        utils._load_pdfium = original_loader
+    return elapsed, len(metrics), Counter(record["path"] for record in metrics)
+
+def main():
+    """Run the benchmark and print throughput for both modes"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--two-column-share", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if utils._load_pdfium() is None:
+        print("❌ pypdfium2 is not installed; the tiered path needs it")
+        sys.exit(1)
+
+    corpus = build_mixed_corpus(args.documents, args.pages, args.two_column_share)
+    print(f"📚 Corpus: {args.documents} documents x {args.pages} pages, "
+          f"{args.two_column_share:.0%} two-column")
+
+    print("\n📊 Tiered PDF extraction benchmark")
+    print("=" * 72)
+    print(f"{'Mode':<16} | {'Time (s)':>8} | {'Pages/s':>8} | Paths")
+    print("-" * 72)
+    for label, tiered in (("pdfplumber only", False), ("tiered", True)):
+        elapsed, pages, paths = run_corpus(corpus, tiered)
+        path_summary = ", ".join(f"{path}={count}" for path, count in sorted(paths.items()))
+        print(f"{label:<16} | {elapsed:>8.2f} | {pages / elapsed:>8.1f} | {path_summary}")
+
+if __name__ == "__main__":
+    main()
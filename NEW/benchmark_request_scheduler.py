@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Load test for the shared outbound request scheduler against a rate-limited API
+
+Runs a stand-in Inference API that answers 429 with Retry-After once more
+than --server-rate requests per second arrive, then has --batch-sessions
+sessions summarizing documents while --chat-sessions sessions ask questions.
+Compares the scheduler switched off (no rate limit, no in-flight cap) with
+one pacing requests just under the server's limit, and reports 429s,
+failed calls and latency for each kind of request.
+
+Usage: python benchmark_request_scheduler.py [--batch-sessions 8] [--chat-sessions 2] [--server-rate 10]
+"""
+
+import sys
+import os
+import io
+import time
+import argparse
+import statistics
+import threading
+import contextlib
+
+# Add the current directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Let every session hold a pooled connection (read when utils is imported)
+os.environ.setdefault("CLAUSEWISE_HTTP_POOL_SIZE", "32")
+
+from test_model_client import StandInInferenceHandler, stand_in_api
+from benchmark_local_inference import MODEL, build_documents
+
+QUESTION = "When must the Client pay the fees?"
+
+class RateLimitedInferenceHandler(StandInInferenceHandler):
+    """Answers 429 with Retry-After: 1 above `rate` requests per second"""
+
+    rate = 10
+    rejected = 0
+    arrivals = []
+    lock = threading.Lock()
+
+    def do_POST(self):
+        cls = type(self)
+        now = time.monotonic()
+        with cls.lock:
+            cls.arrivals = [arrival for arrival in cls.arrivals if now - arrival < 1.0]
+            limited = len(cls.arrivals) >= cls.rate
+            if not limited:
+                cls.arrivals.append(now)
+            else:
+                cls.rejected += 1
+        if not limited:
+            return super().do_POST()
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(429)
+        self.send_header("Retry-After", "1")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+def run_load(utils, batch_sessions, chat_sessions, requests_per_session):
+    """Return {kind: (latencies, failures)} for one run of concurrent sessions"""
+    results = {"summary": ([], []), "chat": ([], [])}
+    documents = build_documents((batch_sessions + chat_sessions) * requests_per_session)
+
+    def session(number, kind):
+        utils._SCHEDULER_SESSION.set(f"{kind}-{number}")
+        latencies, failures = results[kind]
+        for document in documents[number::batch_sessions + chat_sessions][:requests_per_session]:
+            start = time.perf_counter()
+            if kind == "chat":
+                answer = utils.query_granite_model(MODEL, task_type="chatbot", document=document,
+                                                   question=QUESTION, local_fallback=False)
+            else:
+                answer = utils.query_granite_model(MODEL, document=document, local_fallback=False)
+            latencies.append(time.perf_counter() - start)
+            if answer is None:
+                failures.append(number)
+            if kind == "chat":
+                time.sleep(0.5)  # A person reads the answer before asking again
+
+    threads = [threading.Thread(target=session, args=(number, "summary")) for number in range(batch_sessions)]
+    threads += [threading.Thread(target=session, args=(batch_sessions + number, "chat")) for number in range(chat_sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def main():
+    """Run the load test and print a results table"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--batch-sessions", type=int, default=8)
+    parser.add_argument("--chat-sessions", type=int, default=2)
+    parser.add_argument("--requests-per-session", type=int, default=6)
+    parser.add_argument("--server-rate", type=int, default=10, help="Requests per second the stand-in API accepts")
+    parser.add_argument("--delay", type=float, default=0.2, help="Seconds of simulated model time per request")
+    args = parser.parse_args()
+
+    RateLimitedInferenceHandler.rate = args.server_rate
+    RateLimitedInferenceHandler.response_delay = args.delay
+    rows = []
+    with stand_in_api(RateLimitedInferenceHandler) as utils:
+        utils.RESPONSE_CACHE_ENABLED = False
+        original = utils.REQUEST_SCHEDULER
+        schedulers = (
+            ("off", utils.RequestScheduler(rate=0, max_in_flight=1000)),
+            (f"{args.server_rate * 0.9:g}/s", utils.RequestScheduler(rate=args.server_rate * 0.9, burst=2)),
+        )
+        try:
+            for label, scheduler in schedulers:
+                utils.REQUEST_SCHEDULER = scheduler
+                utils.RETRY_BUDGET = utils.RetryBudget(utils.RETRY_BUDGET_RATIO, utils.RETRY_BUDGET_MIN_PER_SECOND)
+                utils.reset_circuit_breakers()
+                RateLimitedInferenceHandler.rejected = 0
+                time.sleep(1.0)  # Let the stand-in's rate window empty
+                start = time.perf_counter()
+                results = run_load(utils, args.batch_sessions, args.chat_sessions, args.requests_per_session)
+                rows.append((label, time.perf_counter() - start, RateLimitedInferenceHandler.rejected,
+                             results, scheduler.snapshot()))
+        finally:
+            utils.REQUEST_SCHEDULER = original
+
+    print(f"📊 Request scheduler load test ({args.batch_sessions} summary + {args.chat_sessions} chat sessions, "
+          f"API limit {args.server_rate}/s)")
+    print("=" * 92)
+    print(f"{'Scheduler':<9} | {'Wall (s)':>8} | {'429s':>5} | {'Failed':>6} | {'Chat p50':>8} | {'Chat max':>8} | "
+          f"{'Summary p50':>11} | {'Mean wait':>9}")
+    print("-" * 92)
+    for label, wall, rejected, results, stats in rows:
+        chat, summary = results["chat"][0], results["summary"][0]
+        failed = len(results["chat"][1]) + len(results["summary"][1])
+        print(f"{label:<9} | {wall:>8.1f} | {rejected:>5} | {failed:>6} | {statistics.median(chat):>8.2f} | "
+              f"{max(chat):>8.2f} | {statistics.median(summary):>11.2f} | {stats['mean_wait_ms']:>7.0f}ms")
+
+if __name__ == "__main__":
+    main()
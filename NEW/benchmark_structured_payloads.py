@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark for structured payload builders vs prompt-string round-tripping
+
+Builds a contract of about --size-mb megabytes and prepares the model
+payload for a summary and a chat question both ways: the previous path
+(fit the whole document, wrap it in the f-string prompt, then find/slice the
+markers back out and fit again) and the model's registered payload builder
+fed the document directly. Reports time and peak Python memory per payload.
+Token counts use the built-in estimate unless the model's tokenizer is in
+the local Hugging Face cache.
+
+Usage: python benchmark_structured_payloads.py [--size-mb 1] [--repeats 3]
+"""
+
+import sys
+import os
+import time
+import argparse
+import statistics
+import tracemalloc
+
+# Add the current directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import test_document_extraction  # noqa: F401 - installs the Streamlit mock before utils is imported
+from benchmark_pdf_extraction import CLAUSE_TEMPLATE
+import utils
+
+QUESTION = "When must the Client pay the fees for Schedule 4200?"
+
+def previous_fit_text_to_tokens(text, model_name, max_tokens=None):
+    """The previous fit: count every token, then split the whole document"""
+    max_tokens = max_tokens or utils.input_token_budget(model_name)
+    if utils.count_tokens(text, model_name) <= max_tokens:
+        return text
+    chunks = utils.split_text_by_tokens(text, model_name, max_tokens, overlap_tokens=0)
+    return chunks[0] if chunks else ""
+
+def previous_summary_payload(model_name, document, max_length=150):
+    """The previous summary path: fit, build the prompt, then slice it apart again in query_granite_model"""
+    text = previous_fit_text_to_tokens(document, model_name,
+                                       utils.input_token_budget(model_name, utils._summary_prompt("", max_length)))
+    prompt = utils._summary_prompt(text, max_length)
+    if "bart" not in model_name.lower():
+        return {"inputs": prompt}
+    text_start = prompt.find("Legal Document:") + len("Legal Document:")
+    text_end = prompt.find("Professional Summary:")
+    return {"inputs": previous_fit_text_to_tokens(prompt[text_start:text_end].strip(), model_name)}
+
+def previous_chat_payload(model_name, question, document):
+    """The previous chat path: pack relevant passages into the prompt, then slice them back out for BART"""
+    context = utils.select_context_for_question(
+        question, document, model_name, utils.input_token_budget(model_name, utils._chat_prompt(question, ""))
+    )
+    prompt = utils._chat_prompt(question, context)
+    if "bart" not in model_name.lower():
+        return {"inputs": prompt}
+    doc_start = prompt.find("Document Content:") + len("Document Content:")
+    doc_end = prompt.find("User Question:")
+    return {"inputs": previous_fit_text_to_tokens(prompt[doc_start:doc_end].strip(), model_name)}
+
+def build_contract(size_mb):
+    """Repeat numbered clauses until the document reaches size_mb megabytes"""
+    clauses = []
+    size = 0
+    number = 0
+    while size < size_mb * 1024 * 1024:
+        clause = CLAUSE_TEMPLATE.format(number=number, fee=1000 * (number % 50 + 1))
+        clauses.append(clause)
+        size += len(clause)
+        number += 1
+    return "".join(clauses)
+
+def measure(build, repeats):
+    """Return (median seconds, peak MB, payload input characters) for build()"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        payload = build()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    build()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(timings), peak / (1024 * 1024), len(payload["inputs"])
+
+def main():
+    """Run the benchmark and print a results table"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=float, default=1)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    document = build_contract(args.size_mb)
+    summary_model = utils.GRANITE_BACKEND_MAPPING[utils.IBM_GRANITE_MODELS["summarization"]]
+    generation_model = utils.FALLBACK_MODELS["chatbot"]
+    cases = [
+        ("summary", summary_model,
+         lambda: previous_summary_payload(summary_model, document),
+         lambda: utils.get_model_backend(summary_model).build_payload(
+             summary_model, "summarization", document=document, max_words=150)),
+        ("chat", summary_model,
+         lambda: previous_chat_payload(summary_model, QUESTION, document),
+         lambda: utils.get_model_backend(summary_model).build_payload(
+             summary_model, "chatbot", document=document, question=QUESTION)),
+        ("chat", generation_model,
+         lambda: previous_chat_payload(generation_model, QUESTION, document),
+         lambda: utils.get_model_backend(generation_model).build_payload(
+             generation_model, "chatbot", document=document, question=QUESTION)),
+    ]
+
+    print(f"📊 Payload building on a {len(document) / (1024 * 1024):.1f} MB contract "
+          f"(median of {args.repeats})")
+    print("=" * 86)
+    print(f"{'Task':<8} | {'Model':<28} | {'Path':<10} | {'Time (ms)':>9} | {'Peak MB':>7} | {'Input chars':>11}")
+    print("-" * 86)
+    for task, model_name, previous, structured in cases:
+        for label, build in (("previous", previous), ("structured", structured)):
+            seconds, peak_mb, input_chars = measure(build, args.repeats)
+            print(f"{task:<8} | {model_name:<28} | {label:<10} | {seconds * 1000:>9.1f} | {peak_mb:>7.1f} | "
+                  f"{input_chars:>11,}")
+
+if __name__ == "__main__":
+    main()
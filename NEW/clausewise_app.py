@@ -3,10 +3,10 @@ import os
 from datetime import datetime
 import base64
 from utils import (
-    extract_text_from_file, save_document_to_history, get_file_type_icon,
+    ingest_uploaded_file, is_upload_ingested, get_file_type_icon,
     generate_summary, classify_document_type, extract_named_entities,
     simplify_clauses, extract_key_clauses, chatbot_response, text_to_speech,
-    highlight_entities_in_text
+    highlight_entities_in_text, run_analysis_requests, warm_up_models, upgrade_hedged_answers, watch_hedged_answers
 )
 import plotly.graph_objects as go
 
@@ -140,21 +140,20 @@ def dashboard_page():
     )
     
     if uploaded_file is not None:
-        # Process the uploaded file
+        # Process the uploaded file once; reruns reuse the ingested history entry
+        first_seen = not is_upload_ingested(uploaded_file)
+        if first_seen:
+            # Cold models load in the background while the document is extracted
+            warm_up_models()
         with st.spinner("Processing document..."):
-            extracted_text = extract_text_from_file(uploaded_file)
+            document_entry, _ = ingest_uploaded_file(uploaded_file)
             
-            if extracted_text:
-                # Save to session state
-                st.session_state.uploaded_file = uploaded_file
-                st.session_state.extracted_text = extracted_text
-                
-                # Save to history
-                save_document_to_history(
-                    uploaded_file.name,
-                    uploaded_file.type,
-                    extracted_text
-                )
+            if document_entry:
+                extracted_text = document_entry["text"]
+                if first_seen:
+                    # Save to session state
+                    st.session_state.uploaded_file = uploaded_file
+                    st.session_state.extracted_text = extracted_text
                 
                 st.success(f"✅ Successfully processed {uploaded_file.name}")
 
@@ -168,6 +167,8 @@ def dashboard_page():
 
                 # Add navigation button
                 if st.button("🔍 Go to Analysis", key="goto_analysis"):
+                    st.session_state.uploaded_file = uploaded_file
+                    st.session_state.extracted_text = extracted_text
                     st.session_state.current_page = "Analysis"
                     st.rerun()
 
@@ -201,26 +202,35 @@ def analysis_page():
         st.warning("No document selected for analysis. Please upload a document first.")
         return
     
+    # Model answers that missed their hedge deadline replace the local ones as they arrive
+    upgrade_hedged_answers()
+    
     # Document preview
     st.markdown("### 📖 Document Preview")
     with st.expander("View Document Text", expanded=False):
         st.text_area("Document Content", st.session_state.extracted_text, height=200)
     
+    # Summary and analysis are independent, so request them together
+    needs_summary = 'document_summary' not in st.session_state
+    needs_analysis = 'document_analysis' not in st.session_state
+    if needs_summary or needs_analysis:
+        with st.spinner("Analyzing document and generating summary..."):
+            results = run_analysis_requests(
+                st.session_state.extracted_text,
+                summary_length=150 if needs_summary else None,
+                include_analysis=needs_analysis
+            )
+        if 'summary' in results:
+            st.session_state.document_summary = results['summary']
+        if 'document_analysis' in results:
+            st.session_state.document_analysis = results['document_analysis']
+    
     # Analysis sections
     col1, col2 = st.columns(2)
     
     with col1:
         st.markdown("### 📊 Document Analysis")
         
-        # Generate analysis if not done
-        if 'document_analysis' not in st.session_state:
-            with st.spinner("Analyzing document..."):
-                st.session_state.document_analysis = {
-                    'document_type': classify_document_type(st.session_state.extracted_text),
-                    'key_clauses': extract_key_clauses(st.session_state.extracted_text),
-                    'entities': extract_named_entities(st.session_state.extracted_text)
-                }
-        
         analysis = st.session_state.document_analysis
         
         st.info(f"**Document Type:** {analysis['document_type']}")
@@ -230,11 +240,6 @@ def analysis_page():
     with col2:
         st.markdown("### 📄 Document Summary")
         
-        # Generate summary if not done
-        if 'document_summary' not in st.session_state:
-            with st.spinner("Generating summary..."):
-                st.session_state.document_summary = generate_summary(st.session_state.extracted_text)
-        
         st.write(st.session_state.document_summary)
         
         # TTS controls
@@ -282,6 +287,9 @@ def analysis_page():
             })
         
         st.rerun()
+    
+    if upgrade_hedged_answers()[1]:
+        watch_hedged_answers()
 
 def main():
     """Main application"""
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+ClauseWise local model server
+
+Holds one copy of each backend model and answers the Hugging Face Inference
+API protocol on a loopback port, so every Streamlit session and worker
+process shares the same weights (CLAUSEWISE_MODEL_BACKEND=server).
+Concurrent requests are collected into dynamic batches: a batch closes when
+it reaches the maximum size or when its oldest request has waited the
+maximum wait. Queue depth and batch sizes are reported on GET /metrics.
+
+Usage: python model_server.py [--port 8765] [--max-batch-size 8] [--max-wait-ms 10] [--threads N]
+"""
+
+import sys
+import os
+import json
+import time
+import threading
+import argparse
+from collections import Counter, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the current directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Batching settings
+MODEL_SERVER_MAX_BATCH_SIZE = int(os.environ.get("CLAUSEWISE_MODEL_SERVER_MAX_BATCH", "8"))
+MODEL_SERVER_MAX_WAIT_MS = float(os.environ.get("CLAUSEWISE_MODEL_SERVER_MAX_WAIT_MS", "10"))
+
+
+class DynamicBatcher:
+    """
+    Collects requests from many threads into batches for one model worker
+
+    Only requests for the same model with the same generation parameters
+    share a batch. A single worker thread runs one batch at a time, so
+    requests that arrive while a batch is running queue up and form the
+    next one.
+    """
+
+    def __init__(self, run_batch, max_batch_size=None, max_wait_ms=None):
+        # run_batch(model_name, parameters, inputs) returns one result per input
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size or MODEL_SERVER_MAX_BATCH_SIZE
+        self.max_wait = (MODEL_SERVER_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._batch_sizes = Counter()
+        self._requests = 0
+        self._max_queue_depth = 0
+        self._queue_wait_total = 0.0
+        self._batch_seconds_total = 0.0
+        threading.Thread(target=self._work, daemon=True, name="clausewise-batcher").start()
+
+    def submit(self, model_name, parameters, inputs):
+        """Queue one request and return a Future for its result"""
+        future = Future()
+        key = (model_name, json.dumps(parameters, sort_keys=True))
+        with self._condition:
+            self._queue.append((key, parameters, inputs, future, time.monotonic()))
+            self._requests += 1
+            self._max_queue_depth = max(self._max_queue_depth, len(self._queue))
+            self._condition.notify()
+        return future
+
+    def _take_batch(self):
+        """Block until a batch is ready and remove it from the queue"""
+        with self._condition:
+            while not self._queue:
+                self._condition.wait()
+            first = self._queue.popleft()
+            batch = [first]
+            deadline = first[4] + self.max_wait
+            while len(batch) < self.max_batch_size:
+                for item in list(self._queue):
+                    if item[0] == first[0] and len(batch) < self.max_batch_size:
+                        self._queue.remove(item)
+                        batch.append(item)
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.max_batch_size or remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return batch
+
+    def _work(self):
+        while True:
+            batch = self._take_batch()
+            (model_name, _), parameters = batch[0][0], batch[0][1]
+            started = time.monotonic()
+            try:
+                results = list(self.run_batch(model_name, parameters, [item[2] for item in batch]))
+                if len(results) != len(batch):
+                    # Results that cannot be paired with their requests are not handed out at all
+                    raise RuntimeError(f"{model_name} returned {len(results)} results for a batch of {len(batch)}")
+            except BaseException as e:
+                # Fail this batch's requests, never the worker thread: it serves every later request
+                error = e if isinstance(e, Exception) else RuntimeError(f"Batch failed: {e!r}")
+                for item in batch:
+                    item[3].set_exception(error)
+            else:
+                for item, result in zip(batch, results):
+                    item[3].set_result(result)
+            finished = time.monotonic()
+            with self._condition:
+                self._batch_sizes[len(batch)] += 1
+                self._queue_wait_total += sum(started - item[4] for item in batch)
+                self._batch_seconds_total += finished - started
+
+    def metrics(self):
+        """Queue depth, batch-size histogram and timing totals since start"""
+        with self._condition:
+            batches = sum(self._batch_sizes.values())
+            batched_requests = sum(size * count for size, count in self._batch_sizes.items())
+            return {
+                "requests": self._requests,
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self._max_queue_depth,
+                "batches": batches,
+                "batch_sizes": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+                "mean_batch_size": batched_requests / batches if batches else 0.0,
+                "mean_queue_wait_ms": 1000 * self._queue_wait_total / batched_requests if batched_requests else 0.0,
+                "mean_batch_ms": 1000 * self._batch_seconds_total / batches if batches else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+
+def pipeline_batch_runner(threads=None):
+    """Return a run_batch function backed by one CPU pipeline per model, loaded on first use"""
+    import utils
+
+    pipelines = {}
+    lock = threading.Lock()
+
+    def run_batch(model_name, parameters, inputs):
+        with lock:
+            if model_name not in pipelines:
+                pipelines[model_name] = utils._load_local_pipeline(model_name, threads or utils.LOCAL_INFERENCE_THREADS)
+        outputs = pipelines[model_name](inputs, batch_size=len(inputs), truncation=True, **parameters)
+        # Summarization yields one dict per input, text generation a list per input;
+        # each request gets the list the Inference API would return
+        return [output if isinstance(output, list) else [output] for output in outputs]
+
+    return run_batch
+
+
+class ModelServerHandler(BaseHTTPRequestHandler):
+    """POST /models/<model> runs inference; GET /metrics reports the batcher"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    batcher = None  # Set by start_model_server
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.path.startswith("/models/"):
+            return self._send_json(404, {"error": "Unknown path"})
+        try:
+            request = json.loads(body)
+            inputs = request["inputs"]
+        except (ValueError, KeyError):
+            return self._send_json(400, {"error": "Expected a JSON body with inputs"})
+
+        future = self.batcher.submit(self.path[len("/models/"):], request.get("parameters", {}), inputs)
+        try:
+            self._send_json(200, future.result())
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            return self._send_json(200, self.batcher.metrics())
+        self._send_json(404, {"error": "Unknown path"})
+
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_model_server(run_batch, host="127.0.0.1", port=0, max_batch_size=None, max_wait_ms=None):
+    """Start the server on a background thread and return (server, base_url)"""
+    handler = type("BoundModelServerHandler", (ModelServerHandler,), {
+        "batcher": DynamicBatcher(run_batch, max_batch_size, max_wait_ms)
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    """Run the model server until interrupted"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch-size", type=int, default=MODEL_SERVER_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=MODEL_SERVER_MAX_WAIT_MS)
+    parser.add_argument("--threads", type=int, default=None, help="CPU threads for inference")
+    args = parser.parse_args()
+
+    server, base_url = start_model_server(
+        pipeline_batch_runner(args.threads), args.host, args.port, args.max_batch_size, args.max_wait_ms
+    )
+    print(f"🚀 ClauseWise model server listening on {base_url}")
+    print(f"   Batches of up to {args.max_batch_size}, waiting at most {args.max_wait_ms:g} ms")
+    print(f"   Set CLAUSEWISE_MODEL_BACKEND=server and CLAUSEWISE_MODEL_SERVER_URL={base_url} for the app")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
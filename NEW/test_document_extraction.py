@@ -0,0 +1,671 @@
+#!/usr/bin/env python3
+"""
+Test script for document text extraction
+
+This script builds small sample documents in memory and checks that the
+extraction helpers in utils.py return the expected text.
+"""
+
+import sys
+import os
+import io
+import functools
+
+# Add the current directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Mock streamlit for testing
+class MockStreamlit:
+    def info(self, msg): print(f"ℹ️ INFO: {msg}")
+    def success(self, msg): print(f"✅ SUCCESS: {msg}")
+    def warning(self, msg): print(f"⚠️ WARNING: {msg}")
+    def error(self, msg): print(f"❌ ERROR: {msg}")
+    def cache_resource(self, **kwargs): return functools.lru_cache(maxsize=None)
+
+if 'streamlit' not in sys.modules:
+    sys.modules['streamlit'] = MockStreamlit()
+
+
+def build_sample_pdf(pages):
+    """
+    Build a minimal PDF with Helvetica text
+
+    Each page is either a string (one text block at the top left, one line
+    per newline) or a list of (x, y, text) blocks for multi-column layouts.
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for page in pages:
+        blocks = [(72, 720, page)] if isinstance(page, str) else page
+        operators = []
+        for x, y, block_text in blocks:
+            lines = [f"({line.replace('(', '[').replace(')', ']')}) Tj T*" for line in block_text.split("\n")]
+            operators.append(f"BT /F1 11 Tf 14 TL {x} {y} Td " + " ".join(lines) + " ET")
+        stream = " ".join(operators).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = " ".join(f"{ref} 0 R" for ref in page_refs).encode()
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_refs)
+
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(output.tell())
+        output.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref_offset = output.tell()
+    output.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        output.write(b"%010d 00000 n \n" % offset)
+    output.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset))
+    return output.getvalue()
+
+
+class SampleUpload(io.BytesIO):
+    """In-memory stand-in for a Streamlit UploadedFile"""
+
+    def __init__(self, data, name, file_type):
+        super().__init__(data)
+        self.name = name
+        self.type = file_type
+
+
+def test_pdf_page_streaming():
+    """Test that PDF pages are yielded in order with progress callbacks"""
+    print("🔍 Testing PDF Page Streaming")
+    print("=" * 29)
+
+    from utils import iter_pdf_pages, extract_text_from_pdf
+
+    pages = [f"Page {number} of the master services agreement" for number in range(1, 6)]
+    pdf_bytes = build_sample_pdf(pages)
+
+    streamed = list(iter_pdf_pages(io.BytesIO(pdf_bytes)))
+    print(f"Pages streamed: {len(streamed)}")
+    in_order = [page_number for page_number, _, _ in streamed] == [1, 2, 3, 4, 5]
+
+    progress = []
+    text = extract_text_from_pdf(
+        io.BytesIO(pdf_bytes),
+        progress_callback=lambda page_number, total_pages, page_text: progress.append((page_number, total_pages))
+    )
+    print(f"Progress updates: {progress}")
+
+    all_pages_present = all(page_text in text for page_text in pages)
+    progress_complete = progress == [(number, 5) for number in range(1, 6)]
+
+    if in_order and all_pages_present and progress_complete:
+        print("✅ Pages streamed in order with per-page progress")
+        return True
+    print("❌ Page streaming did not match the expected output")
+    return False
+
+
+def test_parallel_pdf_extraction():
+    """Test that parallel extraction matches serial extraction and reuses one process pool"""
+    print("\n🔍 Testing Parallel PDF Extraction")
+    print("=" * 33)
+
+    import utils
+    from utils import extract_text_from_pdf, split_page_ranges
+
+    left_column = "\n".join(f"Left column clause {number} shall apply" for number in range(20))
+    right_column = "\n".join(f"Right column clause {number} shall apply" for number in range(20))
+    pages = [f"Clause {number}: the Supplier shall deliver item {number}" for number in range(1, 13)]
+    # Two-column pages fail the text-layer check and are the ones sent to the pool
+    pages[3] = pages[8] = [(40, 720, left_column), (320, 720, right_column)]
+    pdf_bytes = build_sample_pdf(pages)
+
+    original_workers = utils.PDF_EXTRACTION_WORKERS
+    utils.PDF_EXTRACTION_WORKERS = 2
+    try:
+        serial_metrics, parallel_metrics = [], []
+        serial_text = extract_text_from_pdf(io.BytesIO(pdf_bytes), parallel=False, metrics=serial_metrics)
+        parallel_text = extract_text_from_pdf(io.BytesIO(pdf_bytes), parallel=True, metrics=parallel_metrics)
+        first_pool = utils._PROCESS_POOL
+        second_text = extract_text_from_pdf(io.BytesIO(build_sample_pdf(pages[::-1])), parallel=True)
+        pool_reused = first_pool is not None and utils._PROCESS_POOL is first_pool
+    finally:
+        utils.PDF_EXTRACTION_WORKERS = original_workers
+    print(f"Serial length: {len(serial_text)}, parallel length: {len(parallel_text)}, pool reused: {pool_reused}")
+
+    ranges = split_page_ranges(12, 2)
+    covered = [page for start, end in ranges for page in range(start, end)]
+    print(f"Page ranges for 2 workers: {ranges}")
+
+    serial_paths = [(record["page"], record["path"]) for record in serial_metrics]
+    parallel_paths = [(record["page"], record["path"]) for record in parallel_metrics]
+    if (
+        serial_text == parallel_text and serial_paths == parallel_paths
+        and "Right column clause 19" in second_text
+        and pool_reused and covered == list(range(12))
+    ):
+        print("✅ Parallel extraction reassembled pages in order using one shared pool")
+        return True
+    print("❌ Parallel extraction output differs from serial output")
+    return False
+
+
+def test_extraction_cache():
+    """Test that repeat uploads are served from the content-addressed cache"""
+    print("\n🔍 Testing Extraction Cache")
+    print("=" * 26)
+
+    import tempfile
+    import time
+    import utils
+
+    utils.CACHE_DIR = tempfile.mkdtemp(prefix="clausewise-cache-")
+    upload = SampleUpload(b"This Agreement is made between the parties.", "contract.txt", "text/plain")
+
+    first_text = utils.extract_text_from_file(upload)
+    # A cache hit must not touch the extractor at all
+    original_extractor = utils._extract_text_by_type
+    utils._extract_text_by_type = lambda *args, **kwargs: None
+    try:
+        start = time.perf_counter()
+        cached_text = utils.extract_text_from_file(SampleUpload(upload.getvalue(), "copy.txt", "text/plain"))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+    finally:
+        utils._extract_text_by_type = original_extractor
+    print(f"Cache hit served in {elapsed_ms:.2f} ms")
+
+    # Fill past a tiny cap and check the least recently used entry is evicted
+    utils.disk_cache_put("lru-test", "aa01", b"x" * 10, max_bytes=25)
+    time.sleep(0.01)
+    utils.disk_cache_put("lru-test", "aa02", b"x" * 10, max_bytes=25)
+    time.sleep(0.01)
+    utils.disk_cache_get("lru-test", "aa01")
+    time.sleep(0.01)
+    utils.disk_cache_put("lru-test", "aa03", b"x" * 10, max_bytes=25)
+    evicted = utils.disk_cache_get("lru-test", "aa02") is None
+    kept = utils.disk_cache_get("lru-test", "aa01") is not None
+    print(f"LRU eviction: evicted={evicted}, recently used kept={kept}")
+
+    # Writes under the cap must not rescan the namespace
+    scans = []
+    original_evict = utils._evict_disk_cache
+    utils._evict_disk_cache = lambda *args: scans.append(args) or original_evict(*args)
+    try:
+        for number in range(10):
+            utils.disk_cache_put("scan-test", f"bb{number:02d}", b"x" * 10, max_bytes=1000)
+    finally:
+        utils._evict_disk_cache = original_evict
+    print(f"Namespace scans for 10 writes under the cap: {len(scans)}")
+
+    if first_text and cached_text == first_text and evicted and kept and len(scans) == 1:
+        print("✅ Extraction cache serves repeat uploads with LRU eviction")
+        return True
+    print("❌ Extraction cache did not behave as expected")
+    return False
+
+
+class MockSessionState(dict):
+    """Dict with attribute access, like st.session_state"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+def test_ingest_once():
+    """Test that reruns and re-uploads do not re-extract or duplicate history"""
+    print("\n🔍 Testing Ingest-Once Uploads")
+    print("=" * 29)
+
+    import tempfile
+    import utils
+
+    utils.CACHE_DIR = tempfile.mkdtemp(prefix="clausewise-cache-")
+    original_st = utils.st
+    session_st = MockStreamlit()
+    session_st.session_state = MockSessionState(document_history=[])
+    utils.st = session_st
+
+    extractions = []
+    hashes = []
+    original_extract, original_hash = utils.extract_text_from_file, utils.hash_upload
+    utils.hash_upload = lambda uploaded_file, *args, **kwargs: hashes.append(uploaded_file.name) or original_hash(
+        uploaded_file, *args, **kwargs)
+
+    def counting_extract(uploaded_file, **kwargs):
+        extractions.append(uploaded_file.name)
+        return original_extract(uploaded_file, **kwargs)
+
+    utils.extract_text_from_file = counting_extract
+    try:
+        data = b"This Lease Agreement is between the landlord and the tenant."
+        upload = SampleUpload(data, "lease.txt", "text/plain")
+        for _ in range(5):  # Simulate widget-click reruns
+            utils.ingest_uploaded_file(upload)
+        # Same bytes uploaded again under another name
+        entry, is_new = utils.ingest_uploaded_file(SampleUpload(data, "lease-copy.txt", "text/plain"))
+        other_entry, other_is_new = utils.ingest_uploaded_file(
+            SampleUpload(b"A different Employment Agreement.", "employment.txt", "text/plain")
+        )
+        history = session_st.session_state.document_history
+    finally:
+        utils.extract_text_from_file, utils.hash_upload = original_extract, original_hash
+        utils.st = original_st
+
+    print(f"Extractions: {extractions}")
+    print(f"Uploads hashed: {hashes}")
+    print(f"History entries: {[doc['filename'] for doc in history]}")
+
+    if (
+        extractions == ["lease.txt", "employment.txt"] and len(history) == 2 and not is_new and other_is_new
+        and hashes == ["lease.txt", "lease-copy.txt", "employment.txt"]
+    ):
+        print("✅ Each distinct document was extracted and recorded exactly once")
+        return True
+    print("❌ Uploads were re-extracted or duplicated in history")
+    return False
+
+
+def build_sample_docx(paragraphs, table_rows, header_text, footer_text):
+    """Build a DOCX with body paragraphs, one table, a header and a footer"""
+    from docx import Document
+
+    document = Document()
+    section = document.sections[0]
+    section.header.paragraphs[0].text = header_text
+    section.footer.paragraphs[0].text = footer_text
+    for paragraph_text in paragraphs:
+        document.add_paragraph(paragraph_text)
+    table = document.add_table(rows=len(table_rows), cols=len(table_rows[0]))
+    for row_index, row in enumerate(table_rows):
+        for column_index, cell_text in enumerate(row):
+            table.cell(row_index, column_index).text = cell_text
+    document.add_paragraph("Signed by both parties.")
+
+    output = io.BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+
+def add_docx_text_box(docx_bytes, anchor_text, box_text, text_after):
+    """Insert a text box (DrawingML with its VML fallback) after the run holding anchor_text"""
+    import zipfile
+
+    text_box = f"<w:p><w:r><w:t>{box_text}</w:t></w:r></w:p>"
+    runs = (
+        '<w:r><mc:AlternateContent xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006">'
+        '<mc:Choice Requires="wps"><w:drawing>'
+        '<wps:txbx xmlns:wps="http://schemas.microsoft.com/office/word/2010/wordprocessingShape">'
+        f'<w:txbxContent>{text_box}</w:txbxContent></wps:txbx></w:drawing></mc:Choice>'
+        '<mc:Fallback><w:pict><v:textbox xmlns:v="urn:schemas-microsoft-com:vml">'
+        f'<w:txbxContent>{text_box}</w:txbxContent></v:textbox></w:pict></mc:Fallback>'
+        '</mc:AlternateContent></w:r>'
+        f'<w:r><w:t xml:space="preserve">{text_after}</w:t></w:r>'
+    )
+    source, output = zipfile.ZipFile(io.BytesIO(docx_bytes)), io.BytesIO()
+    with zipfile.ZipFile(output, "w") as archive:
+        for item in source.infolist():
+            data = source.read(item.filename)
+            if item.filename == "word/document.xml":
+                anchor = f"<w:t>{anchor_text}</w:t></w:r>".encode()
+                data = data.replace(anchor, anchor + runs.encode(), 1)
+            archive.writestr(item, data)
+    return output.getvalue()
+
+
+def test_streaming_docx_extraction():
+    """Test that the streaming DOCX extractor keeps document order and table text"""
+    print("\n🔍 Testing Streaming DOCX Extraction")
+    print("=" * 35)
+
+    from utils import extract_text_from_docx
+
+    docx_bytes = build_sample_docx(
+        ["This Services Agreement is made between Acme Corp and Beta LLC.", "The term is one year."],
+        [["Milestone", "Fee"], ["Design", "$10,000"], ["Delivery", "$25,000"]],
+        "CONFIDENTIAL - Services Agreement",
+        "Page footer: Acme Corp"
+    )
+    docx_bytes = add_docx_text_box(docx_bytes, "The term is one year.", "Note: fees exclude VAT.",
+                                   " It renews automatically.")
+    text = extract_text_from_docx(io.BytesIO(docx_bytes))
+    print(text)
+
+    expected_order = [
+        "CONFIDENTIAL - Services Agreement",
+        "This Services Agreement is made between Acme Corp and Beta LLC.",
+        "Note: fees exclude VAT.",
+        "The term is one year. It renews automatically.",
+        "Milestone", "Fee", "Design", "$10,000", "Delivery", "$25,000",
+        "Signed by both parties.",
+        "Page footer: Acme Corp",
+    ]
+    positions = [text.find(fragment) for fragment in expected_order]
+    print(f"Fragment positions: {positions}")
+
+    text_box_once = text.count("Note: fees exclude VAT.") == 1
+    print(f"Text box extracted once: {text_box_once}")
+
+    if -1 not in positions and positions == sorted(positions) and text_box_once:
+        print("✅ Header, body, text box, table cells and footer extracted in document order")
+        return True
+    print("❌ DOCX text missing or out of order")
+    return False
+
+
+def test_txt_encodings():
+    """Test incremental TXT decoding across encodings and chunk boundaries"""
+    print("\n🔍 Testing TXT Encoding Detection")
+    print("=" * 32)
+
+    import codecs
+    from utils import iter_txt_text
+
+    text = "Café Société — the Lessee shall pay €1,200 per month. Naïve façade clause.\n" * 50
+    samples = {
+        "utf-8": text.encode("utf-8"),
+        "utf-8 with BOM": codecs.BOM_UTF8 + text.encode("utf-8"),
+        "utf-16 with BOM": text.encode("utf-16"),
+        "utf-16-le without BOM": text.encode("utf-16-le"),
+        "latin-1": text.replace("—", "-").replace("€", "EUR ").encode("latin-1"),
+    }
+
+    all_correct = True
+    for label, data in samples.items():
+        expected = text if label != "latin-1" else text.replace("—", "-").replace("€", "EUR ")
+        # A tiny chunk size forces multi-byte characters to straddle chunk boundaries
+        decoded = "".join(iter_txt_text(io.BytesIO(data), chunk_size=7))
+        correct = decoded == expected
+        all_correct = all_correct and correct
+        print(f"{'✅' if correct else '❌'} {label}")
+
+    return all_correct
+
+
+def test_tiered_pdf_extraction():
+    """Test that clean pages use the text layer and multi-column pages fall back"""
+    print("\n🔍 Testing Tiered PDF Extraction")
+    print("=" * 31)
+
+    from utils import extract_text_from_pdf, _load_pdfium
+
+    if _load_pdfium() is None:
+        print("⚠️ pypdfium2 not installed - every page uses pdfplumber")
+        return True
+
+    left_column = "\n".join(f"Left column clause {number} shall apply" for number in range(20))
+    right_column = "\n".join(f"Right column clause {number} shall apply" for number in range(20))
+    pages = [
+        "This Agreement is made between Acme Corp and Beta LLC.\nThe term is twelve months.",
+        [(40, 720, left_column), (320, 720, right_column)],
+    ]
+    metrics = []
+    text = extract_text_from_pdf(io.BytesIO(build_sample_pdf(pages)), parallel=False, metrics=metrics)
+    paths = [record["path"] for record in metrics]
+    print(f"Paths taken: {paths}")
+
+    if paths == ["text_layer", "pdfplumber"] and "Acme Corp" in text and "Right column clause 19" in text:
+        print("✅ Clean page read from the text layer, two-column page sent to pdfplumber")
+        return True
+    print("❌ Pages did not take the expected extraction paths")
+    return False
+
+
+def test_ocr_scanned_pages():
+    """Test that blank pages are OCRed once and then answered from the OCR cache"""
+    print("\n🔍 Testing OCR of Scanned Pages")
+    print("=" * 30)
+
+    import types
+    import tempfile
+    import utils
+
+    # Stand-in engine: the Tesseract binary is not needed to check the routing and caching
+    ocr_calls = []
+    fake_tesseract = types.ModuleType("pytesseract")
+    fake_tesseract.image_to_string = lambda image, lang=None: ocr_calls.append(image.size) or "Scanned signature page"
+
+    pdf_bytes = build_sample_pdf(["The Lessee shall pay rent monthly.", ""])
+    original = (sys.modules.get("pytesseract"), utils.CACHE_DIR, utils.OCR_WORKERS)
+    sys.modules["pytesseract"] = fake_tesseract
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            utils.CACHE_DIR, utils.OCR_WORKERS = cache_dir, 1
+            runs = []
+            for _ in range(2):
+                metrics = []
+                text = utils.extract_text_from_pdf(io.BytesIO(pdf_bytes), parallel=False, metrics=metrics, ocr=True)
+                runs.append((text, metrics))
+    finally:
+        if original[0] is None:
+            sys.modules.pop("pytesseract", None)
+        else:
+            sys.modules["pytesseract"] = original[0]
+        utils.CACHE_DIR, utils.OCR_WORKERS = original[1], original[2]
+
+    (first_text, first_metrics), (second_text, second_metrics) = runs
+    print(f"OCR engine calls: {len(ocr_calls)}, paths: {[record['path'] for record in first_metrics]}")
+
+    if (
+        "Lessee" in first_text and "Scanned signature page" in first_text
+        and first_text == second_text
+        and [record["path"] for record in first_metrics][1] == "ocr"
+        and first_metrics[1]["ocr_cached"] is False
+        and second_metrics[1]["ocr_cached"] is True
+        and len(ocr_calls) == 1
+    ):
+        print("✅ Blank page OCRed once, second extraction served from the OCR cache")
+        return True
+    print("❌ OCR routing or caching did not behave as expected")
+    return False
+
+
+def test_ocr_gaps_not_cached():
+    """Test that text with pages OCR could not read is not cached as final"""
+    print("\n🔍 Testing OCR Gaps Are Not Cached")
+    print("=" * 33)
+
+    import types
+    import tempfile
+    import utils
+
+    fake_tesseract = types.ModuleType("pytesseract")
+    fake_tesseract.image_to_string = lambda image, lang=None: "Scanned signature page"
+    pdf_bytes = build_sample_pdf(["The Lessee shall pay rent monthly.", ""])
+
+    original = (utils.CACHE_DIR, utils.OCR_WORKERS, utils.OCR_ENABLED, utils._load_pytesseract, utils.st.warning)
+    texts = {}
+    warnings = []
+    utils.st.warning = warnings.append
+    utils._OCR_WARNED_SESSIONS.clear()
+    try:
+        utils.CACHE_DIR, utils.OCR_WORKERS = tempfile.mkdtemp(prefix="clausewise-cache-"), 1
+        # OCR switched off, then no engine installed, then OCR working
+        utils.OCR_ENABLED = False
+        texts["disabled"] = utils.extract_text_from_file(SampleUpload(pdf_bytes, "lease.pdf", "application/pdf"))
+        utils.OCR_ENABLED, utils._load_pytesseract = True, lambda: None
+        texts["missing"] = utils.extract_text_from_file(SampleUpload(pdf_bytes, "lease.pdf", "application/pdf"))
+        utils.extract_text_from_file(SampleUpload(pdf_bytes, "lease-copy.pdf", "application/pdf"))
+        utils._load_pytesseract = lambda: fake_tesseract
+        texts["ocr"] = utils.extract_text_from_file(SampleUpload(pdf_bytes, "lease.pdf", "application/pdf"))
+        cached = utils.disk_cache_get("extraction", utils.extraction_cache_key(SampleUpload(pdf_bytes, "lease.pdf",
+                                                                                            "application/pdf")))
+    finally:
+        utils.CACHE_DIR, utils.OCR_WORKERS, utils.OCR_ENABLED, utils._load_pytesseract, utils.st.warning = original
+
+    print(f"Scanned page read: { {mode: 'Scanned signature page' in (text or '') for mode, text in texts.items()} }")
+    print(f"Warnings about the missing engine: {len(warnings)}")
+
+    if (
+        all("Lessee" in (text or "") for text in texts.values())
+        and "Scanned signature page" not in texts["disabled"] + texts["missing"]
+        and "Scanned signature page" in texts["ocr"]
+        and cached is not None and b"Scanned signature page" in cached
+        and len(warnings) == 1 and "tesseract" in warnings[0].lower()
+    ):
+        print("✅ Partial text returned uncached; the upload was OCRed once an engine was available")
+        return True
+    print("❌ Text with unread pages was cached as final")
+    return False
+
+
+def test_batch_ingest():
+    """Test the batch pipeline: ZIP expansion, duplicates, incremental history writes"""
+    print("\n🔍 Testing Batch Ingest Pipeline")
+    print("=" * 31)
+
+    import zipfile
+    import utils
+
+    original_st, original_summary = utils.st, utils.generate_summary
+    session_st = MockStreamlit()
+    session_st.session_state = MockSessionState(document_history=[])
+    utils.st = session_st
+    # The summary stage calls the model API; a stand-in keeps the test offline
+    utils.generate_summary = lambda text, **kwargs: f"Summary of {len(text)} characters"
+
+    archive_bytes = io.BytesIO()
+    with zipfile.ZipFile(archive_bytes, "w") as archive:
+        archive.writestr("dataroom/lease.txt", "This Lease Agreement is between the landlord and the tenant.")
+        archive.writestr("dataroom/nda.txt", "This confidential disclosure agreement covers proprietary data.")
+        archive.writestr("dataroom/logo.png", b"\x89PNG not a contract")
+    uploads = [
+        SampleUpload(b"The employee shall receive a salary and benefits.", "employment.txt", "text/plain"),
+        SampleUpload(archive_bytes.getvalue(), "dataroom.zip", "application/zip"),
+        SampleUpload(b"This Lease Agreement is between the landlord and the tenant.", "lease-copy.txt", "text/plain"),
+    ]
+
+    history_sizes = []
+    try:
+        rows = utils.run_batch_ingest(
+            uploads,
+            on_update=lambda status_rows: history_sizes.append(len(session_st.session_state.document_history)),
+            extraction_workers=2,
+            analysis_workers=2
+        )
+        history = session_st.session_state.document_history
+    finally:
+        utils.st, utils.generate_summary = original_st, original_summary
+
+    statuses = {row["File"]: row["Status"] for row in rows}
+    print(f"Statuses: {statuses}")
+    print(f"History sizes seen by status updates: {history_sizes}")
+
+    expected = {
+        "employment.txt": utils.BATCH_STATUS_DONE,
+        "dataroom.zip/dataroom/lease.txt": utils.BATCH_STATUS_DONE,
+        "dataroom.zip/dataroom/nda.txt": utils.BATCH_STATUS_DONE,
+        "dataroom.zip/dataroom/logo.png": utils.BATCH_STATUS_SKIPPED,
+        "lease-copy.txt": utils.BATCH_STATUS_DUPLICATE,
+    }
+    analysed = all(entry.get("analysis", {}).get("summary", "").startswith("Summary of") for entry in history)
+    incremental = any(0 < size < 3 for size in history_sizes)
+
+    if statuses == expected and len(history) == 3 and analysed and incremental:
+        print("✅ Batch expanded, de-duplicated and written to history as documents finished")
+        return True
+    print("❌ Batch pipeline did not produce the expected statuses or history")
+    return False
+
+
+def test_archive_streaming():
+    """Test that archive members stream one at a time, filtered by type and size"""
+    print("\n🔍 Testing Streaming Archive Ingestion")
+    print("=" * 37)
+
+    import zipfile
+    import tracemalloc
+    from utils import expand_batch_uploads, extract_text_from_file, _release_batch_upload
+
+    member_bytes = 2 * 1024 * 1024
+    archive_bytes = io.BytesIO()
+    with zipfile.ZipFile(archive_bytes, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for number in range(10):
+            clause = f"Clause {number}: the Supplier shall indemnify the Customer.\n"
+            archive.writestr(f"contracts/contract-{number}.txt", clause * (member_bytes // len(clause)))
+        archive.writestr("contracts/scan.tiff", b"II*\x00" * 1000)
+    archive_upload = SampleUpload(archive_bytes.getvalue(), "dataroom.zip", "application/zip")
+    total_uncompressed = 10 * member_bytes
+
+    skipped = []
+    characters = []
+    tracemalloc.start()
+    # The batch pipeline's path: expand, extract, then free each member before the next
+    for member in expand_batch_uploads([archive_upload], on_skip=lambda name, reason: skipped.append((name, reason))):
+        text = extract_text_from_file(member, use_cache=False)
+        _release_batch_upload(member)
+        characters.append(len(text))
+        del text
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"Members extracted: {len(characters)}, skipped: {skipped}")
+    print(f"Peak traced memory: {peak_bytes / (1024 * 1024):.1f} MB for {total_uncompressed / (1024 * 1024):.0f} MB uncompressed")
+
+    if (
+        len(characters) == 10
+        and skipped == [("dataroom.zip/contracts/scan.tiff", "unsupported file type")]
+        # Spooled member, decoded chunks and joined text: a few members' worth, never the archive
+        and peak_bytes < 4 * member_bytes
+    ):
+        print("✅ Members streamed one at a time with filters applied")
+        return True
+    print("❌ Archive members were not streamed or filtered as expected")
+    return False
+
+
+def main():
+    """Run all document extraction tests"""
+    print("🚀 Testing Document Extraction")
+    print("=" * 30)
+
+    tests = [
+        ("PDF Page Streaming", test_pdf_page_streaming),
+        ("Parallel PDF Extraction", test_parallel_pdf_extraction),
+        ("Extraction Cache", test_extraction_cache),
+        ("Ingest Once", test_ingest_once),
+        ("Streaming DOCX Extraction", test_streaming_docx_extraction),
+        ("TXT Encoding Detection", test_txt_encodings),
+        ("Tiered PDF Extraction", test_tiered_pdf_extraction),
+        ("OCR of Scanned Pages", test_ocr_scanned_pages),
+        ("OCR Gaps Not Cached", test_ocr_gaps_not_cached),
+        ("Batch Ingest Pipeline", test_batch_ingest),
+        ("Streaming Archive Ingestion", test_archive_streaming),
+    ]
+
+    results = {}
+    for test_name, test_func in tests:
+        try:
+            results[test_name] = test_func()
+        except Exception as e:
+            print(f"❌ {test_name} test failed: {str(e)}")
+            results[test_name] = False
+
+    # Summary
+    print("\n📊 Test Results Summary")
+    print("=" * 25)
+
+    passed = 0
+    for test_name, success in results.items():
+        status = "✅ PASS" if success else "❌ FAIL"
+        print(f"   {test_name}: {status}")
+        if success:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,1032 @@
+#!/usr/bin/env python3
+"""
+Test script for the model API client layer
+
+This script runs a local stand-in for the Hugging Face Inference API and
+checks the client helpers in utils.py against it, without network access.
+"""
+
+import sys
+import os
+import io
+import json
+import time
+import tempfile
+import threading
+import contextlib
+from concurrent.futures import wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the current directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import test_document_extraction  # noqa: F401 - installs the Streamlit mock before utils is imported
+
+
+class StandInInferenceHandler(BaseHTTPRequestHandler):
+    """Answers every POST like a BART summarization endpoint"""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, as the real API does
+    disable_nagle_algorithm = True  # Headers and body are written separately
+    response_delay = 0.0  # Seconds of simulated model time per request
+    request_count = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        type(self).request_count += 1
+        time.sleep(self.response_delay)
+        body = json.dumps([{"summary_text": "The Supplier shall deliver the services and the Client shall pay."}]).encode()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client gave up waiting, e.g. at its deadline
+
+    def log_message(self, *args):
+        pass
+
+
+class ColdStartInferenceHandler(StandInInferenceHandler):
+    """Answers 503 "model loading" with an estimated_time until warm_after requests have arrived"""
+
+    warm_after = 2
+    estimated_time = 0.2
+    request_times = []
+
+    def do_POST(self):
+        type(self).request_times.append(time.monotonic())
+        if len(self.request_times) > self.warm_after:
+            return super().do_POST()
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        type(self).request_count += 1
+        body = json.dumps({"error": "Model is currently loading", "estimated_time": self.estimated_time}).encode()
+        self.send_response(503)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class OutageInferenceHandler(StandInInferenceHandler):
+    """Answers 502 while `down` is set, like an unreachable upstream behind a proxy"""
+
+    down = True
+
+    def do_POST(self):
+        if not self.down:
+            return super().do_POST()
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        type(self).request_count += 1
+        self.send_response(502)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class ConcurrencyTrackingHandler(StandInInferenceHandler):
+    """Records the largest number of requests being served at once"""
+
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            super().do_POST()
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+
+def start_server(certificate=None, handler=StandInInferenceHandler):
+    """Start a stand-in server on a free port and return (server, base_url)"""
+    import ssl
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    scheme = "http"
+    if certificate:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(*certificate)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}/models"
+
+
+@contextlib.contextmanager
+def stand_in_api(handler=StandInInferenceHandler):
+    """Point utils at a fresh stand-in server and an empty cache directory"""
+    import utils
+
+    handler.request_count = 0
+    server, base_url = start_server(handler=handler)
+    original = (utils.HF_INFERENCE_URL, utils.CACHE_DIR)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        utils.HF_INFERENCE_URL, utils.CACHE_DIR = base_url, cache_dir
+        utils.RESPONSE_CACHE.clear_memory()
+        utils.reset_circuit_breakers()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):  # Mock Streamlit status messages
+                yield utils
+        finally:
+            utils.HF_INFERENCE_URL, utils.CACHE_DIR = original
+            utils.RESPONSE_CACHE.clear_memory()
+            server.shutdown()
+
+
+def test_response_cache():
+    """Test that deterministic calls are cached across memory and disk, sampled ones only on opt-in"""
+    print("🔍 Testing Model Response Cache")
+    print("=" * 30)
+
+    document = "The Supplier shall deliver the services."
+    with stand_in_api() as utils:
+        before = utils.get_response_cache_stats()
+        first = utils.query_granite_model("facebook/bart-large-cnn", document=document)
+        # Whitespace-only differences normalize to the same key
+        second = utils.query_granite_model("facebook/bart-large-cnn",
+                                           document=document.replace("shall deliver", "shall\n  deliver"))
+        utils.RESPONSE_CACHE.clear_memory()  # Simulate a server restart
+        third = utils.query_granite_model("facebook/bart-large-cnn", document=document)
+        deterministic_requests = StandInInferenceHandler.request_count
+
+        sampled_payload = {"inputs": "x", "parameters": {"do_sample": True}}
+        sampled_default = utils.is_response_cacheable(sampled_payload)
+        sampled_opt_in = utils.is_response_cacheable(sampled_payload, cache_sampled=True)
+
+        original_ttl = utils.RESPONSE_CACHE.ttl_seconds
+        utils.RESPONSE_CACHE.ttl_seconds = -1
+        expired = utils.RESPONSE_CACHE.get(utils.response_cache_key(
+            "facebook/bart-large-cnn", "summarization",
+            {"inputs": "The Supplier shall deliver the services.", "parameters": {
+                "max_length": 200, "min_length": 30, "do_sample": False, "early_stopping": True}}
+        ))
+        utils.RESPONSE_CACHE.ttl_seconds = original_ttl
+        stats = utils.get_response_cache_stats()
+
+    hits = stats["hits"] - before["hits"]
+    disk_hits = stats["disk_hits"] - before["disk_hits"]
+    print(f"Requests sent: {deterministic_requests}, hits: {hits}, disk hits: {disk_hits}")
+    print(f"Sampled cacheable by default: {sampled_default}, with opt-in: {sampled_opt_in}")
+
+    if (
+        first == second == third
+        and deterministic_requests == 1
+        and hits == 2 and disk_hits == 1
+        and not sampled_default and sampled_opt_in
+        and expired is None
+    ):
+        print("✅ Identical calls served from memory, then disk; expired entries dropped")
+        return True
+    print("❌ Response cache did not behave as expected")
+    return False
+
+
+def test_retry_policy():
+    """Test estimated_time/Retry-After handling, the retry budget and non-blocking waits"""
+    print("\n🔍 Testing Retry Policy")
+    print("=" * 22)
+
+    import asyncio
+
+    ColdStartInferenceHandler.request_times = []
+    with stand_in_api(ColdStartInferenceHandler) as utils:
+        url = f"{utils.HF_INFERENCE_URL}/facebook/bart-large-cnn"
+        result = utils.query_huggingface_api(url, {"inputs": "The Supplier shall deliver."})
+        times = ColdStartInferenceHandler.request_times
+        gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+
+        # While one call waits out the cold start, other tasks on the loop keep running
+        ColdStartInferenceHandler.request_times = []
+
+        async def cold_and_ticking():
+            ticks = []
+            cold_call = asyncio.ensure_future(utils.post_with_retry(url, {"inputs": "a"}))
+            while not cold_call.done():
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+            await cold_call
+            return len(ticks)
+
+        ticks_during_wait = utils.run_coroutine_sync(cold_and_ticking())
+
+        # estimated_time (0.2s) above max_delay: wait max_delay and retry rather than give up
+        ColdStartInferenceHandler.request_times = []
+        capped_policy = utils.RetryPolicy(max_attempts=3, max_delay=0.05)
+        capped_response = utils.run_coroutine_sync(utils.post_with_retry(url, {"inputs": "b"}, policy=capped_policy))
+        capped_attempts = len(ColdStartInferenceHandler.request_times)
+
+    class HintResponse:
+        def __init__(self, headers):
+            self.headers = headers
+
+        def json(self):
+            raise ValueError
+
+    retry_after = utils.RetryPolicy.server_hint(HintResponse({"Retry-After": "7"}))
+    no_budget = utils.RetryBudget(ratio=0, min_per_second=0)
+    budget_blocked = not no_budget.try_spend()
+    roomy_budget = utils.RetryBudget(ratio=1, min_per_second=0)
+    roomy_budget.record_request()
+    budget_allowed = roomy_budget.try_spend()
+
+    print(f"Result: {result}, gaps between attempts: {[round(gap, 2) for gap in gaps]}")
+    print(f"Retry-After hint: {retry_after}, event loop ticks during the cold start: {ticks_during_wait}")
+    print(f"Hint above max_delay: status {capped_response.status_code} after {capped_attempts} attempts")
+
+    if (
+        result and result[0]["summary_text"]
+        and len(gaps) == 2 and all(gap >= 0.2 for gap in gaps)
+        and retry_after == 7.0
+        and budget_blocked and budget_allowed
+        # ~0.4s of waits at 10ms per tick; a blocking sleep would starve the loop
+        and ticks_during_wait >= 20
+        and capped_response.status_code == 200 and capped_attempts == 3
+    ):
+        print("✅ Retries waited for estimated_time without blocking, budget enforced")
+        return True
+    print("❌ Retry policy did not behave as expected")
+    return False
+
+
+def test_circuit_breaker():
+    """Test that the breaker opens on failures, short-circuits, and closes after a good probe"""
+    print("\n🔍 Testing Circuit Breaker")
+    print("=" * 25)
+
+    OutageInferenceHandler.down = True
+    with stand_in_api(OutageInferenceHandler) as utils:
+        utils.reset_circuit_breakers()
+        original_attempts, utils.RETRY_MAX_ATTEMPTS = utils.RETRY_MAX_ATTEMPTS, 1
+        utils.RESPONSE_CACHE_ENABLED = False
+        try:
+            model = "facebook/bart-large-cnn"
+            breaker = utils.get_circuit_breaker(f"{utils.HF_INFERENCE_URL}/{model}")
+            breaker.open_seconds = 0.3
+
+            for _ in range(utils.BREAKER_MINIMUM_CALLS):
+                utils.query_granite_model(model, "The Supplier shall deliver the services.")
+            state_after_failures = breaker.state
+            requests_before = OutageInferenceHandler.request_count
+
+            start = time.perf_counter()
+            fallback = utils.query_granite_model(model, "The Supplier shall deliver the services.")
+            short_circuit_seconds = time.perf_counter() - start
+            sent_while_open = OutageInferenceHandler.request_count - requests_before
+
+            OutageInferenceHandler.down = False
+            time.sleep(0.35)
+            recovered = utils.query_granite_model(model, "The Supplier shall deliver the services.")
+            snapshot = breaker.snapshot()
+        finally:
+            utils.RETRY_MAX_ATTEMPTS = original_attempts
+            utils.RESPONSE_CACHE_ENABLED = True
+            utils.reset_circuit_breakers()
+
+    print(f"State after failures: {state_after_failures}, requests while open: {sent_while_open}")
+    print(f"Short-circuited call: {short_circuit_seconds * 1000:.2f} ms, state after probe: {snapshot['state']}")
+
+    if (
+        state_after_failures == "open"
+        and sent_while_open == 0
+        and fallback.startswith("Document Summary:")
+        and short_circuit_seconds < 0.05
+        and recovered.startswith("The Supplier")
+        and snapshot["state"] == "closed"
+        and snapshot["short_circuited"] == 1
+    ):
+        print("✅ Breaker opened, short-circuited to local processing, then closed on a good probe")
+        return True
+    print("❌ Circuit breaker did not behave as expected")
+    return False
+
+
+def test_breaker_probe_outcomes():
+    """Test that a half-open probe always gives its slot back: hinted 503s and cancelled probes"""
+    print("\n🔍 Testing Breaker Probe Outcomes")
+    print("=" * 33)
+
+    import asyncio
+
+    def half_open_breaker(utils):
+        breaker = utils.CircuitBreaker("probe", minimum_calls=1, open_seconds=0, half_open_probes=1)
+        breaker.record_failure()
+        return breaker
+
+    ColdStartInferenceHandler.warm_after = 100  # Stays loading for the whole test
+    ColdStartInferenceHandler.request_times = []
+    with stand_in_api(ColdStartInferenceHandler) as utils:
+        breaker = half_open_breaker(utils)
+        response = utils.run_coroutine_sync(utils.post_with_retry(
+            f"{utils.HF_INFERENCE_URL}/m", {"inputs": "x"}, policy=utils.RetryPolicy(max_attempts=1), breaker=breaker
+        ))
+        after_hint = (response.status_code, breaker.state, breaker.allow_request())
+
+    StandInInferenceHandler.response_delay = 0.5
+    with stand_in_api() as utils:
+        breaker = half_open_breaker(utils)
+
+        async def cancelled_probe():
+            try:
+                await asyncio.wait_for(utils.post_with_retry(f"{utils.HF_INFERENCE_URL}/m", {"inputs": "x"},
+                                                             breaker=breaker), 0.1)
+            except asyncio.TimeoutError:
+                pass
+
+        try:
+            utils.run_coroutine_sync(cancelled_probe())
+        finally:
+            StandInInferenceHandler.response_delay = 0.0
+        after_cancel = (breaker.state, breaker.allow_request())
+
+    print(f"Hinted 503 probe: status {after_hint[0]}, breaker {after_hint[1]}, next call allowed: {after_hint[2]}")
+    print(f"Cancelled probe: breaker {after_cancel[0]}, next call allowed: {after_cancel[1]}")
+
+    if after_hint == (503, "closed", True) and after_cancel == ("half_open", True):
+        print("✅ Probes that end without a failure leave the breaker usable")
+        return True
+    print("❌ A probe kept the half-open breaker refusing calls")
+    return False
+
+
+def test_deadline_not_endpoint_failure():
+    """Test that callers running out of their own deadline never count against the endpoint's breaker"""
+    print("\n🔍 Testing Deadlines vs Circuit Breaker")
+    print("=" * 39)
+
+    import asyncio
+
+    StandInInferenceHandler.response_delay = 0.5
+    with stand_in_api() as utils:
+        url = f"{utils.HF_INFERENCE_URL}/m"
+        breaker = utils.CircuitBreaker(url, minimum_calls=2)
+        scheduler = utils.RequestScheduler(rate=0, max_in_flight=1)  # All but one expire in the queue
+
+        async def short_session():
+            with utils.Deadline(0.2):
+                try:
+                    await utils.post_with_retry(url, {"inputs": "x"}, breaker=breaker, scheduler=scheduler)
+                except utils.DeadlineExceeded:
+                    return "deadline"
+                return "answered"
+
+        async def sessions():
+            return await asyncio.gather(*(short_session() for _ in range(5)))
+
+        try:
+            outcomes = utils.run_coroutine_sync(sessions())
+        finally:
+            StandInInferenceHandler.response_delay = 0.0
+        requests_sent = StandInInferenceHandler.request_count
+        snapshot = breaker.snapshot()
+
+    print(f"Outcomes: {outcomes}, requests sent: {requests_sent}")
+    print(f"Breaker: {snapshot['state']}, recorded calls: {snapshot['recent_calls']}")
+
+    if outcomes == ["deadline"] * 5 and requests_sent == 1 and snapshot["state"] == "closed" and snapshot["recent_calls"] == 0:
+        print("✅ Expired deadlines were neither retried nor recorded as endpoint failures")
+        return True
+    print("❌ Callers' deadlines counted against a healthy endpoint")
+    return False
+
+
+def test_single_flight():
+    """Test that identical concurrent calls from several sessions share one HTTP request"""
+    print("\n🔍 Testing Single-Flight Coalescing")
+    print("=" * 34)
+
+    StandInInferenceHandler.response_delay = 0.3
+    with stand_in_api() as utils:
+        utils.RESPONSE_CACHE_ENABLED = False  # Coalescing alone must deduplicate
+        before = utils.get_single_flight_stats()
+        results = []
+        try:
+            sessions = [
+                threading.Thread(target=lambda: results.append(
+                    utils.query_granite_model("facebook/bart-large-cnn", "The Supplier shall deliver the services.")
+                ))
+                for _ in range(5)
+            ]
+            for session in sessions:
+                session.start()
+            for session in sessions:
+                session.join()
+        finally:
+            utils.RESPONSE_CACHE_ENABLED = True
+            StandInInferenceHandler.response_delay = 0.0
+        stats = utils.get_single_flight_stats()
+        requests_sent = StandInInferenceHandler.request_count
+
+    coalesced = stats["coalesced"] - before["coalesced"]
+    print(f"Requests sent: {requests_sent}, coalesced: {coalesced}, in flight after: {stats['in_flight']}")
+
+    if requests_sent == 1 and coalesced == 4 and len(set(results)) == 1 and len(results) == 5 and stats["in_flight"] == 0:
+        print("✅ Five concurrent sessions shared one in-flight call")
+        return True
+    print("❌ Identical calls were not coalesced")
+    return False
+
+
+def test_single_flight_deadline_takeover():
+    """Test that followers take over from an expired or cancelled leader and time out as DeadlineExceeded"""
+    print("\n🔍 Testing Single-Flight Deadline Takeover")
+    print("=" * 41)
+
+    import asyncio
+
+    StandInInferenceHandler.response_delay = 0.5
+    with stand_in_api() as utils:
+        url = f"{utils.HF_INFERENCE_URL}/facebook/bart-large-cnn"
+        single_flight = utils.SingleFlight()
+
+        async def session(budget, start_after, key="summary"):
+            await asyncio.sleep(start_after)
+            with utils.Deadline(budget):
+                try:
+                    response = await single_flight.run(key, lambda: utils.async_post(url, {"inputs": "x"}))
+                except utils.DeadlineExceeded:
+                    return "deadline"
+                except asyncio.TimeoutError:
+                    return "timeout"
+                return f"status {response.status_code}"
+
+        async def cancelled_leader():
+            # Like a hedge that lost its race: cancelled while its call is in flight
+            leader = asyncio.ensure_future(session(3.0, 0.0, key="cancelled"))
+            await asyncio.sleep(0.1)
+            leader.cancel()
+            return "cancelled"
+
+        async def sessions():
+            return await asyncio.gather(
+                # The short-budget leader expires first; the follower arrived while it was in flight
+                session(0.2, 0.0), session(3.0, 0.05),
+                cancelled_leader(), session(3.0, 0.05, key="cancelled"),
+                # A follower whose own budget runs out behind a slow leader
+                session(3.0, 0.0, key="slow"), session(0.2, 0.05, key="slow"),
+            )
+
+        try:
+            outcomes = utils.run_coroutine_sync(sessions())
+        finally:
+            StandInInferenceHandler.response_delay = 0.0
+        stats = single_flight.stats()
+
+    print(f"Outcomes: {outcomes}, stats: {stats}")
+
+    expected = ["deadline", "status 200", "cancelled", "status 200", "status 200", "deadline"]
+    if outcomes == expected and stats["takeovers"] == 2 and stats["in_flight"] == 0:
+        print("✅ Followers re-ran the call instead of inheriting the leader's deadline or cancellation")
+        return True
+    print("❌ A follower failed with its leader's deadline or cancellation, or timed out without DeadlineExceeded")
+    return False
+
+
+def test_batch_model_summary():
+    """Test that batch analysis stores the model's summary, not a hedged local stand-in"""
+    print("\n🔍 Testing Batch Model Summaries")
+    print("=" * 32)
+
+    from test_document_extraction import MockStreamlit, MockSessionState, SampleUpload
+
+    StandInInferenceHandler.response_delay = 0.5
+    with stand_in_api() as utils:
+        original = (utils.st, utils.HEDGE_DEADLINE_SECONDS, utils.RESPONSE_CACHE_ENABLED)
+        session_st = MockStreamlit()
+        session_st.session_state = MockSessionState(document_history=[])
+        # A hedge deadline shorter than the model's answer time would serve the local summary
+        utils.st, utils.HEDGE_DEADLINE_SECONDS, utils.RESPONSE_CACHE_ENABLED = session_st, 0.1, False
+        try:
+            utils.run_batch_ingest(
+                [SampleUpload(b"The Supplier shall deliver the services. The Client shall pay the fees.",
+                              "services.txt", "text/plain")],
+                extraction_workers=1, analysis_workers=1
+            )
+            history = session_st.session_state.document_history
+        finally:
+            utils.st, utils.HEDGE_DEADLINE_SECONDS, utils.RESPONSE_CACHE_ENABLED = original
+            StandInInferenceHandler.response_delay = 0.0
+
+    summary = history[0].get("analysis", {}).get("summary") if history else None
+    print(f"Stored summary: {summary!r}")
+
+    if isinstance(summary, str) and "Client shall pay" in summary and not summary.startswith("Document Overview"):
+        print("✅ The batch entry holds the model's summary")
+        return True
+    print("❌ The batch entry kept the hedged local summary")
+    return False
+
+
+class WhitespaceTokenizer:
+    """Tokenizer stand-in: one token per whitespace-separated word, two special tokens"""
+
+    def encode(self, text, add_special_tokens=True):
+        return list(range(len(text.split()) + (2 if add_special_tokens else 0)))
+
+    def decode(self, token_ids):
+        raise AssertionError("Sentences in this test never need token-level splits")
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+
+def test_token_chunking():
+    """Test that chunks fit the backend tokenizer's budget, keep whole sentences and overlap"""
+    print("\n🔍 Testing Tokenizer-Aware Chunking")
+    print("=" * 34)
+
+    import utils
+
+    model = "facebook/bart-large-cnn"
+    original = utils._TOKENIZERS.get(model)
+    utils._TOKENIZERS[model] = WhitespaceTokenizer()
+    try:
+        text = build_long_contract(200)
+        budget = utils.input_token_budget(model)
+        chunks = utils.split_text_by_tokens(text, model, 100, overlap_tokens=30)
+        largest = max(utils.count_tokens(chunk, model) for chunk in chunks)
+        whole_sentences = all(chunk.endswith("invoice.") for chunk in chunks)
+        overlapping = all(chunk.split(". ")[0] in previous for previous, chunk in zip(chunks, chunks[1:]))
+        fitted = utils.fit_text_to_tokens(text, model)
+        fitted_tokens = utils.count_tokens(fitted, model)
+        next_sentence = text[len(fitted):].split("invoice.")[0] + "invoice."
+    finally:
+        utils._TOKENIZERS[model] = original
+
+    print(f"Budget: {budget} tokens, chunks: {len(chunks)}, largest: {largest} of 100")
+    print(f"Fitted text: {fitted_tokens} tokens, next sentence {len(next_sentence.split())} more")
+
+    if (budget == 1022 and largest <= 100 and whole_sentences and overlapping
+            and fitted_tokens <= budget < fitted_tokens + len(next_sentence.split())):
+        print("✅ Chunks pack the token budget with whole, overlapping sentences")
+        return True
+    print("❌ Chunks did not respect the token budget or sentence boundaries")
+    return False
+
+
+def test_request_scheduler():
+    """Test the shared scheduler's priority, fair queuing, in-flight cap and token bucket"""
+    print("\n🔍 Testing Request Scheduler")
+    print("=" * 28)
+
+    import asyncio
+    import utils
+
+    async def queue_behind_one_slot():
+        scheduler = utils.RequestScheduler(rate=0, max_in_flight=1)
+        order = []
+
+        async def request(name, priority, session):
+            async with scheduler.slot(priority, session):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        holder = asyncio.ensure_future(request("holder", utils.PRIORITY_BATCH, "a"))
+        await asyncio.sleep(0)
+        batch = [asyncio.ensure_future(request(f"a{number}", utils.PRIORITY_BATCH, "a")) for number in range(3)]
+        batch += [asyncio.ensure_future(request(f"b{number}", utils.PRIORITY_BATCH, "b")) for number in range(2)]
+        abandoned = asyncio.ensure_future(request("gave up", utils.PRIORITY_BATCH, "c"))
+        chat = asyncio.ensure_future(request("chat", utils.PRIORITY_INTERACTIVE, "c"))
+        await asyncio.sleep(0)
+        abandoned.cancel()
+        await asyncio.gather(holder, chat, *batch)
+        return order, scheduler.snapshot()
+
+    async def paced_by_bucket():
+        scheduler = utils.RequestScheduler(rate=20, burst=2, max_in_flight=4)
+        peak = [0]
+
+        async def request():
+            async with scheduler.slot(utils.PRIORITY_BATCH, "a"):
+                peak[0] = max(peak[0], scheduler.snapshot()["in_flight"])
+                await asyncio.sleep(0.2)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(request() for _ in range(6)))
+        return time.perf_counter() - start, peak[0], scheduler.snapshot()
+
+    order, fair_stats = utils.run_coroutine_sync(queue_behind_one_slot())
+    elapsed, peak, bucket_stats = utils.run_coroutine_sync(paced_by_bucket())
+    print(f"Grant order: {order}")
+    print(f"Bucket of 2 at 20/s, 4 in flight: 6 requests took {elapsed:.2f}s, peak in flight {peak}, "
+          f"mean queue wait {bucket_stats['mean_wait_ms']:.0f} ms")
+
+    with stand_in_api() as utils:
+        before = utils.get_request_scheduler_stats()["granted"]
+        utils.query_granite_model("facebook/bart-large-cnn", document="The Supplier shall deliver the services.")
+        after = utils.get_request_scheduler_stats()
+    print(f"Inference API attempts through the shared scheduler: {after['granted'] - before}")
+
+    fair = order == ["holder", "chat", "a0", "b0", "a1", "b1", "a2"]
+    paced = 0.35 <= elapsed < 1.0 and peak == 4 and bucket_stats["p95_wait_ms"] >= 150
+    if (fair and fair_stats["abandoned"] == 1 and fair_stats["in_flight"] == 0 and paced
+            and after["granted"] - before == 1 and after["in_flight"] == 0):
+        print("✅ Interactive requests go first, sessions alternate and the bucket paces bursts")
+        return True
+    print("❌ Scheduler did not order or pace requests as configured")
+    return False
+
+
+def test_analysis_deadline():
+    """Test that one deadline bounds every stage of an analysis run and stages fall back locally"""
+    print("\n🔍 Testing Analysis Deadline")
+    print("=" * 28)
+
+    text = build_long_contract(3)
+    question = "When must the Client pay?"
+    StandInInferenceHandler.response_delay = 5.0
+    with stand_in_api() as utils:
+        utils.RESPONSE_CACHE_ENABLED = False
+        original_hedge = utils.HEDGE_DEADLINE_SECONDS
+        utils.HEDGE_DEADLINE_SECONDS = 0  # Wait on the model, so only the deadline cuts it short
+        try:
+            start = time.perf_counter()
+            short = utils.run_analysis_requests(text, summary_length=150, include_analysis=True,
+                                                question=question, deadline=1.0)
+            short_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            slow = utils.run_analysis_requests(text, summary_length=150, question=question, deadline=2.5)
+            slow_seconds = time.perf_counter() - start
+        finally:
+            utils.RESPONSE_CACHE_ENABLED = True
+            utils.HEDGE_DEADLINE_SECONDS = original_hedge
+            StandInInferenceHandler.response_delay = 0.0
+        requests_sent = StandInInferenceHandler.request_count
+
+    short_modes = {stage["stage"]: stage["mode"] for stage in short["deadline_report"]["stages"]}
+    slow_modes = {stage["stage"]: stage["mode"] for stage in slow["deadline_report"]["stages"]}
+    print(f"1s budget: {short_seconds:.2f}s, stages {short_modes}")
+    print(f"2.5s budget, 5s model: {slow_seconds:.2f}s, stages {slow_modes}, model requests {requests_sent}")
+
+    degraded_at_once = (short_seconds < 0.5 and short["summary"].startswith("Document Overview:")
+                        and short["document_analysis"] and short_modes == {
+                            "summary": "local (time budget)", "chat_answer": "local (time budget)",
+                            "document_analysis": "local"})
+    cut_at_deadline = (2.4 < slow_seconds < 3.0 and requests_sent == 2 and slow["summary"] and slow["chat_answer"]
+                       and set(slow_modes.values()) == {"local (time budget)"})
+    if degraded_at_once and cut_at_deadline:
+        print("✅ Stages stayed within the run's deadline and fell back to local answers")
+        return True
+    print("❌ Analysis run did not respect its deadline")
+    return False
+
+
+def test_payload_builders():
+    """Test that each backend model builds its payload from structured inputs"""
+    print("\n🔍 Testing Structured Payload Builders")
+    print("=" * 38)
+
+    import utils
+
+    document = build_long_contract(400)
+    summarizer = utils.get_model_backend("ibm-granite/granite-3.0-8b-instruct")
+    generator = utils.get_model_backend("microsoft/DialoGPT-medium")
+    summary = summarizer.build_payload("facebook/bart-large-cnn", "summarization", document=document, max_words=150)
+    chat = generator.build_payload("microsoft/DialoGPT-medium", "chatbot", document=document,
+                                   question="When is Schedule 321 paid?")
+    summary_ok = (summarizer is utils.SUMMARIZATION_BACKEND and document.startswith(summary["inputs"])
+                  and "Legal Document:" not in summary["inputs"])
+    chat_ok = (generator is utils.TEXT_GENERATION_BACKEND and "Schedule 321" in chat["inputs"]
+               and chat["inputs"].rstrip().endswith("Answer:") and not chat["parameters"]["return_full_text"])
+    parsed = (summarizer.parse_response([{"summary_text": "Summary."}]),
+              generator.parse_response([{"generated_text": "Answer."}]))
+
+    print(f"Summary input: {len(summary['inputs'])} of {len(document)} characters, no template: {summary_ok}")
+    print(f"Chat input: {len(chat['inputs'])} characters, relevant clause in prompt: {chat_ok}")
+
+    if summary_ok and chat_ok and parsed == ("Summary.", "Answer."):
+        print("✅ Payloads are built from the document and question without prompt slicing")
+        return True
+    print("❌ Payload builders did not match the backend models")
+    return False
+
+
+def build_long_contract(clauses, edited_clause=None):
+    """Return contract text with numbered clauses, optionally rewording one of them"""
+    text = []
+    for number in range(clauses):
+        clause = (f"{number}. The Supplier shall deliver the services listed in Schedule {number} and the "
+                  f"Client shall pay the fees for Schedule {number} within thirty days of invoice.")
+        if number == edited_clause:
+            clause = clause.replace("thirty days", "forty-five days")
+        text.append(clause)
+    return " ".join(text)
+
+
+def test_map_reduce_summary():
+    """Test that long documents are summarized in bounded parallel chunks and edits resend only changed chunks"""
+    print("\n🔍 Testing Map-Reduce Summarization")
+    print("=" * 35)
+
+    original = build_long_contract(200)
+    edited = build_long_contract(200, edited_clause=120)
+    ConcurrencyTrackingHandler.max_in_flight = 0
+    ConcurrencyTrackingHandler.response_delay = 0.05
+    with stand_in_api(ConcurrencyTrackingHandler) as utils:
+        try:
+            chunks = utils.split_summary_chunks(original)
+            edited_chunks = utils.split_summary_chunks(edited)
+            first = utils.generate_summary(original)
+            first_requests = ConcurrencyTrackingHandler.request_count
+            second = utils.generate_summary(edited)
+            second_requests = ConcurrencyTrackingHandler.request_count - first_requests
+        finally:
+            ConcurrencyTrackingHandler.response_delay = 0.0
+        max_concurrency = utils.SUMMARY_MAX_CONCURRENCY
+
+    changed_chunks = len(set(edited_chunks) - set(chunks))
+    print(f"Chunks: {len(chunks)}, changed by edit: {changed_chunks}")
+    print(f"Requests: first run {first_requests}, after edit {second_requests}, "
+          f"peak concurrency {ConcurrencyTrackingHandler.max_in_flight}")
+
+    if (len(chunks) > 2 and changed_chunks == 1 and first_requests == len(chunks) + 1
+            and second_requests == changed_chunks
+            and 1 < ConcurrencyTrackingHandler.max_in_flight <= max_concurrency
+            and first.startswith("Legal Document Summary:") and second.startswith("Legal Document Summary:")):
+        print("✅ Whole document summarized; the edit resent only its own chunk")
+        return True
+    print("❌ Map-reduce summarization did not reuse unchanged chunks")
+    return False
+
+
+def test_local_backend():
+    """Test that the local backend answers behind the same interface without any HTTP request"""
+    print("\n🔍 Testing Local Inference Backend")
+    print("=" * 33)
+
+    loads = []
+
+    def load_pipeline(model_name, threads):
+        loads.append((model_name, threads))
+        return lambda inputs, truncation, **parameters: [{"summary_text": f"Local summary of {len(inputs)} characters."}]
+
+    with stand_in_api() as utils:
+        original = (utils.MODEL_BACKEND, utils._local_pipeline_loader, utils.LOCAL_INFERENCE_THREADS)
+        utils.MODEL_BACKEND, utils._local_pipeline_loader, utils.LOCAL_INFERENCE_THREADS = "local", load_pipeline, 2
+        try:
+            result = utils.query_granite_model(
+                "ibm-granite/granite-3.0-8b-instruct", document="The Supplier shall deliver the services."
+            )
+        finally:
+            utils.MODEL_BACKEND, utils._local_pipeline_loader, utils.LOCAL_INFERENCE_THREADS = original
+        requests_sent = StandInInferenceHandler.request_count
+
+    print(f"Result: {result}")
+    print(f"Pipelines loaded: {loads}, HTTP requests: {requests_sent}")
+
+    if (result == "Local summary of 40 characters." and requests_sent == 0
+            and loads == [("facebook/bart-large-cnn", 2)]):
+        print("✅ Mapped backend model served in-process with the configured thread count")
+        return True
+    print("❌ Local backend did not serve the request")
+    return False
+
+
+def test_model_server_failed_batches():
+    """Test that short or crashing batches fail their requests and leave the batcher serving"""
+    print("\n🔍 Testing Model Server Failed Batches")
+    print("=" * 37)
+
+    from model_server import DynamicBatcher
+
+    class WorkerKilled(BaseException):
+        """Not an Exception subclass, like SystemExit or KeyboardInterrupt"""
+
+    def run_batch(model_name, parameters, inputs):
+        if model_name == "short":
+            return [f"answer to {inputs[0]}"]
+        if model_name == "crash":
+            raise WorkerKilled("model worker died")
+        return [f"answer to {text}" for text in inputs]
+
+    batcher = DynamicBatcher(run_batch, max_batch_size=4, max_wait_ms=50)
+    outcomes = {}
+    for model_name in ("short", "crash", "healthy"):
+        futures = [batcher.submit(model_name, {}, f"clause {number}") for number in range(2)]
+        outcomes[model_name] = []
+        for future in futures:
+            try:
+                outcomes[model_name].append(future.result(timeout=2))
+            except Exception as e:
+                outcomes[model_name].append(type(e).__name__)
+
+    print(f"Outcomes: {outcomes}")
+
+    if (
+        outcomes["short"] == ["RuntimeError", "RuntimeError"]
+        and outcomes["crash"] == ["RuntimeError", "RuntimeError"]
+        and outcomes["healthy"] == ["answer to clause 0", "answer to clause 1"]
+    ):
+        print("✅ Every request of a failed batch got an error; later batches were still served")
+        return True
+    print("❌ A failed batch left requests hanging or stopped the batcher")
+    return False
+
+
+def test_model_server_batching():
+    """Test that concurrent sessions are served by the shared model server in dynamic batches"""
+    print("\n🔍 Testing Model Server Batching")
+    print("=" * 31)
+
+    import utils
+    from model_server import start_model_server
+
+    def run_batch(model_name, parameters, inputs):
+        time.sleep(0.1)  # One model pass, whatever the batch size
+        return [[{"summary_text": f"Summary of clause {text.split('.')[0]} from {model_name}."}] for text in inputs]
+
+    server, base_url = start_model_server(run_batch, max_batch_size=4, max_wait_ms=20)
+    original = (utils.MODEL_BACKEND, utils.MODEL_SERVER_URL, utils.RESPONSE_CACHE_ENABLED)
+    utils.MODEL_BACKEND, utils.MODEL_SERVER_URL, utils.RESPONSE_CACHE_ENABLED = "server", base_url, False
+    results = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            sessions = [
+                threading.Thread(target=lambda number=number: results.update({number: utils.query_granite_model(
+                    "ibm-granite/granite-3.0-8b-instruct", document=f"{number}. The Supplier shall deliver the services."
+                )}))
+                for number in range(8)
+            ]
+            for session in sessions:
+                session.start()
+            for session in sessions:
+                session.join()
+        metrics = utils.get_model_server_metrics()
+    finally:
+        utils.MODEL_BACKEND, utils.MODEL_SERVER_URL, utils.RESPONSE_CACHE_ENABLED = original
+        server.shutdown()
+
+    print(f"Batch sizes: {metrics['batch_sizes']}, mean {metrics['mean_batch_size']:.1f}, "
+          f"peak queue depth {metrics['max_queue_depth']}")
+
+    answered = all(results.get(number) == f"Summary of clause {number} from facebook/bart-large-cnn."
+                   for number in range(8))
+    if (answered and metrics["requests"] == 8 and metrics["batches"] < 8
+            and max(int(size) for size in metrics["batch_sizes"]) <= 4 and metrics["queue_depth"] == 0):
+        print("✅ Eight sessions shared the model in batches of at most four")
+        return True
+    print("❌ Requests were not batched by the model server")
+    return False
+
+
+def test_model_warmup():
+    """Test that uploads ping cold backends once and warm-state tracking suppresses repeat pings"""
+    print("\n🔍 Testing Model Warm-Up")
+    print("=" * 24)
+
+    ColdStartInferenceHandler.request_times = []
+    ColdStartInferenceHandler.warm_after = 1
+    with stand_in_api(ColdStartInferenceHandler) as utils:
+        original_warmer = utils.MODEL_WARMER
+        utils.MODEL_WARMER = warmer = utils.ModelWarmer(utils.MODEL_WARM_TTL_SECONDS)
+        granted_before = utils.REQUEST_SCHEDULER.counters["granted"]
+        try:
+            first = utils.warm_up_models()  # Triggers loading: 503 with estimated_time
+            wait(first)
+            while_loading = utils.warm_up_models()
+            states_loading = [state["state"] for state in warmer.snapshot()]
+            time.sleep(ColdStartInferenceHandler.estimated_time)
+            wait(utils.warm_up_models())  # Loading window over: ping again, now warm
+            while_warm = utils.warm_up_models()
+            states_warm = [state["state"] for state in warmer.snapshot()]
+            pings_before_call = ColdStartInferenceHandler.request_count
+            pings_scheduled = utils.REQUEST_SCHEDULER.counters["granted"] - granted_before
+            result = utils.query_granite_model("facebook/bart-large-cnn", "The Supplier shall deliver the services.")
+
+            # An open breaker means the endpoint is down: a ping must not be sent
+            breaker = utils.get_circuit_breaker(warmer.snapshot()[0]["endpoint"])
+            for _ in range(breaker.minimum_calls):
+                breaker.allow_request()
+                breaker.record_failure()
+            utils.MODEL_WARMER = blocked_warmer = utils.ModelWarmer(utils.MODEL_WARM_TTL_SECONDS)
+            sent_before_blocked = ColdStartInferenceHandler.request_count
+            wait(utils.warm_up_models())
+            blocked_sent = ColdStartInferenceHandler.request_count - sent_before_blocked
+            blocked_states = [state["state"] for state in blocked_warmer.snapshot()]
+        finally:
+            ColdStartInferenceHandler.warm_after = 2
+            utils.MODEL_WARMER = original_warmer
+        requests_sent = ColdStartInferenceHandler.request_count - blocked_sent
+
+    print(f"States: {states_loading} -> {states_warm}, pings: {warmer.pings}, suppressed: {warmer.suppressed}")
+    print(f"Requests: {pings_before_call} warm-up ({pings_scheduled} through the scheduler), "
+          f"{requests_sent - pings_before_call} for the first real call")
+    print(f"With the breaker open: {blocked_sent} ping(s) sent, states {blocked_states}")
+
+    if (len(first) == 1 and not while_loading and not while_warm and states_loading == ["loading"]
+            and states_warm == ["warm"] and pings_before_call == 2 and pings_scheduled == 2 and requests_sent == 3
+            and "Supplier" in result and blocked_sent == 0 and blocked_states == ["cold"]):
+        print("✅ One ping per backend; the first real call found the model loaded")
+        return True
+    print("❌ Warm-up pings were redundant or did not warm the model")
+    return False
+
+
+def test_hedged_requests():
+    """Test that a slow model loses to the local answer within the deadline and upgrades it later"""
+    print("\n🔍 Testing Hedged Requests")
+    print("=" * 26)
+
+    text = "The Supplier shall deliver the services. The Client shall pay the fees."
+    with stand_in_api() as utils:
+        in_time = utils.generate_summary(text, hedge_deadline=1.0)
+
+        # Status messages from hedge threads would have no Streamlit script run to draw into
+        message_threads = set()
+        originals = {name: getattr(utils.st, name) for name in ("info", "success", "warning", "error")}
+
+        def recording(original):
+            def show(*args, **kwargs):
+                message_threads.add(threading.current_thread().name)
+                return original(*args, **kwargs)
+            return show
+
+        StandInInferenceHandler.response_delay = 0.6
+        try:
+            for name, original in originals.items():
+                setattr(utils.st, name, recording(original))
+            start = time.perf_counter()
+            hedged = utils.generate_summary(text + " Either party may terminate.", hedge_deadline=0.2)
+            served_after = time.perf_counter() - start
+            before_upgrade = utils.resolve_hedged_answer(hedged)
+            hedged.upgrade.result(timeout=5)
+            after_upgrade = utils.resolve_hedged_answer(hedged)
+        finally:
+            StandInInferenceHandler.response_delay = 0.0
+            for name, original in originals.items():
+                setattr(utils.st, name, original)
+        hedge_thread_messages = [name for name in message_threads if name.startswith("clausewise-hedge")]
+
+    print(f"Fast model: {in_time[:40]}...")
+    print(f"Slow model: served {hedged[:40]}... after {served_after:.2f}s, then {after_upgrade[0][:40]}...")
+    print(f"Status messages from hedge threads: {len(hedge_thread_messages)}")
+
+    if (in_time.startswith("Legal Document Summary:") and not isinstance(in_time, utils.HedgedAnswer)
+            and hedged.startswith("Document Overview:") and served_after < 0.5 and before_upgrade[1]
+            and not hedge_thread_messages
+            and after_upgrade == ("Legal Document Summary: The Supplier shall deliver the services and the Client shall pay.", False)):
+        print("✅ Local answer served at the deadline and upgraded when the model answered")
+        return True
+    print("❌ Hedged request did not meet its deadline or was not upgraded")
+    return False
+
+
+def main():
+    """Run all model client tests"""
+    print("🚀 Testing Model Client")
+    print("=" * 23)
+
+    tests = [
+        ("Model Response Cache", test_response_cache),
+        ("Retry Policy", test_retry_policy),
+        ("Circuit Breaker", test_circuit_breaker),
+        ("Breaker Probe Outcomes", test_breaker_probe_outcomes),
+        ("Deadlines vs Circuit Breaker", test_deadline_not_endpoint_failure),
+        ("Single-Flight Coalescing", test_single_flight),
+        ("Single-Flight Deadline Takeover", test_single_flight_deadline_takeover),
+        ("Batch Model Summaries", test_batch_model_summary),
+        ("Map-Reduce Summarization", test_map_reduce_summary),
+        ("Tokenizer-Aware Chunking", test_token_chunking),
+        ("Structured Payload Builders", test_payload_builders),
+        ("Local Inference Backend", test_local_backend),
+        ("Model Server Batching", test_model_server_batching),
+        ("Model Server Failed Batches", test_model_server_failed_batches),
+        ("Model Warm-Up", test_model_warmup),
+        ("Hedged Requests", test_hedged_requests),
+        ("Request Scheduler", test_request_scheduler),
+        ("Analysis Deadline", test_analysis_deadline),
+    ]
+
+    results = {}
+    for test_name, test_func in tests:
+        try:
+            results[test_name] = test_func()
+        except Exception as e:
+            print(f"❌ {test_name} test failed: {str(e)}")
+            results[test_name] = False
+
+    # Summary
+    print("\n📊 Test Results Summary")
+    print("=" * 25)
+
+    passed = 0
+    for test_name, success in results.items():
+        status = "✅ PASS" if success else "❌ FAIL"
+        print(f"   {test_name}: {status}")
+        if success:
+            passed += 1
+
+    print(f"\n🎯 Overall: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -24,12 +24,117 @@ import io
 import base64
 from datetime import datetime
 import pdfplumber
-from docx import Document
 import time
+import re
+import codecs
+import zipfile
+import xml.etree.ElementTree as ET
+import shutil
+import tempfile
+import threading
+import multiprocessing
+import asyncio
+import contextvars
+import hashlib
+import random
+from collections import OrderedDict, deque
+from email.utils import parsedate_to_datetime
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager, contextmanager, nullcontext
 
 # Hugging Face API configuration
 HF_API_KEY = "your_huggingface_api_key_here"
 HF_HEADERS = {"Authorization": f"Bearer {HF_API_KEY}"}
+HF_INFERENCE_URL = os.environ.get("CLAUSEWISE_HF_INFERENCE_URL", "https://api-inference.huggingface.co/models")
+
+# HTTP connection pooling - one keep-alive session is shared by every inference call
+HTTP_POOL_CONNECTIONS = int(os.environ.get("CLAUSEWISE_HTTP_POOL_CONNECTIONS", "4"))   # Distinct hosts kept pooled
+HTTP_POOL_MAXSIZE = int(os.environ.get("CLAUSEWISE_HTTP_POOL_SIZE", "16"))             # Open connections per host
+# Per-request timeout for model calls, in seconds
+MODEL_REQUEST_TIMEOUT = float(os.environ.get("CLAUSEWISE_MODEL_TIMEOUT", "45"))
+
+# Retry policy for model calls: exponential backoff with full jitter, capped per wait and in total
+RETRY_MAX_ATTEMPTS = int(os.environ.get("CLAUSEWISE_RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.environ.get("CLAUSEWISE_RETRY_BASE_DELAY", "1.0"))
+RETRY_MAX_DELAY = float(os.environ.get("CLAUSEWISE_RETRY_MAX_DELAY", "20"))
+RETRY_MAX_TOTAL_WAIT = float(os.environ.get("CLAUSEWISE_RETRY_MAX_TOTAL_WAIT", "30"))
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+# Process-wide retry budget: retries may add at most this share on top of first attempts
+RETRY_BUDGET_RATIO = float(os.environ.get("CLAUSEWISE_RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MIN_PER_SECOND = float(os.environ.get("CLAUSEWISE_RETRY_BUDGET_MIN_PER_SECOND", "0.5"))
+# Outbound request scheduler shared by every session: a token bucket of SCHEDULER_RATE requests per
+# second (bursts of SCHEDULER_BURST; 0 disables the rate limit) and at most SCHEDULER_MAX_IN_FLIGHT at once
+SCHEDULER_RATE = float(os.environ.get("CLAUSEWISE_SCHEDULER_RATE", "5"))
+SCHEDULER_BURST = int(os.environ.get("CLAUSEWISE_SCHEDULER_BURST", "10"))
+SCHEDULER_MAX_IN_FLIGHT = int(os.environ.get("CLAUSEWISE_SCHEDULER_MAX_IN_FLIGHT", "8"))
+# Queued requests are served by priority (lower first), then round-robin across sessions;
+# override per task with e.g. CLAUSEWISE_SCHEDULER_PRIORITIES="chatbot=0,summarization=1"
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+SCHEDULER_TASK_PRIORITIES = {
+    "chatbot": PRIORITY_INTERACTIVE,
+    "summarization": PRIORITY_BATCH,
+    "analysis": PRIORITY_BATCH
+}
+SCHEDULER_TASK_PRIORITIES.update(
+    (task.strip(), int(priority))
+    for task, _, priority in (
+        entry.partition("=") for entry in os.environ.get("CLAUSEWISE_SCHEDULER_PRIORITIES", "").split(",") if "=" in entry
+    )
+)
+
+# Token budgets: text sent to a model is measured with the backend model's own tokenizer,
+# loaded from the local Hugging Face cache (CLAUSEWISE_MODEL_DOWNLOAD=1 fetches missing ones)
+MODEL_CONTEXT_TOKENS = {
+    "facebook/bart-large-cnn": 1024,
+    "microsoft/DialoGPT-medium": 1024,
+    "microsoft/DialoGPT-large": 1024
+}
+DEFAULT_CONTEXT_TOKENS = 1024
+GENERATION_MAX_NEW_TOKENS = 300           # Generated tokens requested from text-generation backends
+MODEL_DOWNLOAD = os.environ.get("CLAUSEWISE_MODEL_DOWNLOAD", "0") == "1"
+# Tokens repeated from the end of one chunk at the start of the next
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CLAUSEWISE_CHUNK_OVERLAP_TOKENS", "32"))
+
+# Model backend: "remote" calls the Hugging Face Inference API, "local" runs the mapped
+# backend model in this process on CPU (needs transformers and torch, weights from the local cache),
+# "server" sends requests to the shared batching model server (python model_server.py)
+MODEL_BACKEND = os.environ.get("CLAUSEWISE_MODEL_BACKEND", "remote")
+LOCAL_INFERENCE_THREADS = int(os.environ.get("CLAUSEWISE_LOCAL_THREADS", str(os.cpu_count() or 1)))
+MODEL_SERVER_URL = os.environ.get("CLAUSEWISE_MODEL_SERVER_URL", "http://127.0.0.1:8765")
+
+# Model warm-up: uploads ping every text model backend so loading overlaps with extraction
+MODEL_WARMUP_ENABLED = os.environ.get("CLAUSEWISE_MODEL_WARMUP", "1") == "1"
+# Hosted models are unloaded after a while without traffic, so a warm mark expires
+MODEL_WARM_TTL_SECONDS = float(os.environ.get("CLAUSEWISE_MODEL_WARM_TTL", "600"))
+MODEL_WARMUP_TIMEOUT = 10        # Seconds per ping; a loading model answers 503 immediately
+MODEL_WARMUP_RETRY_SECONDS = 30  # Quiet period after a failed ping
+
+# Hedged requests: the local extractive answer is ready at once and the model call gets this
+# many seconds to beat it; a later model answer upgrades it in place. 0 waits for the model instead
+HEDGE_DEADLINE_SECONDS = float(os.environ.get("CLAUSEWISE_HEDGE_DEADLINE", "4"))
+
+# End-to-end deadline for one analysis run (0 = none): every model call, retry wait and scheduler
+# queue is cut to the time left, and stages switch to their local modes once too little remains
+ANALYSIS_DEADLINE_SECONDS = float(os.environ.get("CLAUSEWISE_ANALYSIS_DEADLINE", "20"))
+DEADLINE_MODEL_MIN_SECONDS = float(os.environ.get("CLAUSEWISE_DEADLINE_MODEL_MIN", "2"))   # Least worth a model call
+DEADLINE_MAP_REDUCE_MIN_SECONDS = float(os.environ.get("CLAUSEWISE_DEADLINE_MAP_REDUCE_MIN", "10"))
+
+# Summarization mode: "single" reads the opening key sentences, "map_reduce" covers the
+# whole document in chunks, "auto" uses map-reduce once the text exceeds one chunk
+SUMMARY_MODE = os.environ.get("CLAUSEWISE_SUMMARY_MODE", "auto")
+# Chunk size for map-reduce summaries; 0 packs each chunk up to the model's input budget
+SUMMARY_CHUNK_TOKENS = int(os.environ.get("CLAUSEWISE_SUMMARY_CHUNK_TOKENS", "0"))
+SUMMARY_MAX_CONCURRENCY = int(os.environ.get("CLAUSEWISE_SUMMARY_MAX_CONCURRENCY", "4"))
+SUMMARY_MAX_REDUCE_ROUNDS = 3
+
+# Circuit breaker per backend URL: trip on a high failure rate, probe again after a cool-down
+BREAKER_FAILURE_RATE = float(os.environ.get("CLAUSEWISE_BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_MINIMUM_CALLS = int(os.environ.get("CLAUSEWISE_BREAKER_MINIMUM_CALLS", "4"))
+BREAKER_WINDOW_SIZE = int(os.environ.get("CLAUSEWISE_BREAKER_WINDOW_SIZE", "20"))
+BREAKER_OPEN_SECONDS = float(os.environ.get("CLAUSEWISE_BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HALF_OPEN_PROBES = int(os.environ.get("CLAUSEWISE_BREAKER_HALF_OPEN_PROBES", "1"))
 
 # IBM Granite Model Configuration for ClauseWise (COMPULSORY REQUIREMENT)
 # IBM Granite models with intelligent backend mapping for guaranteed functionality
@@ -69,230 +174,2372 @@ GRANITE_PARAMS = {
 
 # Model URLs - IBM Granite models with fallback support
 MODEL_URLS = {
-    "summarization": f"https://api-inference.huggingface.co/models/{IBM_GRANITE_MODELS['summarization']}",
-    "tts": f"https://api-inference.huggingface.co/models/{FALLBACK_MODELS['tts']}",  # TTS uses offline pyttsx3
-    "tts_alternative": "https://api-inference.huggingface.co/models/espnet/kan-bayashi_ljspeech_vits",
-    "tts_bark": "https://api-inference.huggingface.co/models/suno/bark",
-    "tts_fastspeech": "https://api-inference.huggingface.co/models/facebook/fastspeech2-en-ljspeech",
-    "chatbot": f"https://api-inference.huggingface.co/models/{IBM_GRANITE_MODELS['chatbot']}",
-    "granite": f"https://api-inference.huggingface.co/models/{IBM_GRANITE_MODELS['chatbot']}",
-    "detailed_analysis": f"https://api-inference.huggingface.co/models/{IBM_GRANITE_MODELS['detailed_analysis']}",
-    "voice_processing": f"https://api-inference.huggingface.co/models/{FALLBACK_MODELS['voice_processing']}"
+    "summarization": f"{HF_INFERENCE_URL}/{IBM_GRANITE_MODELS['summarization']}",
+    "tts": f"{HF_INFERENCE_URL}/{FALLBACK_MODELS['tts']}",  # TTS uses offline pyttsx3
+    "tts_alternative": f"{HF_INFERENCE_URL}/espnet/kan-bayashi_ljspeech_vits",
+    "tts_bark": f"{HF_INFERENCE_URL}/suno/bark",
+    "tts_fastspeech": f"{HF_INFERENCE_URL}/facebook/fastspeech2-en-ljspeech",
+    "chatbot": f"{HF_INFERENCE_URL}/{IBM_GRANITE_MODELS['chatbot']}",
+    "granite": f"{HF_INFERENCE_URL}/{IBM_GRANITE_MODELS['chatbot']}",
+    "detailed_analysis": f"{HF_INFERENCE_URL}/{IBM_GRANITE_MODELS['detailed_analysis']}",
+    "voice_processing": f"{HF_INFERENCE_URL}/{FALLBACK_MODELS['voice_processing']}"
 }
 
-def extract_text_from_file(uploaded_file):
-    """Extract text from uploaded file based on file type"""
+# PDF extraction settings
+# Clean text layers are read in-process (a few ms per page); only pages that need
+# pdfplumber's layout analysis (~150 ms each) go to the process pool, and only
+# when at least this many of them would otherwise run serially
+PARALLEL_PDF_PAGE_THRESHOLD = int(os.environ.get("CLAUSEWISE_PARALLEL_PDF_PAGE_THRESHOLD", "8"))
+PDF_EXTRACTION_WORKERS = int(os.environ.get("CLAUSEWISE_PDF_WORKERS", str(os.cpu_count() or 1)))
+# Worker processes are started without forking the threaded Streamlit server
+PROCESS_POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# OCR settings for scanned pages that have no text layer
+OCR_ENABLED = os.environ.get("CLAUSEWISE_OCR", "1") != "0"
+OCR_DPI = int(os.environ.get("CLAUSEWISE_OCR_DPI", "300"))
+OCR_WORKERS = int(os.environ.get("CLAUSEWISE_OCR_WORKERS", str(os.cpu_count() or 1)))
+OCR_LANGUAGE = os.environ.get("CLAUSEWISE_OCR_LANGUAGE", "eng")
+OCR_CACHE_MAX_BYTES = int(os.environ.get("CLAUSEWISE_OCR_CACHE_MAX_MB", "128")) * 1024 * 1024
+
+# On-disk cache settings - entries are shared across sessions and survive server restarts
+CACHE_DIR = os.environ.get("CLAUSEWISE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "clausewise"))
+EXTRACTION_CACHE_MAX_BYTES = int(os.environ.get("CLAUSEWISE_EXTRACTION_CACHE_MAX_MB", "512")) * 1024 * 1024
+# A full namespace is trimmed to this share of its cap, so the next few writes don't each rescan it
+DISK_CACHE_EVICT_TO = 0.9
+
+# Bump whenever extractor output changes so stale cached text is never served
+EXTRACTOR_VERSION = "5"
+
+# Model response cache - deterministic calls are cached by default, sampled ones only on opt-in
+RESPONSE_CACHE_ENABLED = os.environ.get("CLAUSEWISE_RESPONSE_CACHE", "1") != "0"
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get("CLAUSEWISE_RESPONSE_CACHE_TTL_HOURS", "168")) * 3600
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("CLAUSEWISE_RESPONSE_CACHE_MAX_MB", "64")) * 1024 * 1024
+RESPONSE_CACHE_MEMORY_ENTRIES = int(os.environ.get("CLAUSEWISE_RESPONSE_CACHE_MEMORY_ENTRIES", "256"))
+RESPONSE_CACHE_SAMPLED = os.environ.get("CLAUSEWISE_RESPONSE_CACHE_SAMPLED", "0") == "1"
+
+def _disk_cache_path(namespace, key):
+    """Path of a cache entry, fanned out by key prefix to keep directories small"""
+    return os.path.join(CACHE_DIR, namespace, key[:2], key)
+
+def disk_cache_get(namespace, key):
+    """Return cached bytes for key, or None. A hit refreshes the entry's LRU position."""
+    path = _disk_cache_path(namespace, key)
     try:
-        file_type = uploaded_file.type
-        
-        if file_type == "application/pdf":
-            return extract_text_from_pdf(uploaded_file)
-        elif file_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            return extract_text_from_docx(uploaded_file)
-        elif file_type == "text/plain":
-            return extract_text_from_txt(uploaded_file)
-        else:
-            st.error("Unsupported file type. Please upload PDF, DOCX, or TXT files.")
-            return None
+        with open(path, "rb") as cache_file:
+            data = cache_file.read()
+        os.utime(path, None)
+        return data
+    except OSError:
+        return None
+
+# Running size of each cache namespace in this process, keyed by (CACHE_DIR, namespace).
+# Other processes writing the same directory make it drift; every eviction scan resets it.
+_DISK_CACHE_SIZES = {}
+_DISK_CACHE_SIZES_LOCK = threading.Lock()
+
+def disk_cache_put(namespace, key, data, max_bytes):
+    """
+    Atomically store bytes under key, evicting least recently used entries over max_bytes
+
+    The namespace is only scanned when its running size total crosses
+    max_bytes (and once per process to seed the total), not on every write.
+    """
+    path = _disk_cache_path(namespace, key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced_bytes = os.path.getsize(path)
+        except OSError:
+            replaced_bytes = 0
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as temp_file:
+            temp_file.write(data)
+            temp_path = temp_file.name
+        os.replace(temp_path, path)
+
+        size_key = (CACHE_DIR, namespace)
+        with _DISK_CACHE_SIZES_LOCK:
+            total_bytes = _DISK_CACHE_SIZES.get(size_key)
+            if total_bytes is not None:
+                total_bytes += len(data) - replaced_bytes
+                _DISK_CACHE_SIZES[size_key] = total_bytes
+        if total_bytes is None or total_bytes > max_bytes:
+            total_bytes = _evict_disk_cache(namespace, max_bytes)
+            with _DISK_CACHE_SIZES_LOCK:
+                _DISK_CACHE_SIZES[size_key] = total_bytes
+    except OSError:
+        # Caching is best effort - a read-only or full disk must not break extraction
+        pass
+
+def _evict_disk_cache(namespace, max_bytes):
+    """
+    Scan the namespace and, if it is over max_bytes, delete least recently used
+    entries until it fits in DISK_CACHE_EVICT_TO of it. Returns the bytes left.
+    """
+    entries = []
+    total_bytes = 0
+    for root, _, files in os.walk(os.path.join(CACHE_DIR, namespace)):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_bytes += stat.st_size
+
+    if total_bytes <= max_bytes:
+        return total_bytes
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes * DISK_CACHE_EVICT_TO:
+            break
+        try:
+            os.unlink(path)
+            total_bytes -= size
+        except OSError:
+            pass
+    return total_bytes
+
+def hash_upload(uploaded_file, salt=b"", chunk_size=1024 * 1024):
+    """SHA-256 of the upload bytes (plus optional salt), read in chunks and leaving the file rewound"""
+    digest = hashlib.sha256(salt)
+    uploaded_file.seek(0)
+    for chunk in iter(lambda: uploaded_file.read(chunk_size), b""):
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+def extraction_cache_key(uploaded_file, content_hash=None):
+    """Content-addressed cache key: upload bytes (or their hash_upload digest) plus extractor version"""
+    content_hash = content_hash or hash_upload(uploaded_file)
+    return hashlib.sha256(f"extractor-v{EXTRACTOR_VERSION}:{content_hash}".encode()).hexdigest()
+
+def extract_text_from_file(uploaded_file, progress_callback=None, parallel=None, use_cache=True, metrics=None,
+                           content_hash=None):
+    """
+    Extract text from uploaded file based on file type
+
+    Args:
+        uploaded_file: Streamlit UploadedFile (or any file-like object with a .type)
+        progress_callback: Optional callable(page_number, total_pages, page_text)
+            invoked as each PDF page is parsed
+        parallel: True/False to force PDF extraction mode, None to pick
+            parallel extraction automatically for large PDFs
+        use_cache: Serve and store results in the on-disk extraction cache
+        metrics: Optional list that receives one dict per PDF page recording
+            which extraction path ran ("text_layer" or "pdfplumber") and its cost
+        content_hash: hash_upload() digest of the upload, if the caller already
+            has it, so the bytes are not hashed a second time for the cache key
+
+    Text with scanned pages left unread (OCR disabled, unavailable or
+    failing) is returned but not cached, so a later upload gets them once
+    OCR works.
+
+    Returns:
+        Extracted text, or None on failure
+    """
+    try:
+        cache_key = None
+        if use_cache:
+            cache_key = extraction_cache_key(uploaded_file, content_hash)
+            cached_text = disk_cache_get("extraction", cache_key)
+            if cached_text is not None:
+                return cached_text.decode("utf-8")
+
+        unread_pages = []
+        text = _extract_text_by_type(uploaded_file, progress_callback, parallel, metrics, unread_pages)
+
+        if text and cache_key and not unread_pages:
+            disk_cache_put("extraction", cache_key, text.encode("utf-8"), EXTRACTION_CACHE_MAX_BYTES)
+        return text
     except Exception as e:
         st.error(f"Error extracting text: {str(e)}")
         return None
 
-def extract_text_from_pdf(uploaded_file):
-    """Extract text from PDF file"""
-    text = ""
-    with pdfplumber.open(uploaded_file) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-    return text
+def _extract_text_by_type(uploaded_file, progress_callback=None, parallel=None, metrics=None, unread_pages=None):
+    """Dispatch an upload to the extractor for its MIME type"""
+    file_type = uploaded_file.type
+
+    if file_type == "application/pdf":
+        return extract_text_from_pdf(uploaded_file, progress_callback=progress_callback, parallel=parallel,
+                                     metrics=metrics, unread_pages=unread_pages)
+    elif file_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
+        return extract_text_from_docx(uploaded_file)
+    elif file_type == "text/plain":
+        return extract_text_from_txt(uploaded_file)
+    else:
+        st.error("Unsupported file type. Please upload PDF, DOCX, or TXT files.")
+        return None
+
+# Tiered PDF extraction: pdfium's raw text layer for clean pages, pdfplumber layout analysis otherwise
+PDF_PATH_TEXT_LAYER = "text_layer"
+PDF_PATH_LAYOUT = "pdfplumber"
+TEXT_LAYER_MIN_PRINTABLE_RATIO = 0.95     # Below this the text layer is treated as garbled
+TEXT_LAYER_MAX_BACKWARD_JUMPS = 0.2       # Share of text runs that jump back up the page
+TEXT_LAYER_COLUMN_SHARE = 0.25            # Share of runs per side that signals two columns
+
+# PDFium is not thread-safe, so all calls into it within a process are serialised
+_PDFIUM_LOCK = threading.Lock()
+
+def _load_pdfium():
+    """Return the pypdfium2 module, or None when it is not installed"""
+    try:
+        import pypdfium2
+        return pypdfium2
+    except ImportError:
+        return None
+
+def _text_layer_is_clean(page_text, text_rects, page_width):
+    """
+    Decide whether a raw text layer can be used as-is
+
+    Rejects pages that are empty, contain too many unprintable or replacement
+    characters, read out of top-to-bottom order, or look multi-column -
+    all cases where pdfplumber's layout analysis produces better text.
+    """
+    if not page_text.strip():
+        return False
+
+    printable = sum(1 for ch in page_text if ch.isprintable() or ch in "\n\t") - page_text.count("�")
+    if printable / len(page_text) < TEXT_LAYER_MIN_PRINTABLE_RATIO:
+        return False
+
+    if len(text_rects) < 4:
+        return True
+
+    # Rects are (left, bottom, right, top); content order should mostly run down the page
+    line_height = max(1.0, sorted(top - bottom for _, bottom, _, top in text_rects)[len(text_rects) // 2])
+    backward_jumps = sum(
+        1 for previous, current in zip(text_rects, text_rects[1:])
+        if current[3] - previous[3] > line_height * 1.5
+    )
+    if backward_jumps / len(text_rects) > TEXT_LAYER_MAX_BACKWARD_JUMPS:
+        return False
+
+    middle = page_width / 2
+    left_runs = sum(1 for left, _, right, _ in text_rects if right < middle)
+    right_runs = sum(1 for left, _, right, _ in text_rects if left > middle)
+    if min(left_runs, right_runs) / len(text_rects) >= TEXT_LAYER_COLUMN_SHARE:
+        return False
+
+    return True
+
+def _read_text_layer(pdfium_page):
+    """Return the page's raw text layer, or None if it fails the quality heuristic"""
+    text_page = pdfium_page.get_textpage()
+    try:
+        page_text = text_page.get_text_range().replace("\r\n", "\n").replace("\r", "\n")
+        text_rects = [text_page.get_rect(index) for index in range(text_page.count_rects())]
+    finally:
+        text_page.close()
+
+    page_width = pdfium_page.get_width()
+    return page_text if _text_layer_is_clean(page_text, text_rects, page_width) else None
+
+def iter_pdf_pages_tiered(pdf_source, page_indexes=None, metrics=None, layout_fallback=True):
+    """
+    Yield (page_index, total_pages, page_text) using the cheapest path that works
+
+    pdf_source is the PDF as bytes or a path. Pages whose text layer passes
+    _text_layer_is_clean are read straight from pdfium; the rest are sent to
+    pdfplumber, which is only opened once the first page needs it. When
+    pypdfium2 is not installed every page goes through pdfplumber.
+    With layout_fallback=False those pages are yielded as None instead.
+    If metrics is a list, one dict per page records the path taken and its cost.
+    """
+    pdfium = _load_pdfium()
+    text_layer_doc = None
+    if pdfium is not None:
+        with _PDFIUM_LOCK:
+            text_layer_doc = pdfium.PdfDocument(pdf_source)
+    layout_pdf = None
+
+    try:
+        if text_layer_doc is not None:
+            total_pages = len(text_layer_doc)
+        else:
+            layout_pdf = pdfplumber.open(io.BytesIO(pdf_source) if isinstance(pdf_source, bytes) else pdf_source)
+            total_pages = len(layout_pdf.pages)
+
+        for page_index in (page_indexes if page_indexes is not None else range(total_pages)):
+            start = time.perf_counter()
+            page_text = None
+            if text_layer_doc is not None:
+                with _PDFIUM_LOCK:
+                    pdfium_page = text_layer_doc[page_index]
+                    try:
+                        page_text = _read_text_layer(pdfium_page)
+                    finally:
+                        pdfium_page.close()
+
+            path = PDF_PATH_TEXT_LAYER
+            if page_text is None and not layout_fallback:
+                yield page_index, total_pages, None
+                continue
+            if page_text is None:
+                path = PDF_PATH_LAYOUT
+                if layout_pdf is None:
+                    layout_pdf = pdfplumber.open(io.BytesIO(pdf_source) if isinstance(pdf_source, bytes) else pdf_source)
+                page = layout_pdf.pages[page_index]
+                page_text = page.extract_text() or ""
+                # Release the cached layout objects so memory stays flat on long documents
+                page.flush_cache()
+
+            if metrics is not None:
+                metrics.append({
+                    "page": page_index + 1,
+                    "path": path,
+                    "seconds": round(time.perf_counter() - start, 4),
+                    "characters": len(page_text)
+                })
+            yield page_index, total_pages, page_text
+    finally:
+        if layout_pdf is not None:
+            layout_pdf.close()
+        if text_layer_doc is not None:
+            with _PDFIUM_LOCK:
+                text_layer_doc.close()
+
+def iter_pdf_pages(uploaded_file, metrics=None):
+    """
+    Yield PDF pages one at a time as they are parsed
+
+    Yields:
+        Tuples of (page_number, total_pages, page_text) with 1-based page numbers.
+        page_text is an empty string for pages without a text layer.
+    """
+    uploaded_file.seek(0)
+    pdf_bytes = uploaded_file.read()
+    uploaded_file.seek(0)
+    for page_index, total_pages, page_text in iter_pdf_pages_tiered(pdf_bytes, metrics=metrics):
+        yield page_index + 1, total_pages, page_text
+
+def extract_text_from_pdf(uploaded_file, progress_callback=None, parallel=None, metrics=None, ocr=None,
+                          unread_pages=None):
+    """
+    Extract text from PDF file, streaming page by page and joining once at the end
+
+    Pages that come back without any text (scanned pages) are OCRed afterwards
+    when OCR is enabled and a local engine is available. Blank pages that
+    could not be OCRed are appended (0-based) to the unread_pages list, if given.
+    """
+    if parallel is None:
+        parallel = PDF_EXTRACTION_WORKERS > 1
+        min_layout_pages = PARALLEL_PDF_PAGE_THRESHOLD
+    else:
+        min_layout_pages = 0
+
+    if parallel:
+        page_texts = extract_pdf_page_texts_parallel(uploaded_file, progress_callback=progress_callback, metrics=metrics,
+                                                      min_layout_pages=min_layout_pages)
+    else:
+        page_texts = []
+        for page_number, total_pages, page_text in iter_pdf_pages(uploaded_file, metrics=metrics):
+            page_texts.append(page_text)
+            if progress_callback:
+                progress_callback(page_number, total_pages, page_text)
+
+    if OCR_ENABLED if ocr is None else ocr:
+        ocr_missing_pages(uploaded_file, page_texts, metrics=metrics, unread_pages=unread_pages)
+    elif unread_pages is not None:
+        unread_pages.extend(page_index for page_index, page_text in enumerate(page_texts) if not page_text.strip())
+
+    return "".join(page_text + "\n" for page_text in page_texts if page_text)
+
+def count_pdf_pages(uploaded_file):
+    """Count PDF pages without running layout analysis, leaving the file rewound"""
+    pdfium = _load_pdfium()
+    if pdfium is not None:
+        uploaded_file.seek(0)
+        with _PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(uploaded_file.read())
+            total_pages = len(pdf)
+            pdf.close()
+    else:
+        with pdfplumber.open(uploaded_file) as pdf:
+            total_pages = len(pdf.pages)
+    uploaded_file.seek(0)
+    return total_pages
+
+@contextmanager
+def upload_as_temp_file(uploaded_file, suffix=""):
+    """Copy an upload to a temporary file that worker processes can open by path"""
+    uploaded_file.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        shutil.copyfileobj(uploaded_file, temp_file)
+        temp_path = temp_file.name
+    uploaded_file.seek(0)
+
+    try:
+        yield temp_path
+    finally:
+        if os.path.exists(temp_path):
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+
+def split_page_ranges(total_pages, workers):
+    """Split pages into contiguous [start, end) ranges, a few per worker for load balancing"""
+    if total_pages <= 0:
+        return []
+    range_size = max(1, -(-total_pages // (max(1, workers) * 4)))
+    return [(start, min(start + range_size, total_pages)) for start in range(0, total_pages, range_size)]
+
+def _extract_pdf_pages(pdf_path, page_indexes):
+    """Process-pool worker: extract text and metrics for the given 0-based pages of a PDF on disk"""
+    metrics = []
+    page_texts = [
+        page_text
+        for _, _, page_text in iter_pdf_pages_tiered(pdf_path, page_indexes=page_indexes, metrics=metrics)
+    ]
+    return page_texts, metrics
+
+def _init_extraction_worker(cache_dir):
+    """Process-pool initializer: share the parent's cache location with the worker"""
+    global CACHE_DIR
+    CACHE_DIR = cache_dir
+
+# One process pool shared by every document and session, started on first use
+_PROCESS_POOL = None
+_PROCESS_POOL_CACHE_DIR = None
+_PROCESS_POOL_LOCK = threading.Lock()
+
+def _extraction_process_pool():
+    """
+    Return the shared process pool for CPU-bound extraction work
+
+    Workers start once per server process rather than once per document.
+    The pool is rebuilt if CACHE_DIR has changed since its workers started.
+    """
+    global _PROCESS_POOL, _PROCESS_POOL_CACHE_DIR
+    with _PROCESS_POOL_LOCK:
+        if _PROCESS_POOL is None or _PROCESS_POOL_CACHE_DIR != CACHE_DIR:
+            if _PROCESS_POOL is not None:
+                _PROCESS_POOL.shutdown(wait=False)
+            _PROCESS_POOL = ProcessPoolExecutor(
+                max_workers=max(PDF_EXTRACTION_WORKERS, OCR_WORKERS, 1),
+                mp_context=multiprocessing.get_context(PROCESS_POOL_START_METHOD),
+                initializer=_init_extraction_worker,
+                initargs=(CACHE_DIR,)
+            )
+            _PROCESS_POOL_CACHE_DIR = CACHE_DIR
+        return _PROCESS_POOL
+
+def _discard_extraction_process_pool(executor):
+    """Drop a pool whose worker died so the next caller starts a fresh one"""
+    global _PROCESS_POOL
+    with _PROCESS_POOL_LOCK:
+        if _PROCESS_POOL is executor:
+            _PROCESS_POOL = None
+    executor.shutdown(wait=False)
+
+def extract_pdf_page_texts_parallel(uploaded_file, max_workers=None, progress_callback=None, metrics=None,
+                                    min_layout_pages=0):
+    """
+    Extract per-page PDF text, spreading the slow pages across a process pool
+
+    Clean text layers are read in this process first. Pages that need
+    pdfplumber's layout analysis are split into ranges for the shared pool
+    when there are at least min_layout_pages of them, and read here otherwise.
+    Workers open the PDF from a shared temporary path, so only the path and
+    page numbers cross the process boundary. Results are returned in page order.
+    """
+    workers = max_workers or PDF_EXTRACTION_WORKERS
+
+    uploaded_file.seek(0)
+    pdf_bytes = uploaded_file.read()
+    uploaded_file.seek(0)
+
+    page_texts = []
+    for page_index, total_pages, page_text in iter_pdf_pages_tiered(pdf_bytes, metrics=metrics, layout_fallback=False):
+        page_texts.append(page_text)
+        if page_text is not None and progress_callback:
+            progress_callback(page_index + 1, total_pages, page_text)
+
+    layout_pages = [page_index for page_index, page_text in enumerate(page_texts) if page_text is None]
+    if not layout_pages:
+        return page_texts
+
+    layout_metrics = []
+    if workers <= 1 or len(layout_pages) < max(min_layout_pages, 1):
+        for page_index, total_pages, page_text in iter_pdf_pages_tiered(pdf_bytes, page_indexes=layout_pages,
+                                                                        metrics=layout_metrics):
+            page_texts[page_index] = page_text
+            if progress_callback:
+                progress_callback(page_index + 1, total_pages, page_text)
+    else:
+        page_groups = [layout_pages[start:end] for start, end in split_page_ranges(len(layout_pages), workers)]
+        executor = _extraction_process_pool()
+        with upload_as_temp_file(uploaded_file, suffix=".pdf") as pdf_path:
+            try:
+                futures = {executor.submit(_extract_pdf_pages, pdf_path, group): group for group in page_groups}
+                for future in as_completed(futures):
+                    group_texts, group_metrics = future.result()
+                    layout_metrics.extend(group_metrics)
+                    for page_index, page_text in zip(futures[future], group_texts):
+                        page_texts[page_index] = page_text
+                        if progress_callback:
+                            progress_callback(page_index + 1, len(page_texts), page_text)
+            except BrokenProcessPool:
+                _discard_extraction_process_pool(executor)
+                raise
+
+    if metrics is not None:
+        metrics.extend(layout_metrics)
+        metrics.sort(key=lambda record: record["page"])
+
+    return page_texts
+
+def _load_pytesseract():
+    """Return the pytesseract module, or None when it is not installed"""
+    try:
+        import pytesseract
+        return pytesseract
+    except ImportError:
+        return None
+
+# OCR engine checks by pytesseract module, and sessions already told OCR is unavailable
+_OCR_ENGINE_CHECKS = {}
+_OCR_WARNED_SESSIONS = set()
+
+def ocr_engine_available():
+    """True when pytesseract is installed and can find the Tesseract binary (checked once per process)"""
+    pytesseract = _load_pytesseract()
+    if pytesseract is None:
+        return False
+    if id(pytesseract) not in _OCR_ENGINE_CHECKS:
+        try:
+            pytesseract.get_tesseract_version()
+            _OCR_ENGINE_CHECKS[id(pytesseract)] = True
+        except AttributeError:
+            _OCR_ENGINE_CHECKS[id(pytesseract)] = True  # A build without the version probe
+        except Exception:
+            _OCR_ENGINE_CHECKS[id(pytesseract)] = False
+    return _OCR_ENGINE_CHECKS[id(pytesseract)]
+
+def _warn_ocr_unavailable(page_count):
+    """Tell each session once that scanned pages are skipped for lack of an OCR engine"""
+    session = current_session_id()
+    if session in _OCR_WARNED_SESSIONS:
+        return
+    _OCR_WARNED_SESSIONS.add(session)
+    st.warning(
+        f"⚠️ {page_count} page(s) have no text layer and were skipped. Scanned pages need pytesseract "
+        "(pip install pytesseract) and the Tesseract engine (apt install tesseract-ocr, brew install tesseract)."
+    )
+
+def _render_pdf_page(pdf_path, page_index, dpi):
+    """Render one PDF page to a PIL image at the given resolution"""
+    pdfium = _load_pdfium()
+    if pdfium is not None:
+        with _PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(pdf_path)
+            try:
+                page = pdf[page_index]
+                image = page.render(scale=dpi / 72).to_pil()
+                page.close()
+            finally:
+                pdf.close()
+        return image
+
+    with pdfplumber.open(pdf_path, pages=[page_index + 1]) as pdf:
+        return pdf.pages[0].to_image(resolution=dpi).original
+
+def _ocr_pdf_page(pdf_path, page_index, dpi, language):
+    """
+    Process-pool worker: OCR one PDF page
+
+    The cache key is the hash of the rendered page image, so a page that has
+    been seen before - in a re-upload or an otherwise re-scanned document -
+    is answered from the OCR cache without running the engine.
+
+    Returns:
+        Tuple of (page_text, served_from_cache)
+    """
+    image = _render_pdf_page(pdf_path, page_index, dpi)
+    digest = hashlib.sha256(f"ocr-{language}-{dpi}-{image.mode}-{image.size}:".encode())
+    digest.update(image.tobytes())
+    cache_key = digest.hexdigest()
+
+    cached_text = disk_cache_get("ocr", cache_key)
+    if cached_text is not None:
+        return cached_text.decode("utf-8"), True
+
+    page_text = _load_pytesseract().image_to_string(image, lang=language)
+    disk_cache_put("ocr", cache_key, page_text.encode("utf-8"), OCR_CACHE_MAX_BYTES)
+    return page_text, False
+
+def ocr_missing_pages(uploaded_file, page_texts, metrics=None, dpi=None, max_workers=None, unread_pages=None):
+    """
+    OCR the pages that came back without a text layer, filling page_texts in place
+
+    Only blank pages are rendered and recognised. More than one blank page
+    fans out across the shared process pool when OCR_WORKERS > 1. Blank
+    pages OCR could not read (no engine, or an error) are appended to
+    unread_pages, if given; pages OCR read as empty are not.
+    """
+    missing_pages = [page_index for page_index, page_text in enumerate(page_texts) if not page_text.strip()]
+    if not missing_pages:
+        return page_texts
+
+    if not ocr_engine_available():
+        _warn_ocr_unavailable(len(missing_pages))
+        if unread_pages is not None:
+            unread_pages.extend(missing_pages)
+        return page_texts
+
+    dpi = dpi or OCR_DPI
+    workers = min(max_workers or OCR_WORKERS, len(missing_pages))
+    ocr_results = {}
+
+    try:
+        with upload_as_temp_file(uploaded_file, suffix=".pdf") as pdf_path:
+            if workers <= 1:
+                for page_index in missing_pages:
+                    ocr_results[page_index] = _ocr_pdf_page(pdf_path, page_index, dpi, OCR_LANGUAGE)
+            else:
+                executor = _extraction_process_pool()
+                try:
+                    futures = {
+                        executor.submit(_ocr_pdf_page, pdf_path, page_index, dpi, OCR_LANGUAGE): page_index
+                        for page_index in missing_pages
+                    }
+                    for future in as_completed(futures):
+                        ocr_results[futures[future]] = future.result()
+                except BrokenProcessPool:
+                    _discard_extraction_process_pool(executor)
+                    raise
+    except Exception as e:
+        # A missing Tesseract binary or a bad page image must not lose the text we already have
+        st.warning(f"⚠️ OCR failed for scanned pages: {str(e)}")
+
+    if unread_pages is not None:
+        unread_pages.extend(page_index for page_index in missing_pages if page_index not in ocr_results)
+    records_by_page = {record["page"]: record for record in metrics or []}
+    for page_index, (page_text, from_cache) in ocr_results.items():
+        page_texts[page_index] = page_text.strip()
+        record = records_by_page.get(page_index + 1)
+        if record is not None:
+            record["path"] = "ocr"
+            record["ocr_cached"] = from_cache
+            record["characters"] = len(page_texts[page_index])
+
+    return page_texts
+
+# WordprocessingML element names used by the streaming DOCX extractor
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_DOCX_PARAGRAPH = WORD_NAMESPACE + "p"
+_DOCX_TABLE = WORD_NAMESPACE + "tbl"
+_DOCX_TABLE_CELL = WORD_NAMESPACE + "tc"
+_DOCX_TEXT = WORD_NAMESPACE + "t"
+_DOCX_TAB = WORD_NAMESPACE + "tab"
+_DOCX_BREAKS = (WORD_NAMESPACE + "br", WORD_NAMESPACE + "cr")
+# Text boxes are stored twice: a DrawingML mc:Choice and a VML mc:Fallback copy
+_DOCX_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+def _docx_part_order(part_name):
+    """Sort key for header/footer parts so header2.xml comes before header10.xml"""
+    digits = "".join(ch for ch in part_name if ch.isdigit())
+    return (len(digits), digits)
+
+def iter_docx_part_text(part_stream):
+    """
+    Stream the text of one WordprocessingML part with iterparse
+
+    Yields one string per paragraph, and one per table cell (its paragraphs
+    joined with spaces), in document order. Paragraphs inside a text box
+    keep their own text and come just before the paragraph anchoring the box;
+    the box's mc:Fallback copy is skipped. Each paragraph or table is
+    detached from the tree as soon as it is consumed, so memory stays bounded
+    by the largest single paragraph rather than the whole part.
+    """
+    element_stack = []
+    run_stack = []  # One run-text buffer per open paragraph
+    cell_stack = []
+    fallback_depth = 0
+
+    for event, element in ET.iterparse(part_stream, events=("start", "end")):
+        if event == "start":
+            element_stack.append(element)
+            if element.tag == _DOCX_FALLBACK:
+                fallback_depth += 1
+            elif fallback_depth:
+                pass
+            elif element.tag == _DOCX_TABLE_CELL:
+                cell_stack.append([])
+            elif element.tag == _DOCX_PARAGRAPH:
+                run_stack.append([])
+            continue
+
+        element_stack.pop()
+        tag = element.tag
+        if tag == _DOCX_FALLBACK:
+            fallback_depth -= 1
+            continue
+        if fallback_depth:
+            continue
+        if tag == _DOCX_TEXT and run_stack:
+            run_stack[-1].append(element.text or "")
+        elif tag == _DOCX_TAB and run_stack:
+            run_stack[-1].append("\t")
+        elif tag in _DOCX_BREAKS and run_stack:
+            run_stack[-1].append("\n")
+        elif tag == _DOCX_PARAGRAPH:
+            paragraph_text = "".join(run_stack.pop())
+            if cell_stack:
+                cell_stack[-1].append(paragraph_text)
+            else:
+                yield paragraph_text
+        elif tag == _DOCX_TABLE_CELL:
+            cell_text = " ".join(text for text in cell_stack.pop() if text)
+            if cell_stack:
+                # Nested table: fold the inner cell into the enclosing cell
+                cell_stack[-1].append(cell_text)
+            elif cell_text:
+                yield cell_text
+
+        if tag in (_DOCX_PARAGRAPH, _DOCX_TABLE) and element_stack:
+            element_stack[-1].remove(element)
+
+def iter_docx_text(uploaded_file):
+    """
+    Stream DOCX text straight out of the zip: headers, body, then footers
+
+    word/document.xml and the header/footer parts are parsed incrementally
+    from their zip members, so the full python-docx object model is never built.
+    """
+    with zipfile.ZipFile(uploaded_file) as archive:
+        part_names = archive.namelist()
+        headers = sorted(
+            (name for name in part_names if re.fullmatch(r"word/header\d*\.xml", name)),
+            key=_docx_part_order
+        )
+        footers = sorted(
+            (name for name in part_names if re.fullmatch(r"word/footer\d*\.xml", name)),
+            key=_docx_part_order
+        )
+
+        for part_name in headers + ["word/document.xml"] + footers:
+            if part_name not in part_names:
+                continue
+            with archive.open(part_name) as part_stream:
+                yield from iter_docx_part_text(part_stream)
 
 def extract_text_from_docx(uploaded_file):
-    """Extract text from DOCX file"""
-    doc = Document(uploaded_file)
-    text = ""
-    for paragraph in doc.paragraphs:
-        text += paragraph.text + "\n"
-    return text
+    """Extract text from DOCX file, including tables, headers and footers"""
+    return "".join(paragraph_text + "\n" for paragraph_text in iter_docx_text(uploaded_file))
+
+# Plain-text ingestion settings
+TXT_READ_CHUNK_BYTES = 1024 * 1024
+TXT_ENCODING_SAMPLE_BYTES = 64 * 1024
+
+# Byte order marks, longest first so UTF-32 LE is not mistaken for UTF-16 LE
+_TEXT_BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+def detect_text_encoding(sample):
+    """
+    Guess the encoding of a plain-text file from its leading bytes
+
+    Checks for a byte order mark, then BOM-less UTF-16 (NUL bytes in every
+    other position), then strict UTF-8, then Windows-1252 - the usual encoding
+    of "Latin-1" exports. Anything else goes to charset_normalizer when it is
+    installed, and finally to ISO-8859-1, which accepts every byte.
+    """
+    for bom, encoding in _TEXT_BOMS:
+        if sample.startswith(bom):
+            return encoding
+
+    if len(sample) >= 4:
+        even_nuls = sample[0::2].count(0) / len(sample[0::2])
+        odd_nuls = sample[1::2].count(0) / len(sample[1::2])
+        if odd_nuls > 0.3 and even_nuls < 0.05:
+            return "utf-16-le"
+        if even_nuls > 0.3 and odd_nuls < 0.05:
+            return "utf-16-be"
+
+    try:
+        # Not final: the sample may end part-way through a multi-byte character
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+
+    try:
+        decoded = sample.decode("cp1252")
+        if not any(ord(ch) < 32 and ch not in "\t\n\r\f" for ch in decoded):
+            return "cp1252"
+    except UnicodeDecodeError:
+        pass
+
+    try:
+        from charset_normalizer import from_bytes
+        best_match = from_bytes(sample).best()
+        if best_match is not None:
+            return best_match.encoding
+    except ImportError:
+        pass
+
+    return "latin-1"
+
+def iter_txt_text(uploaded_file, chunk_size=TXT_READ_CHUNK_BYTES):
+    """
+    Decode a plain-text file incrementally in fixed-size chunks
+
+    The encoding is detected from a leading sample, then an incremental decoder
+    turns each chunk into text, so only one raw chunk is held at a time no matter
+    how large the file is. Undecodable bytes become U+FFFD instead of failing.
+    """
+    sample = uploaded_file.read(TXT_ENCODING_SAMPLE_BYTES)
+    encoding = detect_text_encoding(sample)
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+
+    chunk = sample
+    while chunk:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+        chunk = uploaded_file.read(chunk_size)
+
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
 
 def extract_text_from_txt(uploaded_file):
-    """Extract text from TXT file"""
-    return str(uploaded_file.read(), "utf-8")
+    """Extract text from TXT file in any common encoding"""
+    return "".join(iter_txt_text(uploaded_file))
 
-def query_huggingface_api(url, payload, max_retries=3):
-    """Query Hugging Face API with retry logic"""
-    for attempt in range(max_retries):
+_HTTP_SESSION = None
+_HTTP_SESSION_LOCK = threading.Lock()
+
+def get_http_session():
+    """
+    Shared requests.Session for model API calls
+
+    The session's HTTPAdapter keeps up to HTTP_POOL_MAXSIZE keep-alive
+    connections per host, so repeat calls skip the TCP and TLS handshakes.
+    It lives at module level, which makes it shared by every thread and every
+    Streamlit session in the server process; urllib3's pool is thread-safe.
+    """
+    global _HTTP_SESSION
+    if _HTTP_SESSION is None:
+        with _HTTP_SESSION_LOCK:
+            if _HTTP_SESSION is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=HTTP_POOL_MAXSIZE
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _HTTP_SESSION = session
+    return _HTTP_SESSION
+
+def reset_http_session():
+    """Close the shared session, e.g. after changing the pool settings; the next call opens a new one"""
+    global _HTTP_SESSION
+    with _HTTP_SESSION_LOCK:
+        if _HTTP_SESSION is not None:
+            _HTTP_SESSION.close()
+            _HTTP_SESSION = None
+
+# Deadline of the running operation; asyncio tasks and bind_session threads inherit it
+_DEADLINE = contextvars.ContextVar("clausewise_deadline", default=None)
+# Timing entry of the stage the running code belongs to
+_DEADLINE_STAGE = contextvars.ContextVar("clausewise_deadline_stage", default=None)
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Raised when the running operation's deadline, not the endpoint, ends a call or a wait"""
+
+class Deadline:
+    """
+    Time budget shared by every stage of one operation
+
+    `with Deadline(20):` makes it the current deadline for the block and
+    everything started from it. Model calls, retry waits and scheduler
+    queues are cut to remaining(), so the operation finishes within the
+    budget however many retries its stages would otherwise make. Stages
+    wrapped in stage(name) have their time and mode recorded for report().
+    """
+
+    def __init__(self, seconds):
+        # A deadline set inside another never outlasts it
+        outer = current_deadline()
+        self.seconds = min(seconds, outer.remaining()) if outer is not None else seconds
+        self.started = time.monotonic()
+        self.stages = []
+        self._lock = threading.Lock()
+        self._tokens = []
+
+    def remaining(self):
+        """Seconds left, never negative"""
+        return max(0.0, self.started + self.seconds - time.monotonic())
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def __enter__(self):
+        self._tokens.append(_DEADLINE.set(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        _DEADLINE.reset(self._tokens.pop())
+
+    @contextmanager
+    def stage(self, name, mode="model"):
+        """Record the time spent in a stage; note_stage_mode() inside it changes how it says it ran"""
+        entry = {"stage": name, "mode": mode, "started_at": self.elapsed()}
+        token = _DEADLINE_STAGE.set(entry)
         try:
-            response = requests.post(url, headers=HF_HEADERS, json=payload, timeout=30)
+            yield entry
+        finally:
+            _DEADLINE_STAGE.reset(token)
+            entry["seconds"] = self.elapsed() - entry["started_at"]
+            with self._lock:
+                self.stages.append(entry)
+
+    def report(self):
+        """Budget, time used and each finished stage's time and share of the budget"""
+        with self._lock:
+            stages = [dict(entry, budget_share=entry["seconds"] / self.seconds) for entry in self.stages]
+        return {"budget_seconds": self.seconds, "elapsed_seconds": self.elapsed(),
+                "met": self.elapsed() <= self.seconds, "stages": stages}
+
+def current_deadline():
+    """The running operation's Deadline, or None"""
+    return _DEADLINE.get()
+
+def deadline_timeout(timeout=None):
+    """
+    timeout (default MODEL_REQUEST_TIMEOUT) cut to the current deadline
+
+    Raises:
+        DeadlineExceeded: No time is left
+    """
+    timeout = timeout or MODEL_REQUEST_TIMEOUT
+    deadline = current_deadline()
+    if deadline is None:
+        return timeout
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise DeadlineExceeded(f"Deadline of {deadline.seconds:g}s reached")
+    return min(timeout, remaining)
+
+def deadline_allows(seconds):
+    """True unless the current deadline has less than `seconds` left"""
+    deadline = current_deadline()
+    return deadline is None or deadline.remaining() >= seconds
+
+def note_stage_mode(mode):
+    """Record how the current stage ran, e.g. "local (time budget)", for the deadline report"""
+    entry = _DEADLINE_STAGE.get()
+    if entry is not None:
+        entry["mode"] = mode
+
+# Blocking HTTP calls from the async layer run here, one thread per pooled connection
+_HTTP_EXECUTOR = ThreadPoolExecutor(max_workers=HTTP_POOL_MAXSIZE, thread_name_prefix="clausewise-http")
+
+async def async_post(url, payload, timeout=None):
+    """
+    POST JSON through the shared session without blocking the event loop
+
+    The request runs on _HTTP_EXECUTOR, so independent calls awaited together
+    overlap on separate pooled connections. timeout bounds the whole call,
+    not just each socket read; a request that overruns raises asyncio.TimeoutError.
+    It is cut to the current deadline, if any; overrunning a timeout the
+    deadline cut short raises DeadlineExceeded, since the endpoint was not at fault.
+    """
+    requested = timeout or MODEL_REQUEST_TIMEOUT
+    timeout = deadline_timeout(requested)
+    loop = asyncio.get_running_loop()
+    request = loop.run_in_executor(
+        _HTTP_EXECUTOR,
+        lambda: get_http_session().post(url, headers=HF_HEADERS, json=payload, timeout=timeout)
+    )
+    try:
+        return await asyncio.wait_for(request, timeout)
+    except (asyncio.TimeoutError, requests.exceptions.Timeout):
+        if timeout < requested:
+            raise DeadlineExceeded(f"Deadline reached after {timeout:.1f}s of {url}") from None
+        raise
+
+class RetryBudget:
+    """
+    Process-wide cap on retries over a sliding window
+
+    Every first attempt earns `ratio` of a retry and a floor of
+    `min_per_second` retries is always available, so during an outage the
+    app sends at most (1 + ratio) times its normal load instead of
+    multiplying it by the attempt count. Shared by every session.
+    """
+
+    def __init__(self, ratio, min_per_second, window_seconds=10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window_seconds = window_seconds
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+        self.exhausted = 0
+
+    def _trim(self, now):
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window_seconds:
+                events.popleft()
+
+    def record_request(self):
+        """Count a first attempt"""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_spend(self):
+        """Take one retry from the budget; False when it is exhausted"""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            allowed = self.min_per_second * self.window_seconds + self.ratio * len(self._requests)
+            if len(self._retries) >= allowed:
+                self.exhausted += 1
+                return False
+            self._retries.append(now)
+            return True
+
+RETRY_BUDGET = RetryBudget(RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN_PER_SECOND)
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the endpoint's circuit breaker is open"""
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker for one backend URL
+
+    Closed: calls flow and outcomes fill a sliding window of the last
+    window_size calls. Once at least minimum_calls are recorded and the
+    failure share reaches failure_rate, the breaker opens.
+    Open: calls are refused immediately for open_seconds.
+    Half-open: up to half_open_probes trial calls are let through; a success
+    closes the breaker, a failure opens it again.
+
+    Every allow_request() that returns True must be answered by exactly one
+    of record_success(), record_failure() or release() (no outcome, e.g.
+    the call was cancelled), or a half-open probe slot stays taken.
+    """
 
-            if response.status_code == 503:
-                # Model is loading, wait and retry
-                st.info(f"Model is loading, please wait... (Attempt {attempt + 1}/{max_retries})")
-                time.sleep(15)
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_rate=None, minimum_calls=None, window_size=None,
+                 open_seconds=None, half_open_probes=None):
+        self.name = name
+        self.failure_rate = failure_rate if failure_rate is not None else BREAKER_FAILURE_RATE
+        self.minimum_calls = minimum_calls or BREAKER_MINIMUM_CALLS
+        self.open_seconds = open_seconds if open_seconds is not None else BREAKER_OPEN_SECONDS
+        self.half_open_probes = half_open_probes or BREAKER_HALF_OPEN_PROBES
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window_size or BREAKER_WINDOW_SIZE)
+        self._opened_at = None
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+        self.short_circuited = 0
+        self.times_opened = 0
+
+    def _transition(self, state):
+        self.state = state
+        if state == self.OPEN:
+            self._opened_at = time.monotonic()
+            self.times_opened += 1
+        elif state == self.CLOSED:
+            self._outcomes.clear()
+        self._probes_in_flight = 0
+
+    def allow_request(self):
+        """True if a call may be sent now; refused calls are counted as short-circuited"""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._transition(self.HALF_OPEN)
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._transition(self.CLOSED)
+            elif self.state == self.CLOSED:
+                self._outcomes.append(True)
+
+    def release(self):
+        """Give back an allowed call's probe slot without recording an outcome"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def record_failure(self):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._transition(self.OPEN)
+                return
+            if self.state != self.CLOSED:
+                return
+            self._outcomes.append(False)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.minimum_calls and failures / len(self._outcomes) >= self.failure_rate:
+                self._transition(self.OPEN)
+
+    def snapshot(self):
+        """State and counters for the diagnostics panel"""
+        with self._lock:
+            calls = len(self._outcomes)
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+            return {
+                "endpoint": self.name,
+                "state": self.state,
+                "failure_rate": self._outcomes.count(False) / calls if calls else 0.0,
+                "recent_calls": calls,
+                "times_opened": self.times_opened,
+                "short_circuited": self.short_circuited,
+                "retry_in_seconds": retry_in,
+            }
+
+# One breaker per backend URL, shared by every session in the server process
+_CIRCUIT_BREAKERS = {}
+_CIRCUIT_BREAKERS_LOCK = threading.Lock()
+
+def get_circuit_breaker(url):
+    """Breaker for a backend URL, created on first use"""
+    with _CIRCUIT_BREAKERS_LOCK:
+        if url not in _CIRCUIT_BREAKERS:
+            _CIRCUIT_BREAKERS[url] = CircuitBreaker(url)
+        return _CIRCUIT_BREAKERS[url]
+
+def get_circuit_breaker_snapshots():
+    """Snapshots of every breaker, for diagnostics"""
+    with _CIRCUIT_BREAKERS_LOCK:
+        breakers = list(_CIRCUIT_BREAKERS.values())
+    return [breaker.snapshot() for breaker in breakers]
+
+def reset_circuit_breakers():
+    """Forget all breaker state, e.g. after the network comes back"""
+    with _CIRCUIT_BREAKERS_LOCK:
+        _CIRCUIT_BREAKERS.clear()
+
+# Session the running code belongs to; threads started on a session's behalf carry it over
+_SCHEDULER_SESSION = contextvars.ContextVar("clausewise_scheduler_session", default=None)
+
+def current_session_id():
+    """Streamlit session of the running code, for fair queuing; "default" outside a session"""
+    session = _SCHEDULER_SESSION.get()
+    if session is not None:
+        return session
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return "default"
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else "default"
+
+def bind_session(function):
+    """Wrap function so that, run on any thread, its requests queue as the calling session's"""
+    context = contextvars.copy_context()
+    context.run(_SCHEDULER_SESSION.set, current_session_id())
+    return lambda *args, **kwargs: context.run(function, *args, **kwargs)
+
+class RequestScheduler:
+    """
+    Process-wide gate in front of outbound Inference API requests
+
+    Each request waits for a free slot (at most max_in_flight at once) and a
+    token from a bucket refilled at `rate` per second up to `burst`, so all
+    sessions together stay under the API's rate limit instead of each one
+    retrying into the same 429s. Waiting requests are served by priority
+    (lower first) and, within a priority, round-robin across sessions, so
+    one session's batch of summaries cannot hold up another's question.
+    Sessions run on separate threads and event loops, so waiters hold
+    thread-safe concurrent.futures.Futures.
+    """
+
+    def __init__(self, rate=None, burst=None, max_in_flight=None):
+        self.rate = SCHEDULER_RATE if rate is None else rate
+        self.burst = burst or SCHEDULER_BURST
+        self.max_in_flight = max_in_flight or SCHEDULER_MAX_IN_FLIGHT
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._in_flight = 0
+        # priority -> OrderedDict of session -> deque of (future, queued_at); the first session is served next
+        self._queues = {}
+        self._lock = threading.Lock()
+        self._refill_timer = None
+        self._recent_waits = deque(maxlen=500)
+        self._waits_by_priority = {}  # priority -> (requests, total seconds, longest seconds)
+        self.counters = {"granted": 0, "abandoned": 0}
+
+    def _refill(self, now):
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _pop_next(self):
+        """Remove and return (priority, waiter) for the next session in the most urgent priority"""
+        priority = min(self._queues)
+        sessions = self._queues[priority]
+        session, waiters = sessions.popitem(last=False)
+        waiter = waiters.popleft()
+        if waiters:
+            sessions[session] = waiters  # Back of the rotation
+        if not sessions:
+            del self._queues[priority]
+        return priority, waiter
+
+    def _dispatch(self):
+        """Grant slots while capacity and tokens allow; called with the lock held"""
+        now = time.monotonic()
+        self._refill(now)
+        while self._queues and self._in_flight < self.max_in_flight:
+            if self.rate > 0 and self._tokens < 1:
+                if self._refill_timer is None:
+                    self._refill_timer = threading.Timer((1 - self._tokens) / self.rate, self._on_refill)
+                    self._refill_timer.daemon = True
+                    self._refill_timer.start()
+                return
+            priority, (future, queued_at) = self._pop_next()
+            if not future.set_running_or_notify_cancel():
+                self.counters["abandoned"] += 1  # The caller gave up while queued
                 continue
-            elif response.status_code == 404:
-                st.error(f"Model not found (404). Please check the model URL: {url}")
-                return None
-            elif response.status_code == 401:
-                st.error("Authentication failed. Please check your Hugging Face API key.")
-                return None
-            elif response.status_code == 200:
-                return response.json()
-            else:
-                st.warning(f"API returned status {response.status_code}. Retrying...")
-                if attempt < max_retries - 1:
-                    time.sleep(5)
-                    continue
+            if self.rate > 0:
+                self._tokens -= 1
+            self._in_flight += 1
+            self._record_wait(priority, now - queued_at)
+            future.set_result(None)
+
+    def _on_refill(self):
+        with self._lock:
+            self._refill_timer = None
+            self._dispatch()
+
+    def _record_wait(self, priority, seconds):
+        self.counters["granted"] += 1
+        self._recent_waits.append(seconds)
+        requests_granted, total, longest = self._waits_by_priority.get(priority, (0, 0.0, 0.0))
+        self._waits_by_priority[priority] = (requests_granted + 1, total + seconds, max(longest, seconds))
+
+    async def acquire(self, priority=PRIORITY_BATCH, session=None):
+        """
+        Wait for a slot; every acquire must be paired with release()
+
+        Raises:
+            DeadlineExceeded: The current deadline passed while queued
+        """
+        future = Future()
+        with self._lock:
+            sessions = self._queues.setdefault(priority, OrderedDict())
+            sessions.setdefault(session or current_session_id(), deque()).append((future, time.monotonic()))
+            self._dispatch()
+        deadline = current_deadline()
+        try:
+            await asyncio.wait_for(asyncio.wrap_future(future), deadline.remaining() if deadline else None)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            if not future.cancel():
+                self.release()  # Granted just as the caller gave up
+            if deadline is not None and deadline.remaining() <= 0:
+                raise DeadlineExceeded(f"Deadline of {deadline.seconds:g}s reached while queued")
+            raise
+
+    def release(self):
+        """Free a slot and hand it to the next waiter"""
+        with self._lock:
+            self._in_flight -= 1
+            self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority=PRIORITY_BATCH, session=None):
+        """Hold a slot for the duration of one request"""
+        await self.acquire(priority, session)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self):
+        """Queue depth, requests in flight and queue wait times, for diagnostics"""
+        with self._lock:
+            self._refill(time.monotonic())
+            queued = [
+                (session, future) for sessions in self._queues.values()
+                for session, waiters in sessions.items() for future, _ in waiters if not future.cancelled()
+            ]
+            waits = sorted(self._recent_waits)
+            return {
+                "in_flight": self._in_flight,
+                "max_in_flight": self.max_in_flight,
+                "queued": len(queued),
+                "queued_sessions": len({session for session, _ in queued}),
+                "tokens": self._tokens if self.rate > 0 else None,
+                "rate": self.rate,
+                "granted": self.counters["granted"],
+                "abandoned": self.counters["abandoned"],
+                "mean_wait_ms": 1000 * sum(waits) / len(waits) if waits else 0.0,
+                "p95_wait_ms": 1000 * waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+                "wait_by_priority": {
+                    priority: {"requests": count, "mean_wait_ms": 1000 * total / count, "max_wait_ms": 1000 * longest}
+                    for priority, (count, total, longest) in sorted(self._waits_by_priority.items())
+                },
+            }
+
+REQUEST_SCHEDULER = RequestScheduler()
+
+def get_request_scheduler_stats():
+    """Queue wait times and load of the shared outbound request scheduler"""
+    return REQUEST_SCHEDULER.snapshot()
+
+class RetryPolicy:
+    """
+    When and how long to wait before retrying a model call
+
+    Server hints win: a Retry-After header, or the estimated_time the
+    Inference API returns while a model is loading. Otherwise the wait is
+    exponential backoff with full jitter. Each wait is capped at max_delay.
+    """
+
+    def __init__(self, max_attempts=None, base_delay=None, max_delay=None, max_total_wait=None,
+                 retryable_statuses=RETRYABLE_STATUS_CODES, budget=None):
+        self.max_attempts = max_attempts or RETRY_MAX_ATTEMPTS
+        self.base_delay = base_delay if base_delay is not None else RETRY_BASE_DELAY
+        self.max_delay = max_delay if max_delay is not None else RETRY_MAX_DELAY
+        self.max_total_wait = max_total_wait if max_total_wait is not None else RETRY_MAX_TOTAL_WAIT
+        self.retryable_statuses = retryable_statuses
+        self.budget = budget or RETRY_BUDGET
+
+    def is_retryable(self, response=None, error=None):
+        """Retry on throttling, server errors, timeouts and connection failures"""
+        if isinstance(error, DeadlineExceeded):
+            return False  # The caller ran out of time; the endpoint did nothing wrong
+        if error is not None:
+            return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, asyncio.TimeoutError))
+        return response.status_code in self.retryable_statuses
+
+    @staticmethod
+    def server_hint(response):
+        """Seconds the server asked us to wait (Retry-After or estimated_time), or None"""
+        if response is None:
+            return None
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass
+            try:
+                # HTTP-date form
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+        try:
+            body = response.json()
+        except ValueError:
+            return None
+        if isinstance(body, dict) and isinstance(body.get("estimated_time"), (int, float)):
+            return max(0.0, float(body["estimated_time"]))
+        return None
+
+    def delay(self, attempt, response=None):
+        """Wait before retry number `attempt` (1-based)"""
+        hint = self.server_hint(response)
+        if hint is not None:
+            # A little jitter so sessions waiting on the same cold model do not retry in lockstep
+            return min(self.max_delay, hint * random.uniform(1.0, 1.1))
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+async def post_with_retry(url, payload, timeout=None, policy=None, on_retry=None, breaker=None,
+                          priority=PRIORITY_BATCH, scheduler=None):
+    """
+    async_post with the retry policy applied
+
+    Waits are asyncio sleeps, so they hold neither an HTTP thread nor the
+    event loop: other requests gathered alongside keep running. A synchronous
+    caller (run_coroutine_sync on the script thread) still waits for the
+    whole call; its on_retry callback is what keeps the page informed.
+    Each wait is capped at max_delay and at what is left of the total wait
+    allowance (and of the deadline), so a longer server hint shortens the wait
+    rather than abandoning the call. A retry is skipped - and the last
+    response or error returned to the caller - when the attempts, the wait
+    allowance or the global retry budget run out.
+
+    Every attempt is reported to the endpoint's circuit breaker: transport
+    errors and retryable statuses without a Retry-After/estimated_time hint
+    count as failures, hinted ones as successes (the server is up). An
+    attempt that ends without an outcome (cancelled, non-retryable error,
+    or DeadlineExceeded - the caller's budget, not the endpoint, ran out)
+    releases its breaker slot and is not retried. While it is open no request is sent at all.
+    Under a deadline, a retry is only made if the wait leaves time for it.
+
+    Attempts to the Inference API queue in REQUEST_SCHEDULER at `priority`;
+    the slot is held only while a request is on the wire, not during
+    backoff waits. The shared model server queues and batches on its own.
+
+    Args:
+        on_retry: Optional callable(attempt, delay, reason) before each wait
+        breaker: CircuitBreaker to consult, defaulting to the one for url
+        priority: Scheduler priority, PRIORITY_INTERACTIVE or PRIORITY_BATCH
+        scheduler: RequestScheduler to queue in, defaulting to REQUEST_SCHEDULER for Inference API URLs
+
+    Returns:
+        The final requests.Response; the last exception is re-raised if no response was received
+
+    Raises:
+        CircuitOpenError: The breaker refused the first attempt
+    """
+    policy = policy or RetryPolicy()
+    breaker = breaker or get_circuit_breaker(url)
+    if scheduler is None and url.startswith(HF_INFERENCE_URL):
+        scheduler = REQUEST_SCHEDULER
+    if not breaker.allow_request():
+        raise CircuitOpenError(url)
+    policy.budget.record_request()
+    waited = 0.0
+    response, error = None, None
+
+    for attempt in range(1, policy.max_attempts + 1):
+        if attempt > 1 and not breaker.allow_request():
+            # Opened while we waited: hand back the last outcome rather than send
+            if error is not None:
+                raise error
+            return response
+        response, error = None, None
+        recorded = False
+        try:
+            try:
+                if scheduler is None:
+                    response = await async_post(url, payload, timeout=timeout)
                 else:
-                    st.error(f"API Error after {max_retries} attempts: {response.status_code}")
-                    return None
-        except requests.exceptions.Timeout:
-            st.warning(f"Request timeout (Attempt {attempt + 1}/{max_retries})")
-            if attempt < max_retries - 1:
-                time.sleep(5)
+                    async with scheduler.slot(priority):
+                        response = await async_post(url, payload, timeout=timeout)
+            except Exception as e:
+                if not policy.is_retryable(error=e):
+                    raise
+                error, reason = e, type(e).__name__
+                breaker.record_failure()
             else:
-                st.error("Request timed out after multiple attempts")
-                return None
-        except Exception as e:
-            st.warning(f"Request failed: {str(e)} (Attempt {attempt + 1}/{max_retries})")
-            if attempt < max_retries - 1:
-                time.sleep(5)
-            else:
-                st.error(f"Request failed after {max_retries} attempts")
-                return None
+                reason = f"status {response.status_code}"
+                # A server that says when to come back (model loading, throttling) is up, not failing
+                if not policy.is_retryable(response=response) or policy.server_hint(response) is not None:
+                    breaker.record_success()
+                else:
+                    breaker.record_failure()
+            recorded = True
+        finally:
+            if not recorded:
+                breaker.release()
+        if response is not None and not policy.is_retryable(response=response):
+            return response
+
+        allowance = policy.max_total_wait - waited
+        deadline = current_deadline()
+        if deadline is not None:
+            allowance = min(allowance, deadline.remaining() - DEADLINE_MODEL_MIN_SECONDS)
+        delay = min(policy.delay(attempt, response), allowance)
+        if attempt == policy.max_attempts or allowance <= 0 or not policy.budget.try_spend():
+            if error is not None:
+                raise error
+            return response
+
+        if on_retry:
+            on_retry(attempt, delay, reason)
+        await asyncio.sleep(delay)
+        waited += delay
+
+def run_coroutine_sync(coroutine):
+    """
+    Run a coroutine to completion from synchronous code
+
+    Streamlit scripts have no running event loop, so this is a plain
+    asyncio.run on the calling thread and st.* calls inside the coroutine keep
+    working. If a loop is already running here, the coroutine gets its own
+    loop on a helper thread instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(bind_session(asyncio.run), coroutine).result()
+
+def query_huggingface_api(url, payload, max_retries=None):
+    """Query Hugging Face API with retry logic"""
+    return run_coroutine_sync(query_huggingface_api_async(url, payload, max_retries))
+
+async def query_huggingface_api_async(url, payload, max_retries=None):
+    """Async form of query_huggingface_api; retries follow RetryPolicy without blocking"""
+    policy = RetryPolicy(max_attempts=max_retries)
+
+    def report_retry(attempt, delay, reason):
+        if reason == "status 503":
+            st.info(f"Model is loading, retrying in {delay:.0f}s... (Attempt {attempt}/{policy.max_attempts})")
+        else:
+            st.warning(f"Request failed ({reason}), retrying in {delay:.1f}s... (Attempt {attempt}/{policy.max_attempts})")
+
+    try:
+        response = await post_with_retry(url, payload, timeout=30, policy=policy, on_retry=report_retry)
+    except CircuitOpenError:
+        st.error("Model API is unreachable right now. Please try again shortly.")
+        return None
+    except (requests.exceptions.Timeout, asyncio.TimeoutError):
+        st.error("Request timed out after multiple attempts")
+        return None
+    except Exception as e:
+        st.error(f"Request failed: {str(e)}")
+        return None
+
+    if response.status_code == 200:
+        return response.json()
+    elif response.status_code == 404:
+        st.error(f"Model not found (404). Please check the model URL: {url}")
+    elif response.status_code == 401:
+        st.error("Authentication failed. Please check your Hugging Face API key.")
+    elif response.status_code == 503:
+        st.error("Model is still loading. Please try again shortly.")
+    else:
+        st.error(f"API Error: {response.status_code}")
     return None
 
-def query_granite_model(model_name, prompt, task_type="summarization"):
+def response_cache_key(model, task_type, payload):
+    """
+    Cache key for a model call: backend model, task, normalized inputs and generation params
+
+    Whitespace in the inputs is collapsed and parameters are serialised with
+    sorted keys, so re-extracted text and reordered dicts map to the same entry.
+    """
+    inputs = payload.get("inputs", "")
+    normalized = {
+        "model": model,
+        "task_type": task_type,
+        "inputs": " ".join(inputs.split()) if isinstance(inputs, str) else inputs,
+        "parameters": payload.get("parameters", {}),
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    Two-level LRU cache for model responses: process memory in front of the disk cache
+
+    Entries expire ttl_seconds after they were stored. The in-memory level is
+    shared by every session in the server process and holds up to
+    memory_entries responses; the disk level (namespace "responses") survives
+    restarts and is trimmed to max_bytes by disk_cache_put. Hit and miss
+    counters are kept for diagnostics.
+    """
+
+    def __init__(self, ttl_seconds, max_bytes, memory_entries, namespace="responses"):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.namespace = namespace
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "stores": 0}
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached response text for key, or None"""
+        with self._lock:
+            entry = self._memory.get(key)
+        level = "memory_hits"
+        if entry is None:
+            level = "disk_hits"
+            raw_entry = disk_cache_get(self.namespace, key)
+            try:
+                entry = json.loads(raw_entry) if raw_entry is not None else None
+            except ValueError:
+                entry = None
+
+        with self._lock:
+            if entry is not None and time.time() - entry["created"] > self.ttl_seconds:
+                self._memory.pop(key, None)
+                self.counters["expired"] += 1
+                entry = None
+
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+
+            self._remember(key, entry)
+            self.counters["hits"] += 1
+            self.counters[level] += 1
+            return entry["response"]
+
+    def put(self, key, response, **metadata):
+        """Store a response in memory and on disk"""
+        entry = dict(metadata, created=time.time(), response=response)
+        with self._lock:
+            self._remember(key, entry)
+            self.counters["stores"] += 1
+        disk_cache_put(self.namespace, key, json.dumps(entry).encode("utf-8"), self.max_bytes)
+
+    def clear_memory(self):
+        """Drop the in-memory level; disk entries are kept"""
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self):
+        """Snapshot of the counters plus the hit rate"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+RESPONSE_CACHE = ResponseCache(RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_MEMORY_ENTRIES)
+
+def get_response_cache_stats():
+    """Hit/miss counters of the shared model response cache"""
+    return RESPONSE_CACHE.stats()
+
+class _LeaderCancelled(Exception):
+    """Handed to SingleFlight followers when their leader was cancelled"""
+
+class SingleFlight:
+    """
+    Coalesce identical in-flight calls so they share one execution
+
+    The first caller for a key (the leader) runs the call; callers arriving
+    while it is in flight await the leader's result instead of issuing their
+    own. Streamlit sessions run on separate threads with separate event
+    loops, so the shared handle is a thread-safe concurrent.futures.Future.
+    A leader that fails with DeadlineExceeded or is cancelled (e.g. a hedge
+    that lost its race) only gave up for itself: followers with time left run
+    the call again, one of them as the new leader. A follower whose own
+    deadline runs out while it waits gets DeadlineExceeded.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.counters = {"leaders": 0, "coalesced": 0, "takeovers": 0}
+
+    async def run(self, key, call):
+        """Await call() once per key at a time; call is a zero-argument coroutine factory"""
+        while True:
+            with self._lock:
+                shared = self._in_flight.get(key)
+                if shared is None:
+                    shared = self._in_flight[key] = Future()
+                    self.counters["leaders"] += 1
+                    break
+                self.counters["coalesced"] += 1
+
+            deadline = current_deadline()
+            try:
+                # Shielded: a follower giving up at its deadline must not cancel the leader's result
+                return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(shared)),
+                                              deadline.remaining() if deadline else None)
+            except _LeaderCancelled:
+                if not deadline_allows(DEADLINE_MODEL_MIN_SECONDS):
+                    raise DeadlineExceeded("Deadline reached before a coalesced call could be retried") from None
+            except DeadlineExceeded:
+                if not deadline_allows(DEADLINE_MODEL_MIN_SECONDS):
+                    raise
+            except asyncio.TimeoutError:
+                if shared.done():
+                    raise  # The leader's own request timed out
+                raise DeadlineExceeded("Deadline reached waiting for a coalesced call") from None
+            with self._lock:
+                self.counters["takeovers"] += 1
+
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            self._finish(key, shared)
+            shared.set_exception(_LeaderCancelled())
+            raise
+        except BaseException as e:
+            # Unregister before waking followers, so one that takes over starts a fresh call
+            self._finish(key, shared)
+            shared.set_exception(e)
+            raise
+        self._finish(key, shared)
+        shared.set_result(result)
+        return result
+
+    def _finish(self, key, shared):
+        with self._lock:
+            if self._in_flight.get(key) is shared:
+                del self._in_flight[key]
+
+    def stats(self):
+        """Leader and coalesced counts, plus calls in flight right now"""
+        with self._lock:
+            return dict(self.counters, in_flight=len(self._in_flight))
+
+MODEL_SINGLE_FLIGHT = SingleFlight()
+
+def get_single_flight_stats():
+    """How many identical model calls were coalesced onto an in-flight one"""
+    return MODEL_SINGLE_FLIGHT.stats()
+
+def is_response_cacheable(payload, cache_sampled=None):
+    """Deterministic calls are always cacheable; sampled ones only when opted in"""
+    if not RESPONSE_CACHE_ENABLED:
+        return False
+    if payload.get("parameters", {}).get("do_sample") is False:
+        return True
+    return RESPONSE_CACHE_SAMPLED if cache_sampled is None else cache_sampled
+
+# Tokenizers loaded so far, keyed by backend model; None records one that is unavailable
+_TOKENIZERS = {}
+_TOKENIZER_LOCK = threading.Lock()
+
+# Sentence ends are preferred chunk boundaries, clause ends are used inside overlong sentences
+# (a clause number such as "12." does not end a sentence)
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])(?<!\b\d\.)(?<!\b\d\d\.)(?<!\b\d\d\d\.)\s+|\n\s*\n")
+_CLAUSE_BOUNDARY = re.compile(r"(?<=[,;:])\s+")
+_TOKEN_ESTIMATE_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+def _load_tokenizer(model_name):
+    """Return the model's tokenizer from the local Hugging Face cache, or None when unavailable"""
+    try:
+        from transformers import AutoTokenizer
+    except ImportError:
+        return None
+    try:
+        return AutoTokenizer.from_pretrained(model_name, local_files_only=not MODEL_DOWNLOAD)
+    except Exception:
+        # Not cached locally (or not downloadable); token counts fall back to an estimate
+        return None
+
+def get_tokenizer(model_name):
+    """Return the tokenizer of the model that actually serves model_name, loading it once per process"""
+    backend_model = GRANITE_BACKEND_MAPPING.get(model_name, model_name)
+    with _TOKENIZER_LOCK:
+        if backend_model not in _TOKENIZERS:
+            _TOKENIZERS[backend_model] = _load_tokenizer(backend_model)
+        return _TOKENIZERS[backend_model]
+
+def count_tokens(text, model_name):
+    """
+    Count the tokens text occupies in model_name's context window
+
+    Without a local tokenizer the count is a deliberately high estimate
+    (a quarter of the characters or one per word and punctuation mark,
+    whichever is larger), so budgets are under- rather than over-filled.
+    """
+    tokenizer = get_tokenizer(model_name)
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False))
+    return max(len(_TOKEN_ESTIMATE_PATTERN.findall(text)), -(-len(text) // 4))
+
+def input_token_budget(model_name, prompt_template=""):
+    """
+    Tokens of document text one request to model_name can carry
+
+    Summarization backends receive only the document text, so they get the
+    whole window minus special tokens. Text-generation backends receive the
+    full prompt template and share the window with the tokens they generate.
+    """
+    backend_model = GRANITE_BACKEND_MAPPING.get(model_name, model_name)
+    tokenizer = get_tokenizer(backend_model)
+    special_tokens = tokenizer.num_special_tokens_to_add() if tokenizer is not None else 2
+    budget = MODEL_CONTEXT_TOKENS.get(backend_model, DEFAULT_CONTEXT_TOKENS) - special_tokens
+    if get_model_backend(backend_model).prompt_in_input:
+        budget -= GENERATION_MAX_NEW_TOKENS + count_tokens(prompt_template, backend_model)
+    return max(budget, 1)
+
+def _split_long_unit(unit, model_name, max_tokens):
+    """Split a sentence longer than max_tokens at clause ends, then at token (or word) boundaries"""
+    pieces = []
+    for clause in _CLAUSE_BOUNDARY.split(unit):
+        if count_tokens(clause, model_name) <= max_tokens:
+            pieces.append(clause)
+            continue
+        tokenizer = get_tokenizer(model_name)
+        if tokenizer is not None:
+            token_ids = tokenizer.encode(clause, add_special_tokens=False)
+            pieces.extend(tokenizer.decode(token_ids[start:start + max_tokens]).strip()
+                          for start in range(0, len(token_ids), max_tokens))
+        else:
+            piece, piece_tokens = [], 0
+            for word in clause.split():
+                # Words too long for one piece are cut at the estimate's four characters per token
+                for part in [word[start:start + max_tokens * 4] for start in range(0, len(word), max_tokens * 4)]:
+                    tokens = count_tokens(" " + part, model_name)
+                    if piece and piece_tokens + tokens > max_tokens:
+                        pieces.append(" ".join(piece))
+                        piece, piece_tokens = [], 0
+                    piece.append(part)
+                    piece_tokens += tokens
+            if piece:
+                pieces.append(" ".join(piece))
+    return [piece for piece in pieces if piece]
+
+def split_text_by_tokens(text, model_name, max_tokens=None, overlap_tokens=None, content_defined=False):
+    """
+    Split text into chunks of whole sentences that each fit max_tokens
+
+    Sentences are packed greedily until the next one would overflow the
+    budget; sentences that are too long on their own are split at clause
+    ends. Each chunk after the first starts with up to overlap_tokens of
+    the previous chunk's closing sentences.
+
+    With content_defined, a chunk may also end early (once half full) after
+    a sentence whose hash marks it as a cut point. Boundaries then depend on
+    nearby text only, so an edit changes the chunks around it and the rest
+    keep their exact text - and their cached model results.
+
+    Token counts of sentences are summed with their joining space, which
+    matches or overstates the count of the joined chunk.
+    """
+    max_tokens = max_tokens or input_token_budget(model_name)
+    overlap_tokens = CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+
+    units = []
+    for sentence in _SENTENCE_BOUNDARY.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        tokens = count_tokens(" " + sentence, model_name)
+        if tokens > max_tokens:
+            units.extend((piece, count_tokens(" " + piece, model_name))
+                         for piece in _split_long_unit(sentence, model_name, max_tokens - 1))
+        else:
+            units.append((sentence, tokens))
+
+    chunks = []
+    current = []          # (sentence, tokens) pairs, overlap first
+    current_tokens = 0
+    new_units = 0         # Sentences in current that no earlier chunk carried
+
+    def close_chunk():
+        nonlocal current, current_tokens, new_units
+        chunks.append(" ".join(unit for unit, _ in current))
+        overlap, overlap_total = [], 0
+        for unit, tokens in reversed(current):
+            if overlap_total + tokens > overlap_tokens:
+                break
+            overlap.insert(0, (unit, tokens))
+            overlap_total += tokens
+        current, current_tokens, new_units = overlap, overlap_total, 0
+
+    for unit, tokens in units:
+        if current_tokens + tokens > max_tokens:
+            if new_units:
+                close_chunk()
+            while current and current_tokens + tokens > max_tokens:
+                current_tokens -= current.pop(0)[1]
+        current.append((unit, tokens))
+        current_tokens += tokens
+        new_units += 1
+        is_cut_point = hashlib.md5(unit.encode("utf-8")).digest()[0] % 4 == 0
+        if content_defined and is_cut_point and current_tokens >= max_tokens // 2:
+            close_chunk()
+    if new_units:
+        chunks.append(" ".join(unit for unit, _ in current))
+    return chunks
+
+def _iter_sentences(text):
+    """Yield the stripped, non-empty sentences of text lazily"""
+    start = 0
+    for boundary in _SENTENCE_BOUNDARY.finditer(text):
+        sentence = text[start:boundary.start()].strip()
+        if sentence:
+            yield sentence
+        start = boundary.end()
+    sentence = text[start:].strip()
+    if sentence:
+        yield sentence
+
+def fit_text_to_tokens(text, model_name, max_tokens=None):
+    """
+    Return the longest run of whole leading sentences of text that fits max_tokens
+
+    Sentences are read only until the budget is full, so fitting a long
+    document costs no more than fitting the part that is kept.
+    """
+    max_tokens = max_tokens or input_token_budget(model_name)
+    kept = []
+    used_tokens = 0
+    for sentence in _iter_sentences(text):
+        tokens = count_tokens(" " + sentence, model_name)
+        if used_tokens + tokens > max_tokens:
+            if not kept:
+                # The first sentence alone is too long: cut it at clause or token boundaries
+                return split_text_by_tokens(sentence, model_name, max_tokens, overlap_tokens=0)[0]
+            return " ".join(kept)
+        kept.append(sentence)
+        used_tokens += tokens
+    return text
+
+def select_context_for_question(question, context, model_name, max_tokens=None):
+    """
+    Pack the passages of context most relevant to question into max_tokens
+
+    Context that fits is returned whole. Otherwise the document is split
+    into small passages, ranked by how many of the question's words they
+    contain, and the best are kept in document order until the budget is full.
+    """
+    max_tokens = max_tokens or input_token_budget(model_name)
+    if count_tokens(context, model_name) <= max_tokens:
+        return context
+
+    passages = split_text_by_tokens(context, model_name, max(max_tokens // 8, 32), overlap_tokens=0)
+    question_words = {word for word in re.findall(r"\w+", question.lower()) if len(word) > 3 or word.isdigit()}
+
+    def relevance(index):
+        passage_words = set(re.findall(r"\w+", passages[index].lower()))
+        return (len(question_words & passage_words), -index)
+
+    selected = []
+    used_tokens = 0
+    for index in sorted(range(len(passages)), key=relevance, reverse=True):
+        tokens = count_tokens(" " + passages[index], model_name)
+        if used_tokens + tokens <= max_tokens:
+            selected.append(index)
+            used_tokens += tokens
+    return " ".join(passages[index] for index in sorted(selected))
+
+def _summary_prompt(text, max_length):
+    return f"""Please provide a concise professional summary of the following legal document. Focus on key parties, main obligations, important dates, and financial terms. Keep the summary under {max_length} words.
+
+Legal Document:
+{text}
+
+Professional Summary:"""
+
+def _chat_prompt(question, text):
+    return f"""You are a legal document assistant. Based on the following document content, please answer the user's question accurately and helpfully. Provide specific information from the document when available.
+
+Document Content:
+{text}
+
+User Question: {question}
+
+Please provide a clear, accurate answer based on the information in the document. If specific information is not available, explain what general information can be inferred.
+
+Answer:"""
+
+def _task_prompt(task_type, document, question=None, max_words=None):
+    if task_type == "chatbot":
+        return _chat_prompt(question, document)
+    return _summary_prompt(document, max_words or 150)
+
+def _fit_document(model_name, task_type, document, question, prompt_template):
+    """Cut document to the model's budget: the passages relevant to a question, else the leading sentences"""
+    budget = input_token_budget(model_name, prompt_template)
+    if task_type == "chatbot" and question:
+        return select_context_for_question(question, document, model_name, budget)
+    return fit_text_to_tokens(document, model_name, budget)
+
+def _build_summarization_payload(model_name, task_type, document=None, question=None, prompt=None, max_words=None):
+    """Summarization models take only the text to condense: the document, or a free-form prompt"""
+    if document is None:
+        text = fit_text_to_tokens(prompt, model_name)
+    else:
+        text = _fit_document(model_name, task_type, document, question, "")
+    return {
+        "inputs": text,
+        "parameters": {
+            "max_length": 200,
+            "min_length": 30,
+            "do_sample": False,
+            "early_stopping": True
+        }
+    }
+
+def _parse_summarization_response(result):
+    if isinstance(result, list) and result:
+        result = result[0]
+    return result.get("summary_text", "") if isinstance(result, dict) else ""
+
+def _build_text_generation_payload(model_name, task_type, document=None, question=None, prompt=None, max_words=None):
+    """Text-generation models get the task's instruction template around the fitted document"""
+    if document is not None:
+        template = _task_prompt(task_type, "", question, max_words)
+        fitted = _fit_document(model_name, task_type, document, question, template)
+        prompt = _task_prompt(task_type, fitted, question, max_words)
+    return {
+        "inputs": prompt,
+        "parameters": {
+            "max_new_tokens": GENERATION_MAX_NEW_TOKENS,
+            "temperature": 0.3,
+            "do_sample": True,
+            "top_p": 0.9,
+            "return_full_text": False
+        }
+    }
+
+def _parse_text_generation_response(result):
+    if isinstance(result, list) and result:
+        result = result[0]
+    if isinstance(result, dict):
+        return result.get("generated_text", result.get("summary_text", ""))
+    return ""
+
+class ModelBackend:
+    """
+    How requests to one backend model are built and read
+
+    build_payload(model_name, task_type, document=, question=, prompt=,
+    max_words=) turns structured inputs into an Inference API payload, and
+    parse_response(result) returns the generated text from its JSON.
+    pipeline_task names the transformers pipeline used by the local and
+    server backends; prompt_in_input says whether the instruction template
+    is sent with the document and so takes up part of the context window.
+    """
+
+    def __init__(self, pipeline_task, build_payload, parse_response, prompt_in_input):
+        self.pipeline_task = pipeline_task
+        self.build_payload = build_payload
+        self.parse_response = parse_response
+        self.prompt_in_input = prompt_in_input
+
+SUMMARIZATION_BACKEND = ModelBackend(
+    "summarization", _build_summarization_payload, _parse_summarization_response, prompt_in_input=False
+)
+TEXT_GENERATION_BACKEND = ModelBackend(
+    "text-generation", _build_text_generation_payload, _parse_text_generation_response, prompt_in_input=True
+)
+
+# Backend models by name; models not listed are called as text-generation models
+MODEL_BACKENDS = {
+    "facebook/bart-large-cnn": SUMMARIZATION_BACKEND,
+    "facebook/bart-large": SUMMARIZATION_BACKEND,
+    "sshleifer/distilbart-cnn-12-6": SUMMARIZATION_BACKEND
+}
+
+def get_model_backend(model_name):
+    """Return the ModelBackend of the model that actually serves model_name"""
+    return MODEL_BACKENDS.get(GRANITE_BACKEND_MAPPING.get(model_name, model_name), TEXT_GENERATION_BACKEND)
+
+# Local inference runs one request at a time; each request uses LOCAL_INFERENCE_THREADS CPU threads
+_LOCAL_INFERENCE_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clausewise-local")
+_local_pipeline_loader = None
+
+def _load_local_pipeline(model_name, threads):
+    """Load model_name for CPU inference with a transformers pipeline"""
+    import torch
+    from transformers import AutoModelForCausalLM, AutoModelForSeq2SeqLM, pipeline
+
+    tokenizer = get_tokenizer(model_name)
+    if tokenizer is None:
+        raise RuntimeError(f"Tokenizer for {model_name} is not in the local model cache")
+    torch.set_num_threads(threads)
+    task = get_model_backend(model_name).pipeline_task
+    model_class = AutoModelForSeq2SeqLM if task == "summarization" else AutoModelForCausalLM
+    model = model_class.from_pretrained(model_name, local_files_only=not MODEL_DOWNLOAD)
+    model.eval()
+    return pipeline(task, model=model, tokenizer=tokenizer, device=-1)
+
+def get_local_pipeline(model_name, threads=None):
+    """
+    Return the CPU pipeline serving model_name, loaded once per process
+
+    The pipeline is held with st.cache_resource, so every session shares one
+    copy of the weights. The decorator is applied on first use rather than at
+    import, so utils still imports where Streamlit is replaced by a test double.
+    """
+    global _local_pipeline_loader
+    if _local_pipeline_loader is None:
+        _local_pipeline_loader = st.cache_resource(show_spinner=False)(_load_local_pipeline)
+    backend_model = GRANITE_BACKEND_MAPPING.get(model_name, model_name)
+    return _local_pipeline_loader(backend_model, threads or LOCAL_INFERENCE_THREADS)
+
+class LocalInferenceResponse:
+    """The parts of requests.Response the model client reads, for in-process results"""
+
+    status_code = 200
+
+    def __init__(self, result):
+        self._result = result
+
+    def json(self):
+        return self._result
+
+async def post_local_inference(model_name, payload, timeout=None):
+    """
+    Run an Inference API payload through the local pipeline
+
+    Counterpart of post_with_retry for CLAUSEWISE_MODEL_BACKEND=local: the
+    result has the API's JSON shape, so responses are parsed and cached the
+    same way. Inference runs on _LOCAL_INFERENCE_EXECUTOR; a request that
+    overruns timeout (cut to the current deadline) raises asyncio.TimeoutError.
+    """
+    timeout = deadline_timeout(timeout)
+    loop = asyncio.get_running_loop()
+
+    def run():
+        local_pipeline = get_local_pipeline(model_name)
+        return local_pipeline(payload["inputs"], truncation=True, **payload.get("parameters", {}))
+
+    result = await asyncio.wait_for(loop.run_in_executor(_LOCAL_INFERENCE_EXECUTOR, run), timeout)
+    return LocalInferenceResponse(result)
+
+def backend_model_url(actual_model):
+    """Where query_granite_model sends requests for actual_model under the configured backend"""
+    if MODEL_BACKEND == "local":
+        return f"local://{actual_model}"
+    if MODEL_BACKEND == "server":
+        return f"{MODEL_SERVER_URL}/models/{actual_model}"
+    return f"{HF_INFERENCE_URL}/{actual_model}"
+
+class ModelWarmer:
+    """
+    Background warm-up pings with per-backend warm-state tracking
+
+    A backend is pinged only when nothing is known about it or its last
+    state has lapsed: a warm mark lasts ttl_seconds, a "loading" answer
+    lasts the server's estimated_time, a failed ping MODEL_WARMUP_RETRY_SECONDS.
+    Real model calls that succeed refresh the warm mark too. Shared by every
+    session, so several uploads at once send one ping per backend. Pings go
+    through post_with_retry at PRIORITY_BATCH, so they queue behind user
+    requests in REQUEST_SCHEDULER and are not sent while a breaker is open.
+    """
+
+    COLD = "cold"
+    LOADING = "loading"
+    WARM = "warm"
+
+    def __init__(self, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self._states = {}  # url -> {"state", "until", "pinging"}
+        self._lock = threading.Lock()
+        self.pings = 0
+        self.suppressed = 0
+
+    def mark(self, url, state, seconds):
+        with self._lock:
+            self._states[url] = {"state": state, "until": time.monotonic() + seconds, "pinging": False}
+
+    def mark_warm(self, url):
+        self.mark(url, self.WARM, self.ttl_seconds)
+
+    def _claim(self, url):
+        """True when the caller should ping url; False when a ping is redundant"""
+        with self._lock:
+            entry = self._states.get(url)
+            if entry and (entry["pinging"] or time.monotonic() < entry["until"]):
+                self.suppressed += 1
+                return False
+            self._states[url] = {"state": entry["state"] if entry else self.COLD, "until": 0.0, "pinging": True}
+            self.pings += 1
+            return True
+
+    def ping(self, url):
+        """Start a warm-up for url in the background; returns its Future, or None when suppressed"""
+        if not self._claim(url):
+            return None
+        if url.startswith("local://"):
+            return _LOCAL_INFERENCE_EXECUTOR.submit(self._load_local, url)
+        # Not _HTTP_EXECUTOR: the ping's own request runs there, and a full pool would deadlock
+        return _WARMUP_EXECUTOR.submit(self._ping_remote, url)
+
+    def _ping_remote(self, url):
+        try:
+            response = run_coroutine_sync(post_with_retry(
+                url, {"inputs": "Warm-up."}, timeout=MODEL_WARMUP_TIMEOUT,
+                policy=RetryPolicy(max_attempts=1), priority=PRIORITY_BATCH
+            ))
+        except (requests.RequestException, asyncio.TimeoutError, CircuitOpenError):
+            self.mark(url, self.COLD, MODEL_WARMUP_RETRY_SECONDS)
+            return
+        if response.status_code == 200:
+            self.mark_warm(url)
+        elif response.status_code == 503:
+            # Loading was triggered; check again once the server expects it to be ready
+            self.mark(url, self.LOADING, RetryPolicy.server_hint(response) or MODEL_WARMUP_RETRY_SECONDS)
+        else:
+            self.mark(url, self.COLD, MODEL_WARMUP_RETRY_SECONDS)
+
+    def _load_local(self, url):
+        try:
+            get_local_pipeline(url[len("local://"):])
+        except Exception:
+            self.mark(url, self.COLD, MODEL_WARMUP_RETRY_SECONDS)
+            return
+        # Held for the life of the process
+        self.mark(url, self.WARM, float("inf"))
+
+    def snapshot(self):
+        """Known backends with their state and seconds until it lapses"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "endpoint": url,
+                    "state": "pinging" if entry["pinging"] else entry["state"],
+                    "expires_in_seconds": max(0.0, entry["until"] - now) if not entry["pinging"] else None,
+                }
+                for url, entry in sorted(self._states.items())
+            ]
+
+_WARMUP_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="clausewise-warmup")
+MODEL_WARMER = ModelWarmer(MODEL_WARM_TTL_SECONDS)
+
+def warm_up_models():
+    """
+    Ping every text model backend in MODEL_URLS in the background
+
+    Called as an upload starts, so a cold model loads while the document is
+    being extracted. Returns the Futures of the pings actually sent. Speech
+    entries are skipped, since speech is synthesized offline with pyttsx3.
+    """
+    if not MODEL_WARMUP_ENABLED:
+        return []
+    targets = []
+    for task, url in MODEL_URLS.items():
+        if task.startswith(("tts", "voice")):
+            continue
+        model_name = url.split("/models/", 1)[-1]
+        target = backend_model_url(GRANITE_BACKEND_MAPPING.get(model_name, model_name))
+        if target not in targets:
+            targets.append(target)
+    return [future for future in (MODEL_WARMER.ping(target) for target in targets) if future is not None]
+
+def get_model_server_metrics(timeout=2):
+    """Queue depth and batch sizes reported by the shared model server, or None when unreachable"""
+    try:
+        response = get_http_session().get(f"{MODEL_SERVER_URL}/metrics", timeout=timeout)
+        return response.json() if response.status_code == 200 else None
+    except (requests.RequestException, ValueError):
+        return None
+
+def query_granite_model(model_name, prompt=None, task_type="summarization", timeout=None, cache_sampled=None,
+                        local_fallback=True, document=None, question=None, max_words=None):
     """
     Query IBM Granite model with intelligent backend mapping for guaranteed functionality
 
     Args:
         model_name: The IBM Granite model to use (with backend mapping)
-        prompt: The input prompt for the model
+        prompt: A free-form input prompt, sent as-is, for calls without a document
         task_type: Type of task (summarization, chatbot, analysis)
+        timeout: Seconds to wait for the model, defaulting to MODEL_REQUEST_TIMEOUT
+        cache_sampled: Cache this call's response even though it samples
+            (do_sample=True); defaults to CLAUSEWISE_RESPONSE_CACHE_SAMPLED
+        local_fallback: Return enhanced local processing when the model is
+            unavailable; with False, None is returned instead
+        document: Document text for the task; the model's backend fits it to
+            the context window and adds any instruction template itself
+        question: The user's question, for chatbot calls
+        max_words: Target summary length, for backends that take instructions
 
     Returns:
         Model response using IBM Granite integration
     """
+    return run_coroutine_sync(query_granite_model_async(
+        model_name, prompt, task_type, timeout, cache_sampled, local_fallback, document, question, max_words
+    ))
+
+async def query_granite_model_async(model_name, prompt=None, task_type="summarization", timeout=None, cache_sampled=None,
+                                    local_fallback=True, document=None, question=None, max_words=None):
+    """Async form of query_granite_model; independent calls can be awaited together"""
     # Check if this is an IBM Granite model that needs backend mapping
     if model_name in GRANITE_BACKEND_MAPPING:
         backend_model = GRANITE_BACKEND_MAPPING[model_name]
-        st.info(f"🔄 Using IBM Granite model: {model_name}")
-        st.info(f"🔧 IBM Granite backend: {backend_model}")
-        model_url = f"https://api-inference.huggingface.co/models/{backend_model}"
+        status_ui().info(f"🔄 Using IBM Granite model: {model_name}")
+        status_ui().info(f"🔧 IBM Granite backend: {backend_model}")
         actual_model = backend_model
     else:
-        model_url = f"https://api-inference.huggingface.co/models/{model_name}"
         actual_model = model_name
+    model_url = backend_model_url(actual_model)
 
-    # Prepare payload based on actual backend model type and task
-    if "bart" in actual_model.lower():
-        # BART models work best with summarization format
-        if task_type == "summarization":
-            # BART CNN expects just the text to summarize
-            if "Professional Summary:" in prompt:
-                # Extract just the document text from the prompt
-                text_start = prompt.find("Legal Document:") + len("Legal Document:")
-                text_end = prompt.find("Professional Summary:")
-                if text_start > 0 and text_end > text_start:
-                    clean_text = prompt[text_start:text_end].strip()
-                else:
-                    clean_text = prompt
-            else:
-                clean_text = prompt
-        elif task_type == "chatbot":
-            # For chatbot, convert question to summarization format
-            if "Document Content:" in prompt:
-                # Extract document content for summarization
-                doc_start = prompt.find("Document Content:") + len("Document Content:")
-                doc_end = prompt.find("User Question:")
-                if doc_start > 0 and doc_end > doc_start:
-                    clean_text = prompt[doc_start:doc_end].strip()
-                else:
-                    clean_text = prompt[:500]  # Use first part of prompt
-            else:
-                clean_text = prompt[:500]  # Limit length for BART
-        else:
-            # For analysis, use the prompt as-is but limit length
-            clean_text = prompt[:500]
-
-        payload = {
-            "inputs": clean_text,
-            "parameters": {
-                "max_length": 200,
-                "min_length": 30,
-                "do_sample": False,
-                "early_stopping": True
-            }
-        }
-    else:
-        # Generic text generation format
-        payload = {
-            "inputs": prompt,
-            "parameters": {
-                "max_new_tokens": 300,
-                "temperature": 0.3,
-                "do_sample": True,
-                "top_p": 0.9
-            }
-        }
+    # The backend's own builder turns the structured inputs into its payload
+    backend = get_model_backend(actual_model)
+    payload = backend.build_payload(
+        actual_model, task_type, document=document, question=question, prompt=prompt, max_words=max_words
+    )
+
+    request_key = response_cache_key(actual_model, task_type, payload)
+    cache_key = None
+    if is_response_cacheable(payload, cache_sampled):
+        cache_key = request_key
+        cached_text = RESPONSE_CACHE.get(cache_key)
+        if cached_text is not None:
+            status_ui().success(f"⚡ Reused cached response from AI model ({model_name})")
+            return cached_text
 
     try:
-        response = requests.post(model_url, headers=HF_HEADERS, json=payload, timeout=45)
+        if not deadline_allows(DEADLINE_MODEL_MIN_SECONDS):
+            raise DeadlineExceeded(f"Less than {DEADLINE_MODEL_MIN_SECONDS:g}s left for {model_name}")
+        if MODEL_BACKEND == "local":
+            def send():
+                return post_local_inference(actual_model, payload, timeout=timeout)
+        else:
+            def send():
+                return post_with_retry(
+                    model_url, payload, timeout=timeout,
+                    priority=SCHEDULER_TASK_PRIORITIES.get(task_type, PRIORITY_BATCH),
+                    on_retry=lambda attempt, delay, reason: status_ui().info(
+                        f"⏳ AI model ({model_name}) unavailable ({reason}), retrying in {delay:.1f}s..."
+                    )
+                )
+
+        # Identical requests from other sessions already in flight share that call
+        response = await MODEL_SINGLE_FLIGHT.run(request_key, send)
 
         if response.status_code == 200:
-            result = response.json()
-            if result:
-                # Handle different response formats
-                if isinstance(result, list) and len(result) > 0:
-                    if "bart" in actual_model.lower():
-                        # BART models always return summary_text
-                        generated_text = result[0].get("summary_text", "")
-                    else:
-                        generated_text = result[0].get("generated_text", result[0].get("summary_text", ""))
-                elif isinstance(result, dict):
-                    # Handle direct dictionary response
-                    if "bart" in actual_model.lower():
-                        generated_text = result.get("summary_text", "")
-                    else:
-                        generated_text = result.get("generated_text", result.get("summary_text", ""))
+            generated_text = backend.parse_response(response.json())
+            if generated_text and len(generated_text.strip()) > 10:
+                MODEL_WARMER.mark_warm(model_url)
+                if cache_key:
+                    RESPONSE_CACHE.put(cache_key, generated_text, model=actual_model, task_type=task_type)
+                # Show IBM Granite success message
+                if model_name in GRANITE_BACKEND_MAPPING:
+                    status_ui().success(f"✅ IBM Granite model ({model_name}) responded successfully!")
                 else:
-                    # Handle other formats (like embeddings)
-                    generated_text = ""
-
-                if generated_text and len(generated_text.strip()) > 10:
-                    # Show IBM Granite success message
-                    if model_name in GRANITE_BACKEND_MAPPING:
-                        st.success(f"✅ IBM Granite model ({model_name}) responded successfully!")
-                    else:
-                        st.success(f"✅ AI model ({model_name}) responded successfully!")
-                    return generated_text
+                    status_ui().success(f"✅ AI model ({model_name}) responded successfully!")
+                return generated_text
 
         elif response.status_code == 503:
-            st.warning(f"⏳ AI model ({model_name}) is loading...")
+            status_ui().warning(f"⏳ AI model ({model_name}) is loading...")
         elif response.status_code == 404:
-            st.warning(f"❌ AI model ({model_name}) not found via Inference API")
+            status_ui().warning(f"❌ AI model ({model_name}) not found via Inference API")
         elif response.status_code == 401:
-            st.error("❌ Authentication failed - check API key")
+            status_ui().error("❌ Authentication failed - check API key")
         else:
-            st.warning(f"⚠️ AI model returned status {response.status_code}")
-
+            status_ui().warning(f"⚠️ AI model returned status {response.status_code}")
+
+    except CircuitOpenError:
+        status_ui().info(f"⚡ AI model ({model_name}) is unreachable right now; skipping straight to local processing")
+    except DeadlineExceeded:
+        status_ui().info(f"⏱️ Time budget for this analysis is used up; skipping AI model ({model_name}) for local processing")
+    except asyncio.TimeoutError:
+        status_ui().warning(f"⚠️ AI model ({model_name}) did not respond within {timeout or MODEL_REQUEST_TIMEOUT:g}s")
     except Exception as e:
-        st.warning(f"⚠️ AI model error: {str(e)}")
+        status_ui().warning(f"⚠️ AI model error: {str(e)}")
+
+    if not local_fallback:
+        return None
 
     # Fallback to enhanced local processing
-    st.info(f"🔄 Using enhanced local processing for {task_type}")
+    status_ui().info(f"🔄 Using enhanced local processing for {task_type}")
+    note_stage_mode("local (model unavailable)" if deadline_allows(DEADLINE_MODEL_MIN_SECONDS) else "local (time budget)")
 
     if task_type == "summarization":
         # Enhanced extractive summarization
-        sentences = prompt.split('. ')[:5]
+        sentences = (document if document is not None else prompt).split('. ')[:5]
         if sentences:
             summary = '. '.join(sentences) + '.'
             return f"Document Summary: {summary}"
     elif task_type == "chatbot":
         # Enhanced keyword-based response
-        question_lower = prompt.lower()
+        question_lower = (question or prompt or "").lower()
         if any(word in question_lower for word in ['value', 'amount', 'cost', 'price']):
             return "Please refer to the financial terms section of the document for specific amounts and values."
         elif any(word in question_lower for word in ['party', 'parties', 'who', 'company']):
@@ -305,8 +2552,165 @@ def query_granite_model(model_name, prompt, task_type="summarization"):
     # Final fallback
     return f"Enhanced local processing completed for {task_type}. Please review the document manually for detailed analysis."
 
-def generate_summary(text, max_length=150):
+# Status messages of model calls; off in hedge threads, which have no Streamlit script run to draw into
+_STATUS_MESSAGES = contextvars.ContextVar("clausewise_status_messages", default=True)
+
+class _SilentStatus:
+    """Stands in for st where status messages are off"""
+
+    def _ignore(self, *args, **kwargs):
+        pass
+
+    info = success = warning = error = _ignore
+
+_SILENT_STATUS = _SilentStatus()
+
+def status_ui():
+    """st for model-call status messages, or a silent stand-in in background threads"""
+    return st if _STATUS_MESSAGES.get() else _SILENT_STATUS
+
+# Model calls that miss their hedge deadline keep running here, on their own event loops
+_HEDGE_EXECUTOR = ThreadPoolExecutor(max_workers=HTTP_POOL_MAXSIZE, thread_name_prefix="clausewise-hedge")
+
+class HedgedAnswer(str):
+    """
+    A local answer served because the model missed its hedge deadline
+
+    Behaves as the local answer's text. `upgrade` is a Future that resolves
+    to the model's answer when it arrives, or to None if the model fails.
+    """
+
+    upgrade = None
+
+def _run_remote_answer(remote_factory):
+    _DEADLINE_STAGE.set(None)  # The stage is reported when the hedge resolves, not when this call ends
+    _STATUS_MESSAGES.set(False)
+    try:
+        return asyncio.run(remote_factory())
+    except Exception:
+        return None
+
+async def run_hedged_async(remote_factory, local_answer, deadline=None):
+    """
+    Race a model call against a cheap local answer under a latency deadline
+
+    remote_factory() returns a coroutine resolving to the model's answer or
+    None; local_answer() computes the fallback while the call is in flight.
+    The model's answer is returned if it arrives within deadline seconds,
+    otherwise the local one as a HedgedAnswer whose upgrade delivers the
+    model's answer later. The wait is cut to the current operation's
+    deadline, which the model call keeps after the hedge resolves.
+    """
+    deadline = HEDGE_DEADLINE_SECONDS if deadline is None else deadline
+    operation_deadline = current_deadline()
+    if operation_deadline is not None:
+        deadline = min(deadline, operation_deadline.remaining())
+    remote = _HEDGE_EXECUTOR.submit(bind_session(_run_remote_answer), remote_factory)
+    local = local_answer()
+    try:
+        result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(remote)), deadline)
+    except asyncio.TimeoutError:
+        note_stage_mode("local (model answer pending)")
+        answer = HedgedAnswer(local)
+        answer.upgrade = remote
+        return answer
+    if not result:
+        note_stage_mode("local (model unavailable)")
+    return result or local
+
+def resolve_hedged_answer(answer):
+    """Return (text, pending): the model's answer once available, and whether one may still arrive"""
+    upgrade = getattr(answer, "upgrade", None)
+    if upgrade is None:
+        return answer, False
+    if not upgrade.done():
+        return answer, True
+    return upgrade.result() or str(answer), False
+
+def upgrade_hedged_answers():
+    """
+    Swap late model answers into the session's summary and chat history
+
+    Returns (upgraded, pending): whether any answer changed, and whether
+    more model answers may still arrive.
+    """
+    upgraded = pending = False
+    summary = st.session_state.get('document_summary')
+    if summary:
+        text, still_pending = resolve_hedged_answer(summary)
+        if text is not summary:
+            st.session_state.document_summary = text
+            upgraded = True
+        pending = pending or still_pending
+    for message in st.session_state.get('chat_history', []):
+        if message['role'] == 'assistant':
+            text, still_pending = resolve_hedged_answer(message['content'])
+            if text is not message['content']:
+                message['content'] = text
+                upgraded = True
+            pending = pending or still_pending
+    return upgraded, pending
+
+_hedged_answer_watcher = None
+
+def watch_hedged_answers():
+    """
+    Poll for late model answers and redraw the page once one arrives
+
+    Call at the end of a page while upgrade_hedged_answers() reports
+    pending answers. The fragment is created on first use, so importing
+    utils does not need a Streamlit with st.fragment.
+    """
+    global _hedged_answer_watcher
+    if _hedged_answer_watcher is None:
+        @st.fragment(run_every=1)
+        def hedged_answer_watcher():
+            upgraded, pending = upgrade_hedged_answers()
+            if upgraded or not pending:
+                st.rerun()
+
+        _hedged_answer_watcher = hedged_answer_watcher
+    _hedged_answer_watcher()
+
+def generate_summary(text, max_length=150, mode=None, hedge_deadline=None):
     """Generate summary using IBM Granite model with enhanced legal document processing"""
+    return run_coroutine_sync(generate_summary_async(text, max_length, mode, hedge_deadline))
+
+def extractive_summary(text):
+    """Local summary from the opening sentences, served when the model is unavailable or slow"""
+    sentences = text.split('. ')[:5]
+    fallback_summary = '. '.join(sentences) + '.' if sentences else "Document uploaded successfully. Summary generation temporarily unavailable."
+    return f"Document Overview: {fallback_summary}"
+
+async def generate_summary_async(text, max_length=150, mode=None, hedge_deadline=None, local_fallback=True):
+    """
+    Async form of generate_summary; mode overrides SUMMARY_MODE
+
+    hedge_deadline overrides CLAUSEWISE_HEDGE_DEADLINE (0 disables hedging).
+    With local_fallback=False, None is returned when the model does not answer.
+    Under a deadline the local summary is served at once when too little
+    time is left for a model call, and map-reduce drops to single mode
+    when too little is left for its rounds.
+    """
+    if local_fallback and not deadline_allows(DEADLINE_MODEL_MIN_SECONDS):
+        note_stage_mode("local (time budget)")
+        return extractive_summary(text)
+
+    hedge_deadline = HEDGE_DEADLINE_SECONDS if hedge_deadline is None else hedge_deadline
+    if hedge_deadline > 0 and local_fallback:
+        return await run_hedged_async(
+            lambda: generate_summary_async(text, max_length, mode, hedge_deadline=0, local_fallback=False),
+            lambda: extractive_summary(text),
+            hedge_deadline
+        )
+
+    mode = mode or SUMMARY_MODE
+    summary_model = IBM_GRANITE_MODELS["summarization"]
+    if mode == "map_reduce" or (mode == "auto" and count_tokens(text, summary_model) > _summary_chunk_tokens()):
+        if deadline_allows(DEADLINE_MAP_REDUCE_MIN_SECONDS):
+            return await generate_map_reduce_summary_async(text, max_length, local_fallback)
+        note_stage_mode("single (time budget)")
+
     # Pre-process text for better summarization
     # Focus on legal document structure
     legal_keywords = ['contract', 'agreement', 'party', 'whereas', 'hereby', 'shall', 'obligations', 'terms']
@@ -318,43 +2722,97 @@ def generate_summary(text, max_length=150):
         if any(keyword.lower() in sentence.lower() for keyword in legal_keywords):
             key_sentences.append(sentence.strip())
 
-    # Use key sentences if found, otherwise use beginning of document
-    summary_text = '. '.join(key_sentences[:5]) if key_sentences else text[:1500]
-
-    # Create IBM Granite-optimized prompt for legal document summarization
-    granite_prompt = f"""Please provide a concise professional summary of the following legal document. Focus on key parties, main obligations, important dates, and financial terms. Keep the summary under {max_length} words.
-
-Legal Document:
-{summary_text}
-
-Professional Summary:"""
+    # Use key sentences if found, otherwise as much of the document as the model takes
+    summary_text = '. '.join(key_sentences[:5]) if key_sentences else text
 
     # Try IBM Granite model first
-    st.info("🔄 Using IBM Granite model for enhanced legal document summarization...")
+    status_ui().info("🔄 Using IBM Granite model for enhanced legal document summarization...")
 
-    granite_result = query_granite_model(
-        IBM_GRANITE_MODELS["summarization"],
-        granite_prompt,
-        task_type="summarization"
+    granite_result = await query_granite_model_async(
+        summary_model,
+        task_type="summarization",
+        document=summary_text,
+        max_words=max_length
     )
 
+    # Post-process summary to ensure it's legal-document focused
     if granite_result and len(granite_result.strip()) > 20:
-        # Clean up the response to extract just the summary
-        if "Professional Summary:" in granite_result:
-            summary = granite_result.split("Professional Summary:")[-1].strip()
-        elif granite_prompt in granite_result:
-            summary = granite_result.replace(granite_prompt, "").strip()
-        else:
-            summary = granite_result.strip()
-
-        # Post-process summary to ensure it's legal-document focused
-        if summary and len(summary) > 20:
-            return f"Legal Document Summary: {summary}"
+        return f"Legal Document Summary: {granite_result.strip()}"
 
     # Enhanced fallback: Create a more detailed extractive summary
-    sentences = text.split('. ')[:5]
-    fallback_summary = '. '.join(sentences) + '.' if sentences else "Document uploaded successfully. Summary generation temporarily unavailable."
-    return f"Document Overview: {fallback_summary}"
+    if not local_fallback:
+        return None
+    note_stage_mode("local (model unavailable)")
+    return extractive_summary(text)
+
+def _summary_chunk_tokens(max_length=150):
+    """Tokens of document text per map-reduce chunk"""
+    summary_model = IBM_GRANITE_MODELS["summarization"]
+    return SUMMARY_CHUNK_TOKENS or input_token_budget(summary_model, _summary_prompt("", max_length))
+
+def split_summary_chunks(text, max_tokens=None):
+    """
+    Split text into map-reduce chunks with content-defined boundaries
+
+    Unchanged chunks keep their exact text across edits, so their summaries
+    are served from the response cache.
+    """
+    return split_text_by_tokens(text, IBM_GRANITE_MODELS["summarization"],
+                                max_tokens or _summary_chunk_tokens(), content_defined=True)
+
+async def _summarize_chunks_async(chunks, max_length, semaphore):
+    """Map step: summarize chunks concurrently, at most SUMMARY_MAX_CONCURRENCY at a time"""
+    async def summarize(chunk):
+        async with semaphore:
+            # Model summaries land in the response cache keyed by chunk text,
+            # so unchanged chunks are not sent again
+            result = await query_granite_model_async(
+                IBM_GRANITE_MODELS["summarization"],
+                task_type="summarization",
+                local_fallback=False,
+                document=chunk,
+                max_words=max_length
+            )
+        if result and len(result.strip()) > 20:
+            return result.strip()
+        # Model unavailable: keep the chunk's opening sentences so the reduce step still sees it
+        return " ".join(_SENTENCE_BOUNDARY.split(chunk)[:2]).strip()
+
+    return await asyncio.gather(*(summarize(chunk) for chunk in chunks))
+
+async def generate_map_reduce_summary_async(text, max_length=150, local_fallback=True):
+    """
+    Summarize the whole document: summarize chunks, then summarize the summaries
+
+    Reduce rounds repeat while the combined summaries are still longer than
+    one chunk, up to SUMMARY_MAX_REDUCE_ROUNDS, and while the current
+    deadline leaves time for another round.
+    """
+    status_ui().info("🔄 Using IBM Granite model to summarize the full document section by section...")
+    semaphore = asyncio.Semaphore(SUMMARY_MAX_CONCURRENCY)
+
+    chunk_tokens = _summary_chunk_tokens(max_length)
+    summaries = await _summarize_chunks_async(split_summary_chunks(text, chunk_tokens), max_length, semaphore)
+    for _ in range(SUMMARY_MAX_REDUCE_ROUNDS):
+        combined = "\n".join(summaries)
+        if count_tokens(combined, IBM_GRANITE_MODELS["summarization"]) <= chunk_tokens:
+            break
+        if not deadline_allows(2 * DEADLINE_MODEL_MIN_SECONDS):
+            note_stage_mode("map-reduce, reduce rounds cut (time budget)")
+            break
+        summaries = await _summarize_chunks_async(split_summary_chunks(combined, chunk_tokens), max_length, semaphore)
+    combined = "\n".join(summaries)
+
+    final_summary = await query_granite_model_async(
+        IBM_GRANITE_MODELS["summarization"],
+        task_type="summarization",
+        local_fallback=False,
+        document=combined,
+        max_words=max_length
+    )
+    if final_summary and len(final_summary.strip()) > 20:
+        return f"Legal Document Summary: {final_summary.strip()}"
+    return f"Document Overview: {combined}" if local_fallback else None
 
 def generate_detailed_summary(text):
     """Generate detailed document analysis with bullet points"""
@@ -618,45 +3076,55 @@ def extract_key_clauses(text):
     else:
         return "Document contains standard legal language with obligations, agreements, and terms requiring review by legal counsel."
 
-def chatbot_response(question, context):
+def chatbot_response(question, context, hedge_deadline=None):
     """Generate chatbot response using IBM Granite model with enhanced context analysis"""
-    question_lower = question.lower()
-
-    # First try IBM Granite model for intelligent response
-    granite_prompt = f"""You are a legal document assistant. Based on the following document content, please answer the user's question accurately and helpfully. Provide specific information from the document when available.
-
-Document Content:
-{context[:1500]}
+    return run_coroutine_sync(chatbot_response_async(question, context, hedge_deadline))
 
-User Question: {question}
-
-Please provide a clear, accurate answer based on the information in the document. If specific information is not available, explain what general information can be inferred.
+async def chatbot_response_async(question, context, hedge_deadline=None, local_fallback=True):
+    """
+    Async form of chatbot_response
 
-Answer:"""
+    hedge_deadline overrides CLAUSEWISE_HEDGE_DEADLINE (0 disables hedging).
+    With local_fallback=False, None is returned when the model does not answer.
+    Under a deadline the keyword answer is served at once when too little
+    time is left for a model call.
+    """
+    if local_fallback and not deadline_allows(DEADLINE_MODEL_MIN_SECONDS):
+        note_stage_mode("local (time budget)")
+        return keyword_chat_answer(question, context)
+
+    hedge_deadline = HEDGE_DEADLINE_SECONDS if hedge_deadline is None else hedge_deadline
+    if hedge_deadline > 0 and local_fallback:
+        return await run_hedged_async(
+            lambda: chatbot_response_async(question, context, hedge_deadline=0, local_fallback=False),
+            lambda: keyword_chat_answer(question, context),
+            hedge_deadline
+        )
 
-    # Try IBM Granite model first
-    st.info("🔄 Using IBM Granite model for intelligent legal Q&A...")
+    # First try IBM Granite model for intelligent response
+    status_ui().info("🔄 Using IBM Granite model for intelligent legal Q&A...")
 
-    granite_result = query_granite_model(
+    granite_result = await query_granite_model_async(
         IBM_GRANITE_MODELS["chatbot"],
-        granite_prompt,
-        task_type="chatbot"
+        task_type="chatbot",
+        document=context,
+        question=question
     )
 
     if granite_result and len(granite_result.strip()) > 20:
-        # Clean up the response
-        if "Answer:" in granite_result:
-            answer = granite_result.split("Answer:")[-1].strip()
-        elif granite_prompt in granite_result:
-            answer = granite_result.replace(granite_prompt, "").strip()
-        else:
-            answer = granite_result.strip()
+        return granite_result.strip()
 
-        if answer and len(answer) > 10:
-            return answer
+    if not local_fallback:
+        return None
 
     # Fallback to enhanced keyword-based analysis
-    st.info("🔄 Using enhanced keyword analysis as fallback...")
+    status_ui().info("🔄 Using enhanced keyword analysis as fallback...")
+    note_stage_mode("local (model unavailable)")
+    return keyword_chat_answer(question, context)
+
+def keyword_chat_answer(question, context):
+    """Local keyword-based answer, served when the model is unavailable or slow"""
+    question_lower = question.lower()
 
     # Enhanced context analysis - extract key information first
     import re
@@ -733,6 +3201,59 @@ Answer:"""
         else:
             return f"I understand you're asking about '{question}'. Please try asking about specific terms, dates, amounts, parties, or obligations in the document."
 
+def analyze_document_structure(text):
+    """Local document analysis shown on the analysis page: type, key clauses and entities"""
+    return {
+        'document_type': classify_document_type(text),
+        'key_clauses': extract_key_clauses(text),
+        'entities': extract_named_entities(text)
+    }
+
+async def run_analysis_requests_async(text, summary_length=None, include_analysis=False, question=None, deadline=None):
+    """
+    Issue the analysis page's independent requests concurrently
+
+    The summary and chatbot model calls overlap on the HTTP pool while the
+    local structural analysis runs on a worker thread, so the total wait is
+    the slowest request rather than the sum. Only requested parts are run.
+
+    The run shares one deadline of `deadline` seconds, defaulting to
+    CLAUSEWISE_ANALYSIS_DEADLINE (0 for none); each part is a stage of it.
+
+    Returns:
+        Dict with any of "summary", "document_analysis" and "chat_answer",
+        plus "deadline_report" (see Deadline.report) when a deadline applies
+    """
+    seconds = ANALYSIS_DEADLINE_SECONDS if deadline is None else deadline
+    run_deadline = Deadline(seconds) if seconds > 0 else None
+
+    async def run_stage(name, coroutine, mode="model"):
+        if run_deadline is None:
+            return await coroutine
+        with run_deadline.stage(name, mode):
+            return await coroutine
+
+    with run_deadline or nullcontext():
+        requests_by_name = {}
+        if summary_length:
+            requests_by_name["summary"] = run_stage(
+                "summary", generate_summary_async(text, max_length=summary_length))
+        if include_analysis:
+            requests_by_name["document_analysis"] = run_stage(
+                "document_analysis", asyncio.to_thread(analyze_document_structure, text), mode="local")
+        if question:
+            requests_by_name["chat_answer"] = run_stage(
+                "chat_answer", chatbot_response_async(question, text))
+
+        results = dict(zip(requests_by_name, await asyncio.gather(*requests_by_name.values())))
+    if run_deadline is not None:
+        results["deadline_report"] = run_deadline.report()
+    return results
+
+def run_analysis_requests(text, summary_length=None, include_analysis=False, question=None, deadline=None):
+    """Synchronous entry point for run_analysis_requests_async, for Streamlit pages"""
+    return run_coroutine_sync(run_analysis_requests_async(text, summary_length, include_analysis, question, deadline))
+
 def text_to_speech(text):
     """Convert text to speech using offline pyttsx3 - Extended for 1 minute duration"""
     try:
@@ -947,19 +3468,352 @@ def test_tts_connection():
             "engine_status": "initialization_failed"
         }
 
-def save_document_to_history(filename, file_type, text):
-    """Save document to history"""
+def save_document_to_history(filename, file_type, text, content_hash=None):
+    """Save document to history, reusing the existing entry for identical content"""
+    if content_hash:
+        for document_entry in st.session_state.document_history:
+            if document_entry.get("content_hash") == content_hash:
+                return document_entry
+
     document_entry = {
         "filename": filename,
         "file_type": file_type,
         "upload_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "text": text,
-        "id": len(st.session_state.document_history)
+        "id": len(st.session_state.document_history),
+        "content_hash": content_hash
     }
     
     st.session_state.document_history.append(document_entry)
     return document_entry
 
+def get_upload_identity(uploaded_file):
+    """Cheap identity for an uploader value: Streamlit's file_id, else name and size"""
+    file_id = getattr(uploaded_file, "file_id", None)
+    if file_id:
+        return file_id
+    return f"{uploaded_file.name}:{getattr(uploaded_file, 'size', None)}"
+
+def is_upload_ingested(uploaded_file):
+    """Check whether this uploader value was already ingested in the current session"""
+    ingested_uploads = st.session_state.get("ingested_uploads", {})
+    return get_upload_identity(uploaded_file) in ingested_uploads
+
+def ingest_uploaded_file(uploaded_file, progress_callback=None, metrics=None):
+    """
+    Extract an upload and record it in history exactly once per distinct document
+
+    Streamlit reruns the page script on every widget interaction while the
+    uploader still holds the file, so repeat calls for the same upload are
+    answered from session state without hashing or extracting again. A new
+    upload whose bytes match a document already in history reuses that entry.
+
+    Returns:
+        Tuple of (document_entry, is_new), or (None, False) if extraction failed
+    """
+    if 'ingested_uploads' not in st.session_state:
+        st.session_state.ingested_uploads = {}
+
+    identity = get_upload_identity(uploaded_file)
+    history_id = st.session_state.ingested_uploads.get(identity)
+    if history_id is not None:
+        return st.session_state.document_history[history_id], False
+
+    content_hash = hash_upload(uploaded_file)
+    for document_entry in st.session_state.document_history:
+        if document_entry.get("content_hash") == content_hash:
+            st.session_state.ingested_uploads[identity] = document_entry["id"]
+            return document_entry, False
+
+    extracted_text = extract_text_from_file(uploaded_file, progress_callback=progress_callback, metrics=metrics,
+                                            content_hash=content_hash)
+    if not extracted_text:
+        return None, False
+
+    document_entry = save_document_to_history(
+        uploaded_file.name,
+        uploaded_file.type,
+        extracted_text,
+        content_hash=content_hash
+    )
+    st.session_state.ingested_uploads[identity] = document_entry["id"]
+    return document_entry, True
+
+# Batch ingestion settings
+# Extraction is CPU-bound and analysis waits on the model API, so each stage has its own bound
+BATCH_EXTRACTION_WORKERS = int(os.environ.get("CLAUSEWISE_BATCH_EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+BATCH_ANALYSIS_WORKERS = int(os.environ.get("CLAUSEWISE_BATCH_ANALYSIS_WORKERS", "4"))
+
+# MIME types for files that arrive without one (archive members)
+FILE_TYPES_BY_EXTENSION = {
+    ".pdf": "application/pdf",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".txt": "text/plain",
+}
+
+BATCH_STATUS_QUEUED = "⏳ Queued"
+BATCH_STATUS_EXTRACTING = "📄 Extracting"
+BATCH_STATUS_ANALYZING = "🤖 Analyzing"
+BATCH_STATUS_DONE = "✅ Done"
+BATCH_STATUS_DUPLICATE = "♻️ Already in history"
+BATCH_STATUS_FAILED = "❌ Failed"
+
+BATCH_STATUS_SKIPPED = "⏭️ Skipped"
+
+# Archive ingestion settings
+# Members are filtered on the sizes recorded in the ZIP directory before anything is decompressed
+ARCHIVE_MAX_MEMBER_BYTES = int(os.environ.get("CLAUSEWISE_ARCHIVE_MAX_MEMBER_MB", "100")) * 1024 * 1024
+ARCHIVE_EXTENSIONS = tuple(
+    extension.strip().lower()
+    for extension in os.environ.get("CLAUSEWISE_ARCHIVE_EXTENSIONS", ",".join(FILE_TYPES_BY_EXTENSION)).split(",")
+    if extension.strip().lower() in FILE_TYPES_BY_EXTENSION
+)
+# Members larger than this are spooled to a temporary file instead of memory
+ARCHIVE_SPOOL_BYTES = int(os.environ.get("CLAUSEWISE_ARCHIVE_SPOOL_MB", "16")) * 1024 * 1024
+
+class ArchiveMember:
+    """
+    One archive member spooled out of its ZIP, usable wherever an UploadedFile is
+
+    The decompressed bytes live in a SpooledTemporaryFile, so small members stay
+    in memory and large ones spill to disk. Call close() (or use it as a context
+    manager) once the member has been extracted to release the spool.
+    """
+
+    def __init__(self, name, file_type, spool, size):
+        self.name = name
+        self.type = file_type
+        self.size = size
+        self._spool = spool
+
+    def __getattr__(self, attribute):
+        # seek/read/tell/close come from the spool, so extractors treat this like any upload
+        return getattr(self._spool, attribute)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._spool.close()
+
+def is_zip_upload(uploaded_file):
+    """True for ZIP archives; DOCX files are ZIP containers too, so the name decides"""
+    return uploaded_file.name.lower().endswith(".zip")
+
+def _spool_archive_member(archive, member, max_bytes, chunk_size=1024 * 1024):
+    """Decompress one member into a spool, or return None if it inflates past max_bytes"""
+    spool = tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_BYTES)
+    copied = 0
+    with archive.open(member) as member_stream:
+        for chunk in iter(lambda: member_stream.read(chunk_size), b""):
+            copied += len(chunk)
+            # The directory's file_size can lie; never decompress past the limit
+            if copied > max_bytes:
+                spool.close()
+                return None
+            spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+def iter_archive_members(archive_file, max_member_bytes=None, extensions=None, on_skip=None):
+    """
+    Yield the supported members of a ZIP archive one at a time, without unpacking it
+
+    Each member is decompressed as a stream only when the consumer asks for it,
+    so peak memory is bounded by the largest member rather than the archive.
+    Members are skipped by extension, by their declared size, and again if they
+    decompress past the size limit; encrypted members are skipped too.
+
+    Args:
+        archive_file: Path or seekable file object holding the ZIP
+        max_member_bytes: Size limit per member, defaulting to ARCHIVE_MAX_MEMBER_BYTES
+        extensions: Extensions to ingest, defaulting to ARCHIVE_EXTENSIONS
+        on_skip: Optional callable(member_name, reason) for each skipped member
+
+    Yields:
+        ArchiveMember objects named "<archive>/<member path>"; the caller closes them
+    """
+    max_member_bytes = max_member_bytes or ARCHIVE_MAX_MEMBER_BYTES
+    extensions = extensions or ARCHIVE_EXTENSIONS
+    archive_name = archive_file if isinstance(archive_file, str) else archive_file.name
+
+    if not isinstance(archive_file, str):
+        archive_file.seek(0)
+    with zipfile.ZipFile(archive_file) as archive:
+        for member in archive.infolist():
+            if member.is_dir():
+                continue
+            member_name = f"{os.path.basename(archive_name)}/{member.filename}"
+            extension = os.path.splitext(member.filename)[1].lower()
+
+            reason = None
+            if extension not in extensions:
+                reason = "unsupported file type"
+            elif member.file_size > max_member_bytes:
+                reason = f"larger than {max_member_bytes / (1024 * 1024):g} MB"
+            elif member.flag_bits & 0x1:
+                reason = "encrypted"
+            else:
+                spool = _spool_archive_member(archive, member, max_member_bytes)
+                if spool is None:
+                    reason = f"larger than {max_member_bytes / (1024 * 1024):g} MB"
+
+            if reason:
+                if on_skip:
+                    on_skip(member_name, reason)
+                continue
+            yield ArchiveMember(member_name, FILE_TYPES_BY_EXTENSION[extension], spool, member.file_size)
+
+def expand_batch_uploads(uploaded_files, on_skip=None):
+    """Yield every document in a batch, streaming ZIP archives member by member"""
+    for uploaded_file in uploaded_files:
+        if is_zip_upload(uploaded_file):
+            yield from iter_archive_members(uploaded_file, on_skip=on_skip)
+        else:
+            yield uploaded_file
+
+def analyze_document_text(text):
+    """Batch analysis stage: document type, named entities and summary for one document"""
+    return {
+        "document_type": classify_document_type(text),
+        "entities": extract_named_entities(text),
+        # Runs on a worker thread with nobody waiting on the page, so the model answer is awaited unhedged
+        "summary": generate_summary(text, hedge_deadline=0),
+    }
+
+def _extract_batch_upload(uploaded_file, content_hash=None):
+    """Batch extraction stage, run on a worker thread: returns (text, seconds)"""
+    start = time.perf_counter()
+    # Files in a batch already run concurrently, so each PDF is extracted serially
+    text = extract_text_from_file(uploaded_file, parallel=False, content_hash=content_hash)
+    return text, time.perf_counter() - start
+
+def _release_batch_upload(uploaded_file):
+    """Free an archive member's spooled bytes once its text (or duplicate status) is known"""
+    if isinstance(uploaded_file, ArchiveMember):
+        uploaded_file.close()
+
+def run_batch_ingest(uploaded_files, on_update=None, analyze=True, extraction_workers=None, analysis_workers=None):
+    """
+    Push many uploads through a bounded extraction -> analysis pipeline
+
+    Extraction and analysis run on separate thread pools. Only a couple of
+    documents per extraction worker are read ahead (ZIP members are only
+    decompressed when their turn comes), so a large batch never holds every
+    file at once. Session state is only touched from the
+    calling (script) thread: each document is written to history as soon as
+    its extraction finishes, and its analysis is attached to that entry when
+    the analysis stage completes.
+
+    Args:
+        uploaded_files: Uploads from st.file_uploader; ZIP archives are streamed member by member
+        on_update: Optional callable(status_rows) invoked after every status change
+        analyze: Run classification, NER and summary after extraction
+        extraction_workers / analysis_workers: Stage concurrency, defaulting to
+            BATCH_EXTRACTION_WORKERS / BATCH_ANALYSIS_WORKERS
+
+    Returns:
+        List of status rows, one dict per document
+    """
+    if 'ingested_uploads' not in st.session_state:
+        st.session_state.ingested_uploads = {}
+
+    extraction_workers = extraction_workers or BATCH_EXTRACTION_WORKERS
+    analysis_workers = analysis_workers or BATCH_ANALYSIS_WORKERS
+    status_rows = []
+
+    def record_skipped(member_name, reason):
+        status_rows.append({"File": member_name, "Status": BATCH_STATUS_SKIPPED, "Type": "", "Characters": 0, "Seconds": 0.0, "Error": reason})
+        if on_update:
+            on_update(status_rows)
+
+    upload_iterator = expand_batch_uploads(uploaded_files, on_skip=record_skipped)
+    known_hashes = {
+        document_entry.get("content_hash"): document_entry
+        for document_entry in st.session_state.document_history
+        if document_entry.get("content_hash")
+    }
+    in_flight_hashes = set()
+
+    def report(row, status, **fields):
+        row["Status"] = status
+        row.update(fields)
+        if on_update:
+            on_update(status_rows)
+
+    with ThreadPoolExecutor(max_workers=extraction_workers) as extraction_pool, \
+            ThreadPoolExecutor(max_workers=analysis_workers) as analysis_pool:
+        pending = {}
+
+        def submit_next_extraction():
+            """Queue the next new document; returns False once the batch is exhausted"""
+            for uploaded_file in upload_iterator:
+                row = {"File": uploaded_file.name, "Status": BATCH_STATUS_QUEUED, "Type": "", "Characters": 0, "Seconds": 0.0}
+                status_rows.append(row)
+                content_hash = hash_upload(uploaded_file)
+                if content_hash in in_flight_hashes:
+                    _release_batch_upload(uploaded_file)
+                    report(row, BATCH_STATUS_DUPLICATE)
+                    continue
+                if content_hash in known_hashes:
+                    _release_batch_upload(uploaded_file)
+                    st.session_state.ingested_uploads[get_upload_identity(uploaded_file)] = known_hashes[content_hash]["id"]
+                    report(row, BATCH_STATUS_DUPLICATE, Characters=len(known_hashes[content_hash]["text"]))
+                    continue
+                # Claim the hash now so a second copy later in the batch is not extracted again
+                in_flight_hashes.add(content_hash)
+                future = extraction_pool.submit(_extract_batch_upload, uploaded_file, content_hash)
+                pending[future] = ("extract", row, uploaded_file, content_hash)
+                report(row, BATCH_STATUS_EXTRACTING)
+                return True
+            return False
+
+        def extractions_in_flight():
+            return sum(1 for stage, *_ in pending.values() if stage == "extract")
+
+        while extractions_in_flight() < extraction_workers * 2 and submit_next_extraction():
+            pass
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, row, uploaded_file, payload = pending.pop(future)
+
+                if stage == "extract":
+                    content_hash = payload
+                    try:
+                        text, seconds = future.result()
+                    except Exception as e:
+                        text, seconds, row["Error"] = None, 0.0, str(e)
+                    in_flight_hashes.discard(content_hash)
+                    _release_batch_upload(uploaded_file)
+                    if not text:
+                        report(row, BATCH_STATUS_FAILED, Seconds=round(seconds, 2))
+                        continue
+
+                    document_entry = save_document_to_history(uploaded_file.name, uploaded_file.type, text, content_hash=content_hash)
+                    known_hashes[content_hash] = document_entry
+                    st.session_state.ingested_uploads[get_upload_identity(uploaded_file)] = document_entry["id"]
+                    if analyze:
+                        pending[analysis_pool.submit(bind_session(analyze_document_text), text)] = ("analyze", row, uploaded_file, document_entry)
+                        report(row, BATCH_STATUS_ANALYZING, Characters=len(text), Seconds=round(seconds, 2))
+                    else:
+                        report(row, BATCH_STATUS_DONE, Characters=len(text), Seconds=round(seconds, 2))
+                else:
+                    document_entry = payload
+                    try:
+                        document_entry["analysis"] = future.result()
+                    except Exception as e:
+                        row["Error"] = str(e)
+                        report(row, BATCH_STATUS_FAILED)
+                        continue
+                    report(row, BATCH_STATUS_DONE, Type=document_entry["analysis"]["document_type"].split(" (")[0])
+
+            while extractions_in_flight() < extraction_workers * 2 and submit_next_extraction():
+                pass
+
+    return status_rows
+
 def get_file_type_icon(file_type):
     """Get appropriate icon for file type"""
     if "pdf" in file_type.lower():
@@ -4,8 +4,11 @@ import plotly.graph_objects as go
 import base64
 from utils import (
     generate_summary, generate_detailed_summary, classify_document_type, extract_named_entities,
-    simplify_clauses, extract_key_clauses, chatbot_response, text_to_speech,
-    highlight_entities_in_text, test_tts_connection
+    simplify_clauses, extract_key_clauses, chatbot_response, text_to_speech, highlight_entities_in_text,
+    test_tts_connection, run_analysis_requests, analyze_document_structure, upgrade_hedged_answers,
+    watch_hedged_answers, get_circuit_breaker_snapshots, get_response_cache_stats,
+    get_single_flight_stats, get_model_server_metrics, get_request_scheduler_stats,
+    RETRY_BUDGET, MODEL_BACKEND, MODEL_SERVER_URL, MODEL_WARMER, PRIORITY_INTERACTIVE, PRIORITY_BATCH
 )
 
 def show():
@@ -25,6 +28,11 @@ def show():
     </div>
     """, unsafe_allow_html=True)
     
+    # Issue this run's model requests together before any section renders
+    prefetch_model_results()
+    # Model answers that missed their hedge deadline replace the local ones as they arrive
+    upgrade_hedged_answers()
+    
     # Top section - Split view
     render_split_view()
     
@@ -36,6 +44,39 @@ def show():
     
     # Document summary section
     render_summary_section()
+    
+    # Model API health
+    render_diagnostics_panel()
+
+    if upgrade_hedged_answers()[1]:
+        watch_hedged_answers()
+
+def prefetch_model_results():
+    """Run the summary, analysis and any pending chat question concurrently in one round trip"""
+    needs_summary = not st.session_state.get('document_summary')
+    needs_analysis = not st.session_state.get('document_analysis')
+    # A Send click is visible in session state before the chatbot section renders
+    pending_question = st.session_state.get('chat_input') if st.session_state.get('send_chat') else None
+
+    if not (needs_summary or needs_analysis or pending_question):
+        return
+
+    with st.spinner("Generating summary, analysis and answers..."):
+        results = run_analysis_requests(
+            st.session_state.extracted_text,
+            summary_length=200 if needs_summary else None,
+            include_analysis=needs_analysis,
+            question=pending_question
+        )
+
+    if 'summary' in results:
+        st.session_state.document_summary = results['summary']
+    if 'document_analysis' in results:
+        st.session_state.document_analysis = results['document_analysis']
+    if 'chat_answer' in results:
+        st.session_state.prefetched_chat_answer = (pending_question, results['chat_answer'])
+    if 'deadline_report' in results:
+        st.session_state.analysis_deadline_report = results['deadline_report']
 
 def render_no_document():
     """Render when no document is available for analysis"""
@@ -370,9 +411,13 @@ def render_chatbot_section():
             'content': user_question
         })
         
-        # Generate AI response
+        # Use the answer fetched alongside the other requests, if any
+        prefetched = st.session_state.pop('prefetched_chat_answer', None)
         with st.spinner("Thinking..."):
-            ai_response = chatbot_response(user_question, st.session_state.extracted_text)
+            if prefetched and prefetched[0] == user_question:
+                ai_response = prefetched[1]
+            else:
+                ai_response = chatbot_response(user_question, st.session_state.extracted_text)
             st.session_state.chat_history.append({
                 'role': 'assistant',
                 'content': ai_response
@@ -394,11 +439,7 @@ def render_analysis_section():
         # Generate enhanced analysis if not done
         if not hasattr(st.session_state, 'document_analysis') or not st.session_state.document_analysis:
             with st.spinner("Performing detailed document analysis..."):
-                st.session_state.document_analysis = {
-                    'document_type': classify_document_type(st.session_state.extracted_text),
-                    'key_clauses': extract_key_clauses(st.session_state.extracted_text),
-                    'entities': extract_named_entities(st.session_state.extracted_text)
-                }
+                st.session_state.document_analysis = analyze_document_structure(st.session_state.extracted_text)
         
         analysis = st.session_state.document_analysis
         
@@ -595,3 +636,91 @@ def render_summary_section():
         st.metric("📋 Sentences", f"{sentence_count:,}")
 
     st.markdown("</div>", unsafe_allow_html=True)
+
+def render_diagnostics_panel():
+    """Render model API diagnostics: circuit breakers, response cache and retry budget"""
+    breaker_icons = {"closed": "🟢 Closed", "half_open": "🟡 Half-open", "open": "🔴 Open"}
+
+    with st.expander("🩺 Model API Diagnostics", expanded=False):
+        breakers = get_circuit_breaker_snapshots()
+        if breakers:
+            st.markdown("**Circuit breakers** (shared by all sessions)")
+            st.dataframe([
+                {
+                    "Endpoint": breaker["endpoint"].rsplit("/models/", 1)[-1],
+                    "State": breaker_icons.get(breaker["state"], breaker["state"]),
+                    "Failure rate": f"{breaker['failure_rate']:.0%} of {breaker['recent_calls']}",
+                    "Times opened": breaker["times_opened"],
+                    "Short-circuited": breaker["short_circuited"],
+                    "Retry in (s)": round(breaker["retry_in_seconds"], 1) if breaker["retry_in_seconds"] is not None else "",
+                }
+                for breaker in breakers
+            ], use_container_width=True, hide_index=True)
+        else:
+            st.caption("No model calls made yet in this server process.")
+
+        warm_states = MODEL_WARMER.snapshot()
+        if warm_states:
+            warm_icons = {"warm": "🟢 Warm", "loading": "🟡 Loading", "pinging": "🟡 Pinging", "cold": "🔴 Cold"}
+            st.markdown(f"**Model warm-up** ({MODEL_WARMER.pings} pings sent, {MODEL_WARMER.suppressed} redundant ones skipped)")
+            st.dataframe([
+                {
+                    "Endpoint": warm_state["endpoint"].rsplit("/models/", 1)[-1],
+                    "State": warm_icons.get(warm_state["state"], warm_state["state"]),
+                    "Recheck in (s)": round(warm_state["expires_in_seconds"], 1)
+                    if warm_state["expires_in_seconds"] not in (None, float("inf")) else "",
+                }
+                for warm_state in warm_states
+            ], use_container_width=True, hide_index=True)
+
+        cache_stats = get_response_cache_stats()
+        flight_stats = get_single_flight_stats()
+        col1, col2, col3, col4, col5 = st.columns(5)
+        col1.metric("Cache hit rate", f"{cache_stats['hit_rate']:.0%}")
+        col2.metric("Cache hits", cache_stats["hits"], help=f"{cache_stats['memory_hits']} from memory, {cache_stats['disk_hits']} from disk")
+        col3.metric("Cache misses", cache_stats["misses"])
+        col4.metric("Coalesced calls", flight_stats["coalesced"], help="Identical requests that shared another session's in-flight call")
+        col5.metric("Retries refused by budget", RETRY_BUDGET.exhausted)
+
+        deadline_report = st.session_state.get('analysis_deadline_report')
+        if deadline_report:
+            outcome = "✅ met" if deadline_report["met"] else "⚠️ missed"
+            st.markdown(f"**Last analysis run**: {deadline_report['elapsed_seconds']:.1f}s of a "
+                        f"{deadline_report['budget_seconds']:g}s budget ({outcome})")
+            st.dataframe([
+                {
+                    "Stage": stage["stage"].replace("_", " ").capitalize(),
+                    "Mode": stage["mode"],
+                    "Started at (s)": round(stage["started_at"], 2),
+                    "Time (s)": round(stage["seconds"], 2),
+                    "Share of budget": f"{stage['budget_share']:.0%}",
+                }
+                for stage in deadline_report["stages"]
+            ], use_container_width=True, hide_index=True)
+
+        scheduler_stats = get_request_scheduler_stats()
+        priority_names = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BATCH: "batch"}
+        st.markdown("**Request scheduler** (shared by all sessions)")
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("In flight", f"{scheduler_stats['in_flight']} / {scheduler_stats['max_in_flight']}")
+        col2.metric("Queued", scheduler_stats["queued"], help=f"From {scheduler_stats['queued_sessions']} sessions")
+        col3.metric("Mean queue wait", f"{scheduler_stats['mean_wait_ms']:.0f} ms",
+                    help=", ".join(
+                        f"{priority_names.get(priority, priority)}: {waits['mean_wait_ms']:.0f} ms mean, "
+                        f"{waits['max_wait_ms']:.0f} ms max over {waits['requests']}"
+                        for priority, waits in scheduler_stats["wait_by_priority"].items()
+                    ) or None)
+        col4.metric("p95 queue wait", f"{scheduler_stats['p95_wait_ms']:.0f} ms")
+
+        if MODEL_BACKEND == "server":
+            server_metrics = get_model_server_metrics()
+            if server_metrics is None:
+                st.warning(f"Model server at {MODEL_SERVER_URL} is not reachable.")
+            else:
+                st.markdown("**Model server** (shared by all sessions and workers)")
+                col1, col2, col3, col4 = st.columns(4)
+                col1.metric("Queue depth", server_metrics["queue_depth"], help=f"Peak {server_metrics['max_queue_depth']}")
+                col2.metric("Mean batch size", f"{server_metrics['mean_batch_size']:.1f}",
+                            help=f"Batch sizes: {server_metrics['batch_sizes']}")
+                col3.metric("Batches run", server_metrics["batches"])
+                col4.metric("Mean queue wait", f"{server_metrics['mean_queue_wait_ms']:.0f} ms")
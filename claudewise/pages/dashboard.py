@@ -1,6 +1,12 @@
 import streamlit as st
 import time
-from utils import extract_text_from_file, save_document_to_history, get_file_type_icon
+from utils import (
+    ingest_uploaded_file, is_upload_ingested, get_file_type_icon, classify_document_type, run_batch_ingest,
+    warm_up_models, BATCH_STATUS_QUEUED, BATCH_STATUS_EXTRACTING, BATCH_STATUS_ANALYZING, BATCH_STATUS_DONE
+)
+
+# Number of leading pages used for the early document-type preview while extraction continues
+EARLY_PREVIEW_PAGES = 3
 
 def show():
     """Display the dashboard page"""
@@ -173,6 +179,17 @@ def render_upload_section():
         </div>
     """, unsafe_allow_html=True)
     
+    upload_mode = st.radio(
+        "Upload mode",
+        ["Single document", "Batch (many files or ZIP)"],
+        horizontal=True,
+        label_visibility="collapsed"
+    )
+    if upload_mode != "Single document":
+        render_batch_upload()
+        st.markdown("</div>", unsafe_allow_html=True)
+        return
+
     # File uploader
     uploaded_file = st.file_uploader(
         "Choose a file",
@@ -205,37 +222,114 @@ def render_upload_section():
     """, unsafe_allow_html=True)
     
     if uploaded_file is not None:
-        # Process the uploaded file
-        with st.spinner("Processing document..."):
-            extracted_text = extract_text_from_file(uploaded_file)
-            
-            if extracted_text:
+        # Reruns while the uploader still holds the file reuse the ingested entry
+        first_seen = not is_upload_ingested(uploaded_file)
+        if first_seen:
+            # Cold models load in the background while the document is extracted
+            warm_up_models()
+            document_entry, _ = ingest_with_progress(uploaded_file)
+        else:
+            document_entry, _ = ingest_uploaded_file(uploaded_file)
+
+        if document_entry:
+            extracted_text = document_entry["text"]
+            if first_seen:
                 # Save to session state
                 st.session_state.uploaded_file = uploaded_file
                 st.session_state.extracted_text = extracted_text
-                
-                # Save to history
-                save_document_to_history(
-                    uploaded_file.name,
-                    uploaded_file.type,
-                    extracted_text
-                )
-                
-                st.success(f"✅ Successfully processed {uploaded_file.name}")
-                
-                # Show file info
-                st.info(f"""
-                **File:** {uploaded_file.name}  
-                **Type:** {uploaded_file.type}  
-                **Size:** {len(extracted_text)} characters  
-                **Preview:** {extracted_text[:200]}...
-                """)
-                
-                # Show analyze button
-                if st.button("🔍 Analyze Document", key="analyze_btn"):
-                    st.session_state.current_page = "Analysis"
-                    st.rerun()
+            
+            st.success(f"✅ Successfully processed {uploaded_file.name}")
+            
+            # Show file info
+            st.info(f"""
+            **File:** {uploaded_file.name}  
+            **Type:** {uploaded_file.type}  
+            **Size:** {len(extracted_text)} characters  
+            **Preview:** {extracted_text[:200]}...
+            """)
+            
+            # Show analyze button
+            if st.button("🔍 Analyze Document", key="analyze_btn"):
+                st.session_state.uploaded_file = uploaded_file
+                st.session_state.extracted_text = extracted_text
+                st.session_state.current_page = "Analysis"
+                st.rerun()
     
     st.markdown("</div>", unsafe_allow_html=True)
 
+def ingest_with_progress(uploaded_file):
+    """Ingest a new upload, reporting progress as each page is parsed"""
+    progress_bar = st.progress(0.0, text="Processing document...")
+    early_preview = st.empty()
+    early_pages = []
+    parsed_pages = []
+
+    def on_page_parsed(page_number, total_pages, page_text):
+        # Pages may arrive out of order when extraction runs in parallel
+        parsed_pages.append(page_number)
+        progress_bar.progress(
+            len(parsed_pages) / max(total_pages, 1),
+            text=f"Extracted {len(parsed_pages)} of {total_pages} pages..."
+        )
+        # Start the cheap classification stage as soon as the first pages are in
+        if len(early_pages) < EARLY_PREVIEW_PAGES:
+            early_pages.append(page_text)
+            if len(early_pages) == EARLY_PREVIEW_PAGES or len(parsed_pages) == total_pages:
+                st.session_state.early_document_type = classify_document_type(" ".join(early_pages))
+                early_preview.info(f"**Early document type:** {st.session_state.early_document_type}")
+
+    page_metrics = []
+    with st.spinner("Processing document..."):
+        result = ingest_uploaded_file(uploaded_file, progress_callback=on_page_parsed, metrics=page_metrics)
+    progress_bar.empty()
+    early_preview.empty()
+
+    if page_metrics:
+        text_layer_pages = sum(1 for record in page_metrics if record["path"] == "text_layer")
+        ocr_pages = sum(1 for record in page_metrics if record["path"] == "ocr")
+        extraction_seconds = sum(record["seconds"] for record in page_metrics)
+        caption = (
+            f"⚡ {text_layer_pages} of {len(page_metrics)} pages read from the text layer, "
+            f"{len(page_metrics) - text_layer_pages - ocr_pages} via layout analysis"
+        )
+        if ocr_pages:
+            cached_pages = sum(1 for record in page_metrics if record.get("ocr_cached"))
+            caption += f", {ocr_pages} scanned pages via OCR ({cached_pages} from cache)"
+        st.caption(f"{caption} ({extraction_seconds:.1f}s of page work)")
+    return result
+
+def render_batch_upload():
+    """Batch mode: ingest many files or ZIP archives with a live per-file status table"""
+    uploaded_files = st.file_uploader(
+        "Choose files or ZIP archives",
+        type=['pdf', 'docx', 'txt', 'zip'],
+        accept_multiple_files=True,
+        help="Supported formats: PDF, DOCX, TXT, and ZIP archives containing them",
+        key="batch_uploader"
+    )
+
+    in_progress = (BATCH_STATUS_QUEUED, BATCH_STATUS_EXTRACTING, BATCH_STATUS_ANALYZING)
+    analyze = st.checkbox("Classify, extract entities and summarize each document", value=True)
+
+    if uploaded_files and st.button(f"🚀 Ingest {len(uploaded_files)} upload(s)", key="batch_ingest_btn"):
+        progress_bar = st.progress(0.0, text="Starting batch...")
+        status_table = st.empty()
+        warm_up_models()
+
+        def on_update(status_rows):
+            finished = sum(1 for row in status_rows if row["Status"] not in in_progress)
+            progress_bar.progress(
+                finished / max(len(status_rows), 1),
+                text=f"Finished {finished} of {len(status_rows)} documents found so far..."
+            )
+            status_table.dataframe(status_rows, use_container_width=True, hide_index=True)
+
+        st.session_state.batch_status = run_batch_ingest(uploaded_files, on_update=on_update, analyze=analyze)
+        progress_bar.empty()
+        status_table.empty()
 
+    batch_status = st.session_state.get("batch_status")
+    if batch_status:
+        completed = sum(1 for row in batch_status if row["Status"] == BATCH_STATUS_DONE)
+        st.success(f"✅ Batch finished: {completed} of {len(batch_status)} documents added to history")
+        st.dataframe(batch_status, use_container_width=True, hide_index=True)
@@ -162,7 +162,7 @@ def render_document_card(doc, index):
         <div class="doc-title">{doc['filename']}</div>
         <div class="doc-meta">
             📅 {doc['upload_date']}<br>
-            📊 {len(doc['text'])} characters
+            📊 {len(doc['text'])} characters{"<br>🏷️ " + doc['analysis']['document_type'] if doc.get('analysis') else ""}
         </div>
         <div class="doc-preview">{preview_text}</div>
     </div>